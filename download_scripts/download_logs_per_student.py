@@ -2,81 +2,234 @@
 # This will run in the firebase repo, in firebase/scripts/download_data
 # Sierra - 7/13/23
 
+import os
 import csv
-from concurrent.futures import ThreadPoolExecutor
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 
 import sys
 sys.path.insert(1, '../utils')
-import util
 
-def process_user_doc(user_doc, student_id):
-    fieldnames = ['code', 'error_message', 'error', 'output', 'assnId', 'type', 'title', 'ogTimestamp', 'serverTimestamp', 'projectId', 'unitTestResults']
+output_folder = './logs_11-21/'
 
+fieldnames = ['code', 'error_message', 'error', 'output', 'assnId', 'type', 'title', 'ogTimestamp', 'serverTimestamp', 'projectId', 'unitTestResults']
+
+# Logs can be saved as one csv file per student, or one zstd compressed parquet file per student.
+# Parquet files are written in row groups of parquet_flush_size rows. The functions save csv files unless
+# they are given another format, as the original script did, and the command line defaults to parquet.
+log_formats = ['csv', 'parquet']
+parquet_flush_size = 1000
+parquet_compression_level = 9
+
+# Students whose log files are complete are listed here, one per line, so that an interrupted download can be resumed
+def get_checkpoint_file(output_folder):
+    return f'{output_folder}completed_students.txt'
+
+def get_log_file(output_folder, user_id, log_format):
+    return f'{output_folder}{user_id}.{log_format}'
+
+def setup_db():
+    import util
+    return util.setup_db()
+
+# Return the row of a student's log file for one log document
+def get_log_row(logs_doc):
+    log = logs_doc.to_dict()
+
+    projectData = log.get('projectData', {})
+    assnId = projectData.get('assnId')
+    type_ = projectData.get('type')
+    title = projectData.get('title')
+    projectId = projectData.get('uid')
+
+    code = log.get('code')
+    codeRunResults = log.get('codeRunResults', {})
+    error_message = codeRunResults.get('error_message')
+    error = codeRunResults.get('error')
+    output = codeRunResults.get('output')
+    ogTimestamp = logs_doc.id
+    serverTimestamp = log.get('serverTimestamp')
+
+    unitTestResults = log.get('unitTestResults', [])
+    utResults = []
+    for unitTestResult in unitTestResults:
+        utResults.append(unitTestResult.get('state'))
+
+    return {'code': code,
+            'error_message': error_message,
+            'error': error,
+            'output': output,
+            'assnId': assnId,
+            'type': type_,
+            'title': title,
+            'ogTimestamp': ogTimestamp,
+            'serverTimestamp': serverTimestamp,
+            'projectId': projectId,
+            'unitTestResults': utResults}
+
+# Write the rows to a csv file, and return the number of rows
+def write_csv_log(rows, file_name):
+    num_rows = 0
+    with open(file_name, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+
+        for row in rows:
+            writer.writerow(row)
+            num_rows += 1
+
+        f.flush()
+        os.fsync(f.fileno())
+    return num_rows
+
+# Write the rows to a zstd compressed parquet file, one row group of flush_size rows at a time, so that
+# only flush_size rows are ever held in memory. Every value is stored as the same string the csv file
+# would hold (lists as their repr), except that missing values are stored as nulls.
+def write_parquet_log(rows, file_name, flush_size=parquet_flush_size):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(fieldname, pa.string()) for fieldname in fieldnames])
+    buffer = { fieldname: [] for fieldname in fieldnames }
+    num_rows = 0
+
+    def flush(writer):
+        writer.write_table(pa.table(buffer, schema=schema))
+        for fieldname in fieldnames:
+            buffer[fieldname].clear()
+
+    with pq.ParquetWriter(file_name, schema, compression='zstd', compression_level=parquet_compression_level) as writer:
+        for row in rows:
+            for fieldname in fieldnames:
+                value = row[fieldname]
+                buffer[fieldname].append(None if value is None else str(value))
+            num_rows += 1
+
+            if num_rows % flush_size == 0:
+                flush(writer)
+
+        if num_rows == 0 or num_rows % flush_size != 0:
+            flush(writer)
+
+    with open(file_name, 'rb+') as f:
+        os.fsync(f.fileno())
+    return num_rows
+
+def process_user_doc(user_doc, student_id, output_folder=output_folder, log_format='csv', flush_size=parquet_flush_size):
     user_id = user_doc.id
     assert user_id == student_id
-    file_name = f'./logs_11-21/{user_id}.csv'
-    writer = csv.DictWriter(open(file_name, 'w'), fieldnames=fieldnames)
-    writer.writeheader()
+    file_name = get_log_file(output_folder, user_id, log_format)
 
     logs_collection = user_doc.collection('logs')
-    logs_stream = logs_collection.stream() 
-
-    for logs_doc in logs_stream:
-        log = logs_doc.to_dict()
-
-        projectData = log.get('projectData', {})
-        assnId = projectData.get('assnId')
-        type_ = projectData.get('type')
-        title = projectData.get('title')
-        projectId = projectData.get('uid')
-
-        code = log.get('code')
-        codeRunResults = log.get('codeRunResults', {})
-        error_message = codeRunResults.get('error_message')
-        error = codeRunResults.get('error')
-        output = codeRunResults.get('output')
-        ogTimestamp = logs_doc.id
-        serverTimestamp = log.get('serverTimestamp')
-
-        unitTestResults = log.get('unitTestResults', [])
-        utResults = []
-        for unitTestResult in unitTestResults:
-            utResults.append(unitTestResult.get('state'))
-
-
-        writer.writerow({'code': code,
-                         'error_message': error_message,
-                         'error': error,
-                         'output': output,
-                         'assnId': assnId,
-                         'type': type_,
-                         'title': title,
-                         'ogTimestamp': ogTimestamp,
-                         'serverTimestamp': serverTimestamp,
-                         'projectId': projectId,
-                         'unitTestResults': utResults})
-
-def main_parallel():
-    db = util.setup_db()
+    logs_stream = logs_collection.stream()
+    rows = (get_log_row(logs_doc) for logs_doc in logs_stream)
+
+    # Write to a temporary file, and only move it into place once every log has been written,
+    # so that a failed download never leaves a partial log file behind
+    temp_file_name = file_name + '.tmp'
+    try:
+        if log_format == 'parquet':
+            num_rows = write_parquet_log(rows, temp_file_name, flush_size)
+        else:
+            num_rows = write_csv_log(rows, temp_file_name)
+    except Exception:
+        if os.path.exists(temp_file_name):
+            os.remove(temp_file_name)
+        raise
+
+    os.replace(temp_file_name, file_name)
+    return num_rows
+
+# Download one student's logs, retrying with exponential backoff (and some jitter) if the download fails
+def process_user_doc_with_retries(user_doc, student_id, output_folder, log_format, flush_size, max_retries, backoff_seconds):
+    for attempt in range(max_retries + 1):
+        try:
+            return process_user_doc(user_doc, student_id, output_folder, log_format, flush_size)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_seconds * (2 ** attempt) * (1 + random.random())
+            print(f"Error processing {student_id} (attempt {attempt + 1}): {e}. Retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+# Return the students whose logs were completely downloaded by a previous run
+def load_completed_students(output_folder, log_format='csv'):
+    checkpoint_file = get_checkpoint_file(output_folder)
+    if not os.path.exists(checkpoint_file):
+        return set()
+
+    with open(checkpoint_file, 'r') as f:
+        completed = set(line.strip() for line in f if line.strip())
+
+    # Only trust the checkpoint for students whose file is actually there
+    return set(student for student in completed if os.path.exists(get_log_file(output_folder, student, log_format)))
+
+# Download the logs of every student with at most max_workers downloads at a time. Students that are
+# already in the checkpoint are skipped, so rerunning after an interruption picks up where it left off.
+def download_logs(collection_ref, students, output_folder=output_folder, max_workers=16, max_retries=5, backoff_seconds=1.0, log_format='csv', flush_size=parquet_flush_size):
+    os.makedirs(output_folder, exist_ok=True)
+
+    completed = load_completed_students(output_folder, log_format)
+    remaining = [student for student in students if student not in completed]
+    print(f"Skipping {len(students) - len(remaining)} students that are already downloaded, downloading {len(remaining)}")
+
+    failed = []
+    num_students = 0
+    num_rows = 0
+    start_time = time.time()
+
+    with open(get_checkpoint_file(output_folder), 'a') as checkpoint, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for student in remaining:
+            user_doc = collection_ref.document(student)
+            futures[executor.submit(process_user_doc_with_retries, user_doc, student, output_folder, log_format, flush_size, max_retries, backoff_seconds)] = student
+
+        for future in as_completed(futures):
+            student = futures[future]
+            try:
+                num_rows += future.result()
+            except Exception as e:
+                print(f"Error processing {student}: {e}")
+                failed.append(student)
+                continue
+
+            # Only this thread writes the checkpoint, so it needs no lock
+            checkpoint.write(student + '\n')
+            checkpoint.flush()
+
+            num_students += 1
+            if num_students % 100 == 0:
+                elapsed = time.time() - start_time
+                print(f"Processed {num_students} users ({num_students / elapsed:.1f} users/s, {num_rows / elapsed:.0f} logs/s)")
+
+    elapsed = time.time() - start_time
+    print(f"Downloaded {num_students} users and {num_rows} logs in {elapsed:.1f}s ({num_students / max(elapsed, 1e-9):.1f} users/s, {num_rows / max(elapsed, 1e-9):.0f} logs/s)")
+    if len(failed) > 0:
+        print(f"Failed to download {len(failed)} users: {failed}")
+
+    return num_students, num_rows, failed
+
+def get_student_ids():
+    sl_and_students = pd.read_csv('sl_and_student_data.csv')
+    return list(sl_and_students[sl_and_students['role'] == 'student']['user_id'])
+
+def main_parallel(max_workers=16, log_format='csv', flush_size=parquet_flush_size):
+    db = setup_db()
     collection_ref = db.collection('ide_logs_v2')
-    user_docs = collection_ref.list_documents()
-    
-    futures = []
-    with ThreadPoolExecutor() as executor:
-        count = 0
-        for user_doc in user_docs:
-            futures.append(executor.submit(process_user_doc, user_doc))
-            count += 1
-            if count % 100 == 0:
-                print(f"Processed {count} users")
+
+    students_only = get_student_ids()
+    print("Number of students", len(students_only))
+
+    download_logs(collection_ref, students_only, max_workers=max_workers, log_format=log_format, flush_size=flush_size)
 
 def main_sequential():
-    db = util.setup_db()
+    db = setup_db()
     collection_ref = db.collection('ide_logs_v2')
-    
-    sl_and_students = pd.read_csv('sl_and_student_data.csv')
-    students_only = sl_and_students[sl_and_students['role'] == 'student']['user_id']
+
+    students_only = get_student_ids()
     print("Number of students", len(students_only))
 
     count = 0
@@ -84,7 +237,7 @@ def main_sequential():
         user_doc = collection_ref.document(student)
 
         try:
-            process_user_doc(user_doc, student)
+            process_user_doc(user_doc, student, log_format='csv')
         except Exception as e:
             print(f"Error processing {student}: {e}")
             continue
@@ -93,6 +246,29 @@ def main_sequential():
         if count % 100 == 0:
             print(f"Processed {count} users")
 
+# Time the downloader against a local stand-in for firestore (see fake_firestore.py)
+def main_benchmark(max_workers, log_format='csv', flush_size=parquet_flush_size, num_students=500, output_folder='./benchmark_logs/'):
+    from fake_firestore import FakeFirestore
+
+    db = FakeFirestore(num_students=num_students, latency_seconds=0.01, failure_rate=0.0001)
+    collection_ref = db.collection('ide_logs_v2')
+    students = [user_doc.id for user_doc in collection_ref.list_documents()]
+
+    download_logs(collection_ref, students, output_folder=output_folder, max_workers=max_workers, backoff_seconds=0.01, log_format=log_format, flush_size=flush_size)
+
+    log_files = [filename for filename in os.listdir(output_folder) if filename.endswith('.' + log_format)]
+    total_size = sum(os.path.getsize(output_folder + filename) for filename in log_files)
+    print(f"{len(log_files)} {log_format} files take up {total_size / 1e6:.1f} MB")
+
 if __name__ == '__main__':
-    # main_parallel()
-    main_sequential()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=16, help='number of students to download at a time')
+    parser.add_argument('--format', choices=log_formats, default='parquet', help='file format to save each student\'s logs in')
+    parser.add_argument('--flush-size', type=int, default=parquet_flush_size, help='number of rows in each row group of a parquet file')
+    parser.add_argument('--benchmark', action='store_true', help='download from a local fake firestore instead of the real database')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        main_benchmark(args.workers, args.format, args.flush_size)
+    else:
+        main_parallel(args.workers, args.format, args.flush_size)
@@ -7,19 +7,38 @@ import sys
 sys.path.insert(1, '../utils')
 import util
 
+# Number of documents to read from the database in each batched get
+batch_size = 100
+
 def get_section_id(user_info):
-    return user_info['sections']['cip3'][0].get().id
+    # The id is part of the section's reference, so there is no need to read the section
+    return user_info['sections']['cip3'][0].id
 
 def get_role(user_info):
     return user_info['roles']['cip3']
 
-def get_age(user_id, users_collection, role):
-    user_doc = None
+def get_application_name(role):
     if role == 'student':
-        user_doc = users_collection.document(user_id).collection('cip3').document('studentApplication').get().to_dict()
+        return 'studentApplication'
     elif role == 'sl':
-        user_doc = users_collection.document(user_id).collection('cip3').document('sectionLeaderApplication').get().to_dict()
-    
+        return 'sectionLeaderApplication'
+    return None
+
+def get_application_ref(user_id, users_collection, role):
+    application_name = get_application_name(role)
+    if application_name is None:
+        return None
+    return users_collection.document(user_id).collection('cip3').document(application_name)
+
+def get_application(user_id, users_collection, role):
+    application_ref = get_application_ref(user_id, users_collection, role)
+    if application_ref is None:
+        return None
+    return application_ref.get().to_dict()
+
+# The get_*_from_application functions extract one field from an application document that was already read
+
+def get_age_from_application(user_doc):
     if user_doc:
         try:
             # Calculate age from birthday
@@ -33,13 +52,7 @@ def get_age(user_id, users_collection, role):
     else:
         return -1
 
-def get_gender(user_id, users_collection, role):
-    user_doc = None
-    if role == 'student':
-        user_doc = users_collection.document(user_id).collection('cip3').document('studentApplication').get().to_dict()
-    elif role == 'sl':
-        user_doc = users_collection.document(user_id).collection('cip3').document('sectionLeaderApplication').get().to_dict()
-    
+def get_gender_from_application(user_doc):
     if user_doc:
         try:
             return user_doc['gender']
@@ -48,15 +61,7 @@ def get_gender(user_id, users_collection, role):
     else:
         return None
 
-    
-
-def get_country(user_id, users_collection, role):
-    user_doc = None
-    if role == 'student':
-        user_doc = users_collection.document(user_id).collection('cip3').document('studentApplication').get().to_dict()
-    elif role == 'sl':
-        user_doc = users_collection.document(user_id).collection('cip3').document('sectionLeaderApplication').get().to_dict()
-    
+def get_country_from_application(user_doc):
     if user_doc:
         try:
             country_info = user_doc['country']
@@ -66,15 +71,7 @@ def get_country(user_id, users_collection, role):
     else:
         return None
 
-    
-
-def get_occupation(user_id, users_collection, role):
-    user_doc = None
-    if role == 'student':
-        user_doc = users_collection.document(user_id).collection('cip3').document('studentApplication').get().to_dict()
-    elif role == 'sl':
-        user_doc = users_collection.document(user_id).collection('cip3').document('sectionLeaderApplication').get().to_dict()
-    
+def get_occupation_from_application(user_doc):
     if user_doc:
         try:
             return user_doc['currentOccupation']
@@ -83,13 +80,7 @@ def get_occupation(user_id, users_collection, role):
     else:
         return None
 
-def get_hometown(user_id, users_collection, role):
-    user_doc = None
-    if role == 'student':
-        user_doc = users_collection.document(user_id).collection('cip3').document('studentApplication').get().to_dict()
-    elif role == 'sl':
-        user_doc = users_collection.document(user_id).collection('cip3').document('sectionLeaderApplication').get().to_dict()
-    
+def get_hometown_from_application(user_doc):
     if user_doc:
         try:
             return user_doc['city']
@@ -98,37 +89,66 @@ def get_hometown(user_id, users_collection, role):
     else:
         return None
 
-# Construct a csv file with info on each student and section leader
-def download_user_info_for_sections_analysis():
-    # Open a csv file to write to
-    fieldnames = ["user_id", "role", "gender", "age", "country", "occupation", "section_id", "city"]
-    filename = './cip_data_10-31/section_data.csv'
-    original_df = pd.read_csv(filename)
+# Return every demographic field of the user from a single read of their application
+def get_demographics_from_application(user_doc):
+    return {
+        'age': get_age_from_application(user_doc),
+        'gender': get_gender_from_application(user_doc),
+        'country': get_country_from_application(user_doc),
+        'occupation': get_occupation_from_application(user_doc),
+        'city': get_hometown_from_application(user_doc),
+    }
 
-    filename2 = './cip_data_10-31/section_data2.csv'
-    f = open(filename2, 'w')
-    writer = csv.DictWriter(f, fieldnames=fieldnames)
-    writer.writeheader()
-
-    # Get a reference to the users collection to stream the data from
-    db = util.setup_db()
-    users_collection = db.collection('users')
-    users = users_collection.list_documents()
-
-    # Iterate through each user and write their info to our output file
-    for user_doc in users:
-        # Check if user is in the original csv file
-        user_id = user_doc.id
-        if user_id in original_df['user_id'].values:
-            continue
-        
-        user_info = user_doc.get().to_dict()
+# Each of these reads the user's application from the database. To get several fields, read the
+# application once with get_application and use get_demographics_from_application instead.
+
+def get_age(user_id, users_collection, role):
+    return get_age_from_application(get_application(user_id, users_collection, role))
+
+def get_gender(user_id, users_collection, role):
+    return get_gender_from_application(get_application(user_id, users_collection, role))
+
+def get_country(user_id, users_collection, role):
+    return get_country_from_application(get_application(user_id, users_collection, role))
+
+def get_occupation(user_id, users_collection, role):
+    return get_occupation_from_application(get_application(user_id, users_collection, role))
+
+def get_hometown(user_id, users_collection, role):
+    return get_hometown_from_application(get_application(user_id, users_collection, role))
+
+# Split an iterable into lists of at most size items
+def get_batches(items, size=batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+# Read the given documents with one multi-document get, and return their contents keyed by document path.
+# Documents that don't exist map to None.
+def get_all_documents(db, refs):
+    if len(refs) == 0:
+        return {}
+    return { snapshot.reference.path: snapshot.to_dict() for snapshot in db.get_all(refs) }
+
+# Return the rows of the users in the batch that are students or section leaders, reading the users'
+# documents with one batched get and their applications with another
+def get_user_rows(db, users_collection, user_refs):
+    user_infos = get_all_documents(db, user_refs)
+
+    user_rows = []
+    for user_ref in user_refs:
+        user_info = user_infos.get(user_ref.path)
 
         # Ignore users that don't exits, don't have a section, or don't have a role
         if user_info is None or 'sections' not in user_info or 'roles' not in user_info or 'cip3' not in user_info['sections'] or 'cip3' not in user_info['roles']:
             continue
-        
-        user_row = { 'user_id': user_doc.id }
+
+        user_row = { 'user_id': user_ref.id }
         user_row['section_id'] = get_section_id(user_info)
         user_row['role'] = get_role(user_info)
 
@@ -136,14 +156,45 @@ def download_user_info_for_sections_analysis():
         if user_row['role'] != 'student' and user_row['role'] != 'sl':
             continue
 
-        user_row['age'] = get_age(user_doc.id, users_collection, user_row['role'])
-        user_row['gender'] = get_gender(user_doc.id, users_collection, user_row['role'])
-        user_row['country'] = get_country(user_doc.id, users_collection, user_row['role'])
-        user_row['occupation'] = get_occupation(user_doc.id, users_collection, user_row['role'])
-        user_row['city'] = get_hometown(user_doc.id, users_collection, user_row['role'])
+        user_rows.append(user_row)
+
+    application_refs = [get_application_ref(user_row['user_id'], users_collection, user_row['role']) for user_row in user_rows]
+    applications = get_all_documents(db, application_refs)
+
+    for user_row, application_ref in zip(user_rows, application_refs):
+        user_row.update(get_demographics_from_application(applications.get(application_ref.path)))
+
+    return user_rows
+
+# Construct a csv file with info on each student and section leader
+def download_user_info_for_sections_analysis():
+    # Open a csv file to write to
+    fieldnames = ["user_id", "role", "gender", "age", "country", "occupation", "section_id", "city"]
+    filename = './cip_data_10-31/section_data.csv'
+    original_df = pd.read_csv(filename)
+    original_user_ids = set(original_df['user_id'])
+
+    filename2 = './cip_data_10-31/section_data2.csv'
+    with open(filename2, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
 
-        # Write the user's info to the csv file
-        writer.writerow(user_row)
+        # Get a reference to the users collection to stream the data from
+        db = util.setup_db()
+        users_collection = db.collection('users')
+        users = users_collection.list_documents()
+
+        # Skip the users that are already in the original csv file
+        new_users = (user_doc for user_doc in users if user_doc.id not in original_user_ids)
+
+        # Read the users in batches and write their info to our output file
+        count = 0
+        for user_refs in get_batches(new_users):
+            user_rows = get_user_rows(db, users_collection, user_refs)
+            writer.writerows(user_rows)
+
+            count += len(user_refs)
+            print(f"Processed {count} users")
 
 def check_sections_data_csv():
     filename = './cip_data_10-23/section_data.csv'
@@ -183,9 +234,6 @@ def check_sections_data_csv():
     print('Number of null values in each column:')
     print(df.isnull().sum())
 
-
-
-
-
-download_user_info_for_sections_analysis()
-# check_sections_data_csv()
\ No newline at end of file
+if __name__ == '__main__':
+    download_user_info_for_sections_analysis()
+    # check_sections_data_csv()
@@ -0,0 +1,98 @@
+# A local stand-in for the parts of the firestore client that download_logs_per_student uses,
+# so that the downloader can be run and timed without the real database.
+#
+#   db = FakeFirestore(num_students=100)
+#   collection_ref = db.collection('ide_logs_v2')
+#   collection_ref.list_documents(), collection_ref.document(user_id).collection('logs').stream()
+#
+# Every stream waits latency_seconds before returning its first document, and can fail with
+# probability failure_rate before each of the following documents, like a dropped connection.
+
+import time
+import random
+import threading
+from datetime import datetime, timedelta
+
+class FakeDocumentSnapshot:
+    def __init__(self, id, data):
+        self.id = id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeCollectionReference:
+    def __init__(self, db, documents):
+        self.db = db
+        self.documents = documents
+
+    def document(self, id):
+        return FakeDocumentReference(self.db, id, self.documents.get(id, {}))
+
+    def list_documents(self):
+        return [FakeDocumentReference(self.db, id, subcollections) for id, subcollections in self.documents.items()]
+
+    # Yield each document in the collection, in the order of their ids like firestore does
+    def stream(self):
+        self.db.wait()
+        for i, id in enumerate(sorted(self.documents)):
+            if i > 0 and self.db.should_fail():
+                raise ConnectionError(f"Stream was interrupted after {i} documents")
+            yield FakeDocumentSnapshot(id, self.documents[id])
+
+class FakeDocumentReference:
+    def __init__(self, db, id, subcollections):
+        self.db = db
+        self.id = id
+        self.subcollections = subcollections
+
+    def collection(self, name):
+        return FakeCollectionReference(self.db, self.subcollections.get(name, {}))
+
+class FakeFirestore:
+    def __init__(self, num_students=100, logs_per_student=200, latency_seconds=0.0, failure_rate=0.0, seed=0):
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        students = {}
+        for i in range(num_students):
+            students[f'student{i:05d}'] = { 'logs': make_fake_logs(self.random, logs_per_student) }
+        self.collections = { 'ide_logs_v2': students }
+
+    def collection(self, name):
+        return FakeCollectionReference(self, self.collections.setdefault(name, {}))
+
+    def wait(self):
+        if self.latency_seconds > 0:
+            time.sleep(self.latency_seconds)
+
+    def should_fail(self):
+        with self.lock:
+            return self.random.random() < self.failure_rate
+
+# Return the logs of one student, keyed by their ogTimestamp like the real logs collection
+def make_fake_logs(rng, num_logs):
+    logs = {}
+    timestamp = datetime(2023, 4, 24) + timedelta(seconds=rng.randrange(7 * 24 * 3600))
+    for i in range(num_logs):
+        timestamp += timedelta(seconds=rng.randrange(5, 600))
+        has_error = rng.random() < 0.4
+        logs[timestamp.isoformat(timespec='milliseconds') + 'Z'] = {
+            'projectData': {
+                'assnId': f'assn{rng.randrange(20)}',
+                'type': 'console',
+                'title': 'Fake assignment',
+                'uid': f'project{rng.randrange(10)}',
+            },
+            'code': 'x = int(input("Number: "))\n' * rng.randrange(1, 30),
+            'codeRunResults': {
+                'error_message': ['NameError: name \'y\' is not defined'] if has_error else [],
+                'error': ['Traceback (most recent call last):\nNameError: name \'y\' is not defined'] if has_error else [],
+                'output': 'Number: 5\n' * rng.randrange(1, 10),
+            },
+            'serverTimestamp': timestamp.isoformat(),
+            'unitTestResults': [{ 'state': 'passed' }] * rng.randrange(3),
+        }
+    return logs
@@ -5,9 +5,10 @@ import numpy as np
 
 # import the function
 from parse_short_term_results import get_runs_until_resolved
+from log_store import read_student_log, run_columns
 
 def get_average_run_length(user_id):
-    user_df = pd.read_csv(f'../data_files/student_logs/{user_id}.csv', dtype=str, lineterminator='\n')
+    user_df = read_student_log(user_id, run_columns)
     run_counts = get_runs_until_resolved(user_df)
     if len(run_counts) == 0:
         # print(f"User {user_id} has no run counts")
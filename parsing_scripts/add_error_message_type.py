@@ -1,16 +1,19 @@
+import argparse
 import pandas as pd
-import os
+from concurrent.futures import ProcessPoolExecutor
 import ast
-import numpy as np
 from error_message_types import get_error_message_type_for_df
+from log_store import read_student_log, get_log_file_user_ids, read_student_log_file, write_student_log_file, csv_shard_size
 
 # Add the error message type column to every log file
 
-log_folder = '../data_files/student_logs/'
-
 # Get the first error message type for a given row
 def get_row_error_message_type(row):
-    error_messages = ast.literal_eval(row['error_message'])
+    # Logs read from the log store already have their error messages decoded
+    if 'error_messages' in row:
+        error_messages = row['error_messages']
+    else:
+        error_messages = ast.literal_eval(row['error_message'])
 
     if len(error_messages) > 0:
         # Get the error message type
@@ -20,20 +23,71 @@ def get_row_error_message_type(row):
         # If there is no error message, return None
         return None
 
-def add_error_message_type_to_logs():
-    for log_file in os.listdir(log_folder):
-        try:
-            df = pd.read_csv(log_folder + log_file)
-            df['error_message_type'] = None
+# Matches the start of a stringified list of error messages, up to the first colon or quote of the first
+# error message. If the prefix is followed by a colon, or by the quote that closes the first error message
+# (and then the end of the element), the prefix is the error message type. Otherwise (e.g. an escaped quote)
+# the row is decoded in full.
+error_message_prefix_regex = r"""^\[\s*(?P<quote>['"])(?P<prefix>[^:'"\\]*)(?:(?P<colon>:)|(?P<close>(?P=quote)\s*[,\]]))?"""
+
+# Return the error message type of every row, the same as get_row_error_message_type for each row
+def get_error_message_type_column(df):
+    # Logs read from the log store already have their error messages decoded
+    if 'error_messages' in df.columns:
+        return df['error_messages'].map(lambda error_messages: error_messages[0].split(':')[0].strip() if len(error_messages) > 0 else None)
+
+    error_message = df['error_message']
+    if error_message.isna().any():
+        raise ValueError(f'{error_message.isna().sum()} rows have no error_message')
+
+    error_message_types = pd.Series([None] * len(df), index=df.index, dtype=object)
+
+    matches = error_message.str.extract(error_message_prefix_regex)
+    matched = matches['colon'].notna() | matches['close'].notna()
+    error_message_types[matched] = matches.loc[matched, 'prefix'].str.strip()
+
+    # Rows without any error messages
+    empty = ~matched & error_message.str.fullmatch(r'\[\s*\]')
+
+    # Decode the few rows that the prefix does not cover
+    for index in error_message.index[~matched & ~empty]:
+        error_message_types[index] = get_row_error_message_type(df.loc[index])
 
-            for index, row in df.iterrows():
-                df.at[index, 'error_message_type'] = get_row_error_message_type(row)
+    return error_message_types
 
-            df.to_csv(log_folder + log_file, index=False)
-            
-        except Exception as e:
-            print(f"Error processing {log_file}")
-            continue
+# Tag one student's log file, and return None, or the reason the file could not be tagged
+def add_error_message_type_to_log(user_id):
+    try:
+        df = read_student_log_file(user_id, downloaded=True)
+        df['error_message_type'] = get_error_message_type_column(df)
+        write_student_log_file(user_id, df)
+    except Exception as e:
+        return f'{type(e).__name__}: {e}'
+    return None
+
+def add_error_message_types_to_logs(user_ids):
+    return [add_error_message_type_to_log(user_id) for user_id in user_ids]
+
+# Tag every log file in a pool of worker processes. Each file is written to a temporary file and then
+# renamed, so a file is never left half tagged. Return a list of (user_id, reason) for the files that failed.
+def add_error_message_type_to_logs(workers=1):
+    user_ids = get_log_file_user_ids()
+    shards = [user_ids[i:i + csv_shard_size] for i in range(0, len(user_ids), csv_shard_size)]
+
+    if workers <= 1:
+        shard_reasons = [add_error_message_types_to_logs(shard) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shard_reasons = list(executor.map(add_error_message_types_to_logs, shards))
+
+    failures = []
+    for shard, reasons in zip(shards, shard_reasons):
+        for user_id, reason in zip(shard, reasons):
+            if reason is not None:
+                print(f"Error processing {user_id}: {reason}")
+                failures.append((user_id, reason))
+
+    print(f"Tagged {len(user_ids) - len(failures)} log files, {len(failures)} failed")
+    return failures
 
 def add_error_message_type_to_overall_data():
     # Load the data
@@ -45,8 +99,8 @@ def add_error_message_type_to_overall_data():
     # For each row
     students_only = sl_and_student_data[sl_and_student_data['role'] == 'student']
     for i, row in students_only.iterrows():
-        # Get the error message type for this student
-        df = pd.read_csv(f'../data_files/student_logs/{row["user_id"]}.csv', dtype=str, lineterminator='\n')
+        # Get the error message type for this student, only reading the column it is in
+        df = read_student_log(row['user_id'], columns=['error_message_type'])
         error_message_types = get_error_message_type_for_df(df)
         if len(error_message_types) == 1:
             sl_and_student_data.at[i, 'error_message_type'] = error_message_types[0]
@@ -57,6 +111,13 @@ def add_error_message_type_to_overall_data():
     sl_and_student_data.to_csv('../data_files/sl_and_student_data.csv', index=False)
 
 if __name__ == '__main__':
-    # add_error_message_type_to_logs()
-    add_error_message_type_to_overall_data()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logs', action='store_true', help='tag each row of every log file, instead of each student in sl_and_student_data.csv')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to tag the log files with')
+    args = parser.parse_args()
+
+    if args.logs:
+        add_error_message_type_to_logs(args.workers)
+    else:
+        add_error_message_type_to_overall_data()
     
\ No newline at end of file
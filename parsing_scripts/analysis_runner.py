@@ -0,0 +1,185 @@
+import os
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from statsmodels.formula.api import ols
+from statsmodels.stats.multicomp import pairwise_tukeyhsd
+from analyze_demographics_results import get_hdi_data, get_gender_data, get_experience_data
+from analyze_long_term_results import get_runs_until_resolved_data
+
+# Runs the ANOVA and pairwise Tukey HSD tests of analyze_demographics_results.py and
+# analyze_long_term_results.py, for every group of every analysis, and writes them to one report
+# instead of printing the tables.
+#
+# Each group is fit in a pool of worker processes, and the results of each fit are saved in a cache
+# keyed by a hash of the group's data, so rerunning the analyses only fits the groups whose data changed.
+# The cache is only valid for the version of the fitting code that wrote it: bump cache_version after
+# changing fit_group.
+#
+#   python analysis_runner.py --workers 4
+#   python analysis_runner.py --analyses hdi gender
+
+cache_file = '../data_files/analysis_cache.json'
+report_csv_file = '../data_files/analysis_results.csv'
+report_json_file = '../data_files/analysis_results.json'
+
+cache_version = 1
+
+default_alpha = 0.05
+
+# The analyses to run: the function that loads the data, the column that is compared, the column
+# whose effect is tested, and the column whose groups are each tested on their own
+analyses = {
+    'hdi': (get_hdi_data, 'avg_error_run_length', 'hdi_bin', 'error_message_type'),
+    'gender': (get_gender_data, 'avg_error_run_length', 'gender', 'error_message_type'),
+    'experience': (get_experience_data, 'avg_error_run_length', 'error_message_type', 'experience_bucket'),
+    'runs_until_resolved': (get_runs_until_resolved_data, 'length_of_run', 'week', 'error_message_type'),
+}
+
+def load_cache(path=cache_file):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+# Write the cache to a temporary file first, so that an interrupted run never leaves a half written cache
+def save_cache(cache, path=cache_file):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+# Return the key of a fit in the cache, from the columns it uses, its data and alpha
+def get_fit_key(subset, value_column, test_column, alpha):
+    sha1 = hashlib.sha1()
+    sha1.update(json.dumps([cache_version, value_column, test_column, alpha]).encode('utf-8'))
+    sha1.update(pd.util.hash_pandas_object(subset[[value_column, test_column]], index=False).to_numpy().tobytes())
+    return sha1.hexdigest()
+
+# Return a json serializable float, with nan as None
+def to_json_float(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+# Fit the ANOVA and the pairwise Tukey HSD of one group, as in analyze_param_within_group, and return
+# their tables as lists of rows. A group that cannot be fit (e.g. it only has one value of test_column, or
+# test_column has missing values) returns the error instead.
+def fit_group(subset, value_column, test_column, alpha=default_alpha):
+    try:
+        model = ols(f'{value_column} ~ C({test_column})', data=subset).fit()
+        anova_table = sm.stats.anova_lm(model, typ=2)
+        tukey = pairwise_tukeyhsd(endog=subset[value_column], groups=subset[test_column], alpha=alpha)
+    except (ValueError, TypeError, np.linalg.LinAlgError) as e:
+        return { 'anova': [], 'tukey': [], 'error': str(e) }
+
+    anova = []
+    for term, row in anova_table.iterrows():
+        anova.append({
+            'term': term,
+            'sum_sq': to_json_float(row['sum_sq']),
+            'df': to_json_float(row['df']),
+            'F': to_json_float(row['F']),
+            'p_value': to_json_float(row['PR(>F)']),
+        })
+
+    # The pairs are in the same order as in the summary of the tukey results
+    tukey_rows = []
+    groups_a, groups_b = np.triu_indices(len(tukey.groupsunique), 1)
+    for i, (a, b) in enumerate(zip(groups_a, groups_b)):
+        tukey_rows.append({
+            'group_a': str(tukey.groupsunique[a]),
+            'group_b': str(tukey.groupsunique[b]),
+            'mean_difference': to_json_float(tukey.meandiffs[i]),
+            'p_value': to_json_float(tukey.pvalues[i]),
+            'ci_low': to_json_float(tukey.confint[i][0]),
+            'ci_high': to_json_float(tukey.confint[i][1]),
+            'reject': bool(tukey.reject[i]),
+        })
+
+    return { 'anova': anova, 'tukey': tukey_rows, 'error': None }
+
+def fit_group_with_args(args):
+    return fit_group(*args)
+
+# Return a list of (analysis, group, subset, value column, test column) for every group of the analyses
+def get_fits(analysis_names):
+    fits = []
+    for analysis in analysis_names:
+        get_data, value_column, test_column, within_column = analyses[analysis]
+        df = get_data()
+        for group in df[within_column].dropna().unique():
+            subset = df[df[within_column] == group]
+            fits.append((analysis, group, subset, value_column, test_column))
+    return fits
+
+# Fit every group of the analyses, only fitting the groups that are not in the cache, and return a
+# list of (analysis, group, number of rows, results) in the order of get_fits
+def run_fits(analysis_names, alpha=default_alpha, workers=1, use_cache=True):
+    cache = load_cache() if use_cache else {}
+    fits = get_fits(analysis_names)
+    keys = [get_fit_key(subset, value_column, test_column, alpha) for _, _, subset, value_column, test_column in fits]
+
+    missing = {}
+    for key, (_, _, subset, value_column, test_column) in zip(keys, fits):
+        if key not in cache and key not in missing:
+            missing[key] = (subset, value_column, test_column, alpha)
+    print(f'Fitting {len(missing)} of {len(fits)} groups, the rest are cached')
+
+    if workers <= 1 or len(missing) <= 1:
+        fitted = [fit_group_with_args(args) for args in missing.values()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            fitted = list(executor.map(fit_group_with_args, missing.values()))
+    cache.update(zip(missing, fitted))
+
+    if use_cache and len(missing) > 0:
+        save_cache(cache)
+
+    return [(analysis, group, len(subset), cache[key]) for key, (analysis, group, subset, _, _) in zip(keys, fits)]
+
+# Return the report as a dataframe with one row per ANOVA term and per Tukey pair of every group
+def get_report_rows(results):
+    rows = []
+    for analysis, group, num_rows, fit in results:
+        base = { 'analysis': analysis, 'group': str(group), 'n': num_rows }
+        if fit['error'] is not None:
+            rows.append({ **base, 'test': 'error', 'error': fit['error'] })
+        for row in fit['anova']:
+            rows.append({ **base, 'test': 'anova', **row })
+        for row in fit['tukey']:
+            rows.append({ **base, 'test': 'tukey', **row })
+    return pd.DataFrame(rows)
+
+def write_report(results, csv_file=report_csv_file, json_file=report_json_file):
+    get_report_rows(results).to_csv(csv_file, index=False)
+
+    report = {}
+    for analysis, group, num_rows, fit in results:
+        report.setdefault(analysis, []).append({ 'group': str(group), 'n': num_rows, **fit })
+    with open(json_file, 'w') as f:
+        json.dump(report, f, indent=1)
+
+def run_analyses(analysis_names=list(analyses), alpha=default_alpha, workers=1, use_cache=True):
+    results = run_fits(analysis_names, alpha, workers, use_cache)
+    write_report(results)
+
+    for analysis in analysis_names:
+        significant = [str(group) for result_analysis, group, _, fit in results
+                       if result_analysis == analysis and any(row['p_value'] is not None and row['p_value'] < alpha for row in fit['anova'])]
+        print(f"{analysis}: significant ANOVA in {len(significant)} groups {significant}")
+    print(f'Wrote {report_csv_file} and {report_json_file}')
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--analyses', nargs='+', choices=list(analyses), default=list(analyses), help='the analyses to run')
+    parser.add_argument('--alpha', type=float, default=default_alpha)
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to fit the groups in')
+    parser.add_argument('--no-cache', action='store_true', help='fit every group, and do not read or write the cache')
+    args = parser.parse_args()
+
+    run_analyses(args.analyses, args.alpha, args.workers, not args.no_cache)
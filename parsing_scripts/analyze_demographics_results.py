@@ -35,15 +35,24 @@ def analyze_param_within_group(df, test_column, within_column):
         print(tukey)
 
 
-def check_effect_of_hdi():
+# Return the students that were shown one of error_message_types
+def read_students():
     df = pd.read_csv(f'{data_folder}sl_and_student_data.csv')
-    df = df[df['error_message_type'].isin(error_message_types)]
+    return df[df['error_message_type'].isin(error_message_types)]
+
+# Return the students with an hdi and an average error run length, with their hdi put into bins
+def get_hdi_data():
+    df = read_students()
     df = df.dropna(subset=['avg_error_run_length'])
     df = df.dropna(subset=['hdi'])
 
     # Assuming your DataFrame is df
     bins = [0, 0.54999, 0.69999, 0.79999, 1]
     df['hdi_bin'] = pd.cut(df['hdi'], bins)
+    return df
+
+def check_effect_of_hdi():
+    df = get_hdi_data()
 
     print("Checking effect of HDI on average error run length, within each error message type")
     analyze_param_within_group(df, 'hdi_bin', 'error_message_type')
@@ -51,9 +60,14 @@ def check_effect_of_hdi():
     # print("Checking effect of error message type on average error run length, within each HDI group")
     # analyze_param_within_group(df, 'error_message_type', 'hdi_bin')
 
+# Return the students with an average error run length, and their gender, out of df (read_students by default)
+def get_gender_data(df=None):
+    if df is None:
+        df = read_students()
+    return df.dropna(subset=['avg_error_run_length'])
+
 def check_effect_of_gender():
-    df = pd.read_csv(f'{data_folder}sl_and_student_data.csv')
-    df = df[df['error_message_type'].isin(error_message_types)]
+    df = read_students()
     print(len(df))
     # Print number of students in each gender
     f = len(df[df['gender'] == 'female'])
@@ -62,7 +76,7 @@ def check_effect_of_gender():
 
     print(f'{m} students identify as male, {f} students identify as female, and {o} students do not identify as either')
 
-    df = df.dropna(subset=['avg_error_run_length'])
+    df = get_gender_data(df)
 
     print("Checking effect of gender on average error run length, within each error message type")
     analyze_param_within_group(df, 'gender', 'error_message_type')
@@ -70,9 +84,9 @@ def check_effect_of_gender():
     # print("Checking effect of error message type on average error run length, within each gender")
     # analyze_param_within_group(df, 'error_message_type', 'gender')
 
-def check_effect_of_experience():
-    df = pd.read_csv(f'{data_folder}sl_and_student_data.csv')
-    df = df[df['error_message_type'].isin(error_message_types)]
+# Return the students with an experience and an average error run length, with their experience put into 5 buckets
+def get_experience_data():
+    df = read_students()
     df = df.dropna(subset=['avg_error_run_length'])
     df = df.dropna(subset=['experience'])
 
@@ -82,6 +96,10 @@ def check_effect_of_experience():
 
     # Assuming your 'experience' is a continuous variable, we will create buckets using pandas "cut"
     df["experience_bucket"] = pd.cut(df['experience'], bins=5)
+    return df
+
+def check_effect_of_experience():
+    df = get_experience_data()
 
     # print("Checking effect of experience on average error run length, within each error message type")
     # analyze_param_within_group(df, 'experience_bucket', 'error_message_type')
@@ -1,4 +1,3 @@
-import json
 import numpy as np
 import pandas as pd
 from statsmodels.formula.api import ols
@@ -6,8 +5,7 @@ import statsmodels.api as sm
 from statsmodels.stats.multicomp import pairwise_tukeyhsd
 from scipy import stats
 from error_message_types import official_error_types
-
-data_folder = '../data_files/long_term_data/'
+from results_store import get_results
 
 error_message_types = ['default', 'explain', 'messageboard', 'tigerpython', 'superhero', 'gpt']
 
@@ -26,8 +24,7 @@ def independent_t_test(list1, list2):
 # For each week, compare the error rate of each error message type to the overall average error rate
 def check_statistical_significance_of_percents_per_week():
     # Load the data
-    f = open(f'{data_folder}percent_errors_over_time.json')
-    percent_errors_over_time = json.load(f)
+    percent_errors_over_time = get_results('percent_errors_over_time')
 
     # Get the average percent errors per week
     no_error_message_types = { 1: [], 2: [], 3: [], 4: [], 5: [], 6: [], 7: [] }
@@ -37,22 +34,21 @@ def check_statistical_significance_of_percents_per_week():
         # For each week
         for week in range(1, 8):
             # Add the percent errors for this week to the list of percent errors for this week
-            no_error_message_types[week].extend(percent_errors_over_time[error_message_type][str(week)])
+            no_error_message_types[week].extend(percent_errors_over_time[error_message_type][week])
 
     for error_message_type in percent_errors_over_time:
         print(official_error_types[error_message_type])
         for week in range(2, 7):
-            # print(error_message_type, week, percent_errors_over_time[error_message_type][str(week)])
+            # print(error_message_type, week, percent_errors_over_time[error_message_type][week])
             # print('no_error_message_types[week]', no_error_message_types[week])
-            p_value = independent_t_test(percent_errors_over_time[error_message_type][str(week)], no_error_message_types[week])
+            p_value = independent_t_test(percent_errors_over_time[error_message_type][week], no_error_message_types[week])
             if p_value < 0.05:
                 print('Week ' + str(week) + ': ' + str(p_value))
         print()
 
 def check_statistical_significance_of_length_error_runs_per_week():
     # Load the data
-    f = open(f'{data_folder}length_error_runs_over_time.json')
-    length_error_runs_over_time = json.load(f)
+    length_error_runs_over_time = get_results('length_error_runs_over_time')
 
     # All of the length error runs for each week
     no_error_message_types = { 1: [], 2: [], 3: [], 4: [], 5: [], 6: [], 7: [] }
@@ -62,31 +58,34 @@ def check_statistical_significance_of_length_error_runs_per_week():
         # For each week
         for week in range(1, 8):
             # Add the percent errors for this week to the list of percent errors for this week
-            no_error_message_types[week].extend(length_error_runs_over_time[error_message_type][str(week)])
+            no_error_message_types[week].extend(length_error_runs_over_time[error_message_type][week])
 
     for error_message_type in length_error_runs_over_time:
         print(official_error_types[error_message_type])
         for week in range(2, 7):
-            p_value = independent_t_test(length_error_runs_over_time[error_message_type][str(week)], no_error_message_types[week])
+            p_value = independent_t_test(length_error_runs_over_time[error_message_type][week], no_error_message_types[week])
             print('Week ' + str(week) + ': ' + str(p_value))
         print()
 
-def analyze_runs_until_resolved_using_regression():
+# Return a dataframe of the average length of each student's error runs in each of weeks 2 to 6, and their error message type
+def get_runs_until_resolved_data():
     # Load the data
-    f = open(f'{data_folder}length_error_runs_over_time.json')
-    length_error_runs_over_time = json.load(f)
+    length_error_runs_over_time = get_results('length_error_runs_over_time')
 
     # Make a dataframe with column for the error message type, the number of runs until resolved, and the week number
     data = { 'error_message_type': [], 'length_of_run': [], 'week': [] }
     for error_message_type in length_error_runs_over_time:
         for week in range(2, 7):
-            for run in length_error_runs_over_time[error_message_type][str(week)]:
+            for run in length_error_runs_over_time[error_message_type][week]:
                 data['error_message_type'].append(error_message_type)
                 data['length_of_run'].append(run)
                 data['week'].append(week)
 
     # Create a dataframe from the data
-    df = pd.DataFrame(data)
+    return pd.DataFrame(data)
+
+def analyze_runs_until_resolved_using_regression():
+    df = get_runs_until_resolved_data()
 
     for error_message_type in official_error_types:
         subset = df[df['error_message_type'] == error_message_type]
@@ -108,19 +107,17 @@ def analyze_runs_until_resolved_using_regression():
 # For each week, compare the error rate for every combination of error message types
 def analyze_percents_per_week():
     # Load the data
-    f = open(f'{data_folder}percent_errors_over_time.json')
-    percent_errors_over_time = json.load(f)
+    percent_errors_over_time = get_results('percent_errors_over_time')
 
     print("Checking statistical significance for percents per week:")
     for week in range(2, 7):
-        wk_str = str(week)
-        print("Week " + wk_str)
+        print("Week " + str(week))
         for i in range(len(error_message_types)):
             for j in range(i+1, len(error_message_types)):
-                mean_i = round(np.mean(percent_errors_over_time[error_message_types[i]][wk_str]), 3)
-                mean_j = round(np.mean(percent_errors_over_time[error_message_types[j]][wk_str]), 3)
+                mean_i = round(np.mean(percent_errors_over_time[error_message_types[i]][week]), 3)
+                mean_j = round(np.mean(percent_errors_over_time[error_message_types[j]][week]), 3)
                 
-                p_value = independent_t_test(percent_errors_over_time[error_message_types[i]][wk_str], percent_errors_over_time[error_message_types[j]][wk_str])
+                p_value = independent_t_test(percent_errors_over_time[error_message_types[i]][week], percent_errors_over_time[error_message_types[j]][week])
                 p_value = round(p_value, 3)
 
                 if p_value < 0.05:
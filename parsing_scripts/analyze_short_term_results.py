@@ -1,8 +1,6 @@
 import numpy as np
-import json
 from scipy import stats
-
-data_folder = "../data_files/short_term_data/"
+from results_store import get_results
 
 error_message_types = ['default', 'explain', 'messageboard', 'tigerpython', 'superhero', 'gpt']
 
@@ -13,8 +11,7 @@ def compare(baseline, test):
 
 # Print out the percent of runs that users repeat their error for each error message type
 def print_percent_same_error():
-    f = open(f'{data_folder}percent_same_subsequent_error.json', 'r')
-    same_subsequent_error_per_user_results = json.load(f)
+    same_subsequent_error_per_user_results = get_results('percent_same_subsequent_error')
 
     for error_message_type in error_message_types:
         print(f"Average percent same subsequent error for {error_message_type}: {np.mean(same_subsequent_error_per_user_results[error_message_type])}")
@@ -23,8 +20,7 @@ def print_percent_same_error():
     print("Comparing Long Explnation vs GPT-Default", compare(np.mean(same_subsequent_error_per_user_results['explain']), np.mean(same_subsequent_error_per_user_results['gpt'])))
 
 def print_average_runs_until_resolved():
-    f = open(f'{data_folder}average_runs_until_resolved.json', 'r')
-    runs_until_resolved_per_user_results = json.load(f)
+    runs_until_resolved_per_user_results = get_results('average_runs_until_resolved')
 
     for error_message_type in error_message_types:
         print(f"Average runs until resolved for {error_message_type}: {np.mean(runs_until_resolved_per_user_results[error_message_type])}")
@@ -46,8 +42,7 @@ def independent_t_test(list1, list2):
     return p_value
 
 def check_statistical_significance_of_percentages():
-    f = open(f'{data_folder}percent_same_subsequent_error.json', 'r')
-    same_subsequent_error_per_user_results = json.load(f)
+    same_subsequent_error_per_user_results = get_results('percent_same_subsequent_error')
     
     print("Checking statistical significance of percent repeat error")
     for i in range(len(error_message_types)):
@@ -59,8 +54,7 @@ def check_statistical_significance_of_percentages():
                 print("No statistically significant difference between " + error_message_types[i] + " and " + error_message_types[j])
 
 def check_statistical_significance_of_runs_until_resolved():
-    f = open(f'{data_folder}average_runs_until_resolved.json', 'r')
-    runs_until_resolved_per_user_results = json.load(f)
+    runs_until_resolved_per_user_results = get_results('average_runs_until_resolved')
 
     print("Checking statistical significance for runs until resolved:")
     for i in range(len(error_message_types)):
@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+import pandas as pd
+from clean_error_message import generalize_error_message, get_clean_last_line, normalization_cache
+from error_message_types import get_raw_errors
+from generate_synthetic_logs import generate_student_log_df
+from parse_short_term_results import get_runs_until_resolved
+from parse_long_term_results import get_week, length_error_runs_over_time_for_user
+
+# Times the hot paths of the parsing scripts on students of different shapes, so that performance work
+# can be measured. Each benchmark reports the operations per second (the best of several repeats) and
+# the peak memory that tracemalloc sees during one repeat. Results are saved as json, and can be compared
+# against a saved baseline: a benchmark regresses if it is more than threshold slower than the baseline.
+#
+#   python benchmark_parsing.py --save-baseline       # save the current numbers as the baseline
+#   python benchmark_parsing.py                       # compare against the baseline, exit with 1 on a regression
+
+benchmark_folder = '../data_files/benchmarks/'
+results_file = f'{benchmark_folder}results.json'
+baseline_file = f'{benchmark_folder}baseline.json'
+
+default_repeats = 5
+default_threshold = 0.2
+
+# The shapes of students to benchmark: (number of runs, chance a run has an error, chance a run is karel).
+# The students are generated by generate_synthetic_logs.
+student_shapes = {
+    'long': (5000, 0.3, 0.1),
+    'error_heavy': (1000, 0.9, 0.05),
+    'karel_heavy': (1000, 0.3, 0.8),
+}
+
+# Return a dict of benchmark name to (function, number of operations). Each function runs the
+# operations once. The students are built here, so that building them is not timed.
+def get_benchmarks():
+    benchmarks = {}
+
+    for shape, (num_runs, error_rate, karel_rate) in student_shapes.items():
+        df = generate_student_log_df(0, num_runs=num_runs, error_rate=error_rate, karel_rate=karel_rate)
+        rows = df.to_dict('records')
+        raw_errors = [raw_error for row in rows for raw_error in get_raw_errors(row)]
+        timestamps = list(df['ogTimestamp'])
+
+        benchmarks[f'clean_error_message/{shape}'] = (lambda raw_errors=raw_errors: [generalize_error_message(get_clean_last_line(raw_error)) for raw_error in raw_errors], len(raw_errors))
+        benchmarks[f'get_raw_errors/{shape}'] = (lambda rows=rows: [get_raw_errors(row) for row in rows], len(rows))
+        benchmarks[f'get_runs_until_resolved/{shape}'] = (lambda df=df: get_runs_until_resolved(df), len(df))
+        benchmarks[f'length_error_runs_over_time_for_user/{shape}'] = (lambda df=df: length_error_runs_over_time_for_user(df), len(df))
+        benchmarks[f'get_week/{shape}'] = (lambda timestamps=timestamps: [get_week(timestamp) for timestamp in timestamps], len(timestamps))
+
+    return benchmarks
+
+# Time one benchmark, and return its results. The normalization cache is cleared before every
+# repeat, so that each repeat normalizes the errors from scratch.
+def run_benchmark(function, num_ops, repeats=default_repeats):
+    times = []
+    for _ in range(repeats):
+        normalization_cache.normalized_errors.clear()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    normalization_cache.normalized_errors.clear()
+    tracemalloc.start()
+    function()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best_time = min(times)
+    return {
+        'ops': num_ops,
+        'seconds': best_time,
+        'ops_per_sec': num_ops / best_time if best_time > 0 else float('inf'),
+        'peak_memory_bytes': peak_memory,
+    }
+
+def run_benchmarks(name_filter=None, repeats=default_repeats):
+    results = {}
+    for name, (function, num_ops) in get_benchmarks().items():
+        if name_filter is not None and name_filter not in name:
+            continue
+        results[name] = run_benchmark(function, num_ops, repeats)
+        print(f"{name:55} {results[name]['ops_per_sec']:>14,.0f} ops/sec {results[name]['peak_memory_bytes'] / 1e6:>9.2f} MB")
+
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'repeats': repeats,
+        'benchmarks': results,
+    }
+
+def save_results(results, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=4)
+
+# Return a list of (name, baseline ops/sec, ops/sec, change) for the benchmarks that are more than
+# threshold slower than the baseline
+def get_regressions(results, baseline, threshold=default_threshold):
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        baseline_ops_per_sec = baseline['benchmarks'][name]['ops_per_sec']
+        change = result['ops_per_sec'] / baseline_ops_per_sec - 1
+        print(f"{name:55} {change:+8.1%} vs baseline")
+        if change < -threshold:
+            regressions.append((name, baseline_ops_per_sec, result['ops_per_sec'], change))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filter', help='only run the benchmarks whose name contains this')
+    parser.add_argument('--repeats', type=int, default=default_repeats, help='number of times to time each benchmark')
+    parser.add_argument('--output', default=results_file, help='where to save the results')
+    parser.add_argument('--baseline', default=baseline_file, help='the results to compare against')
+    parser.add_argument('--threshold', type=float, default=default_threshold, help='fraction slower than the baseline that counts as a regression')
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.filter, args.repeats)
+    save_results(results, args.output)
+
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        print(f"Saved the baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = get_regressions(results, baseline, args.threshold)
+        for name, baseline_ops_per_sec, ops_per_sec, change in regressions:
+            print(f"Regression: {name} went from {baseline_ops_per_sec:,.0f} to {ops_per_sec:,.0f} ops/sec ({change:+.1%})")
+        if len(regressions) > 0:
+            sys.exit(1)
+    else:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to save one")
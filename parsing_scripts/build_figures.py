@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+
+# Render on a non-interactive backend, so that the figures can be built without a display. This has to
+# happen before the graph scripts import pyplot.
+matplotlib.use('Agg')
+
+import pandas as pd
+import matplotlib.pyplot as plt
+from matplotlib import rcParams
+import graph_short_term_results
+import graph_long_term_results
+import graph_demographics_results
+
+# Builds every figure of the paper from the graph_* scripts, and saves each one to figures_folder along
+# with a csv of the points it plots.
+#
+# The data of every figure is computed first, and the figures are rendered in worker processes. A figure
+# is only rendered again when the points it plots, or its style (the rcParams, the output format and dpi,
+# and the source of its graph script), changed since it was last built, which the manifest records.
+#
+#   python build_figures.py --workers 3
+#   python build_figures.py --figures long_term_results --force
+
+figures_folder = '../figures/'
+manifest_file = f'{figures_folder}manifest.json'
+
+default_format = 'pdf'
+default_dpi = 300
+
+# The figures to build: the graph script, the function that returns the points to plot, and the function
+# that returns the figure from them
+figures = {
+    'short_term_results': (graph_short_term_results, graph_short_term_results.get_short_term_results_data, graph_short_term_results.plot_short_term_results),
+    'long_term_results': (graph_long_term_results, graph_long_term_results.get_long_term_results_data, graph_long_term_results.plot_long_term_results_side_by_side),
+    'demographics_results': (graph_demographics_results, graph_demographics_results.get_demo_results_data, graph_demographics_results.plot_demo_results_side_by_side),
+}
+
+# The rcParams that the graph scripts set, which are part of the style of every figure
+style_rc_params = ['font.family', 'font.size']
+
+def load_manifest(path=manifest_file):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+# Write the manifest to a temporary file first, so that an interrupted build never leaves a half written manifest
+def save_manifest(manifest, path=manifest_file):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+def get_data_hash(data):
+    sha1 = hashlib.sha1()
+    sha1.update(json.dumps(list(data.columns)).encode('utf-8'))
+    sha1.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return sha1.hexdigest()
+
+def get_style_hash(module, output_format, dpi):
+    sha1 = hashlib.sha1()
+    sha1.update(json.dumps([str(rcParams[name]) for name in style_rc_params] + [output_format, dpi]).encode('utf-8'))
+    with open(module.__file__, 'rb') as f:
+        sha1.update(f.read())
+    return sha1.hexdigest()
+
+def get_figure_file(name, output_format):
+    return f'{figures_folder}{name}.{output_format}'
+
+def get_figure_data_file(name):
+    return f'{figures_folder}{name}.csv'
+
+# Render one figure, and save it next to the csv of its points
+def render_figure(name, data, output_format, dpi):
+    _, _, plot = figures[name]
+    fig = plot(data)
+    fig.savefig(get_figure_file(name, output_format), format=output_format, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    data.to_csv(get_figure_data_file(name), index=False)
+    return name
+
+def render_figure_with_args(args):
+    return render_figure(*args)
+
+# Build the figures, only rendering the ones whose points or style changed since they were last built
+# (or all of them with force), and return the names of the figures that were rendered
+def build_figures(figure_names=list(figures), output_format=default_format, dpi=default_dpi, workers=1, force=False):
+    os.makedirs(figures_folder, exist_ok=True)
+    manifest = load_manifest()
+
+    to_render = []
+    hashes = {}
+    for name in figure_names:
+        module, get_data, _ = figures[name]
+        data = get_data()
+        hashes[name] = { 'data_hash': get_data_hash(data), 'style_hash': get_style_hash(module, output_format, dpi) }
+
+        unchanged = manifest.get(name) == hashes[name] and os.path.exists(get_figure_file(name, output_format)) and os.path.exists(get_figure_data_file(name))
+        if force or not unchanged:
+            to_render.append((name, data, output_format, dpi))
+        else:
+            print(f'{name} is unchanged, skipping it')
+
+    if workers <= 1 or len(to_render) <= 1:
+        rendered = [render_figure_with_args(args) for args in to_render]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rendered = list(executor.map(render_figure_with_args, to_render))
+
+    for name in rendered:
+        manifest[name] = hashes[name]
+        print(f'Wrote {get_figure_file(name, output_format)} and {get_figure_data_file(name)}')
+    if len(rendered) > 0:
+        save_manifest(manifest)
+
+    return rendered
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--figures', nargs='+', choices=list(figures), default=list(figures), help='the figures to build')
+    parser.add_argument('--format', default=default_format, help='the file format of the figures (e.g. pdf, png, svg)')
+    parser.add_argument('--dpi', type=int, default=default_dpi)
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to render the figures in')
+    parser.add_argument('--force', action='store_true', help='render every figure, even the unchanged ones')
+    args = parser.parse_args()
+
+    build_figures(args.figures, args.format, args.dpi, args.workers, args.force)
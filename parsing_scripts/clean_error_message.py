@@ -1,4 +1,8 @@
 import re
+import os
+import json
+import hashlib
+from collections import OrderedDict
 
 # NOTE - For some reason, some of the values in the error column look like weird_error_pattern.
 # I think it is because it's somehow being incorrectly logged as a chunk of the error message.
@@ -7,6 +11,7 @@ import re
 
 
 weird_error_pattern = r"^\(Line \d+\) (.+)\x1b$"
+weird_error_regex = re.compile(weird_error_pattern)
 
 # Get the last line of a standard error
 def get_last_line_of_error(str):
@@ -20,7 +25,7 @@ def get_clean_last_line(error):
     last_line = get_last_line_of_error(error)
 
     # Use re.match() to find the pattern at the beginning of the string
-    match = re.match(weird_error_pattern, last_line)
+    match = weird_error_regex.match(last_line)
 
     # Check if the pattern is found
     if match:
@@ -30,33 +35,231 @@ def get_clean_last_line(error):
         # If no pattern is found, simply print the original string
         return last_line
 
-def generalize_error_message(error_message):
+# The substitutions that generalize_error_message makes, in order. The patterns are compiled once here
+# instead of being looked up every time an error is generalized.
+generalize_error_message_rules = [
     # Replace numbers with zeroes
-    error_message = re.sub(r'\b\d+\b', '0', error_message)
+    (re.compile(r'\b\d+\b'), '0'),
 
     # Replace variables inside single quotes with empty quotes
-    error_message = re.sub(r"'[^'\s]*'", "''", error_message)
+    (re.compile(r"'[^'\s]*'"), "''"),
 
     # Replace variables inside double quotes with empty quotes
-    error_message = re.sub(r'"[^"\s]*"', "''", error_message)
+    (re.compile(r'"[^"\s]*"'), "''"),
 
     # Replace function functionname with function fn, unless it's function definition
-    error_message = re.sub(r'function (?!definition\b)\w+', 'function fn', error_message)
+    (re.compile(r'function (?!definition\b)\w+'), 'function fn'),
 
     # Replace any functionname() with fn()
-    error_message = re.sub(r'\w+\([^()]*\)', 'fn()', error_message)
+    (re.compile(r'\w+\([^()]*\)'), 'fn()'),
 
     # Replace anything inside parentheses with empty parentheses
-    error_message = re.sub(r'\([^()]*\)', '()', error_message)
+    (re.compile(r'\([^()]*\)'), '()'),
 
     # Replace this super common assertion error message with a generic one
-    error_message = re.sub(r"^AssertionError: (.*) should be one of the following types: (.*?) in function (.*?)(?: Recieved (.*?))?(?: instead)?.$", 
-                           'AssertionError: type should be one of the following types: type in function fn. Recieved type instead.', error_message)
+    (re.compile(r"^AssertionError: (.*) should be one of the following types: (.*?) in function (.*?)(?: Recieved (.*?))?(?: instead)?.$"), 
+     'AssertionError: type should be one of the following types: type in function fn. Recieved type instead.'),
 
     # Replace this super common ValueError error message with a generic one
-    error_message = re.sub(r"^ValueError: invalid literal for fn\(\) with base 0: '.*'$","ValueError: invalid literal for fn() with base 0: literal", error_message)
+    (re.compile(r"^ValueError: invalid literal for fn\(\) with base 0: '.*'$"), "ValueError: invalid literal for fn() with base 0: literal"),
+]
+
+# The original implementation of generalize_error_message, which runs every substitution on every error.
+# It is kept as the reference that generalize_error_message is checked against (see check_generalize_error_message).
+def generalize_error_message_sequential(error_message):
+    for pattern, replacement in generalize_error_message_rules:
+        error_message = pattern.sub(replacement, error_message)
+    return error_message
+
+digit_regex = re.compile(r'\d')
 
+# A quick check for each of the general rules (the first six in generalize_error_message_rules), that is
+# true whenever the rule could change the error message. Each check is run on the error message as the
+# earlier rules left it, so skipping a rule when its check is false gives the same result as running it.
+general_rule_guards = [
+    lambda error_message: digit_regex.search(error_message) is not None,
+    lambda error_message: "'" in error_message,
+    lambda error_message: '"' in error_message,
+    lambda error_message: 'function ' in error_message,
+    lambda error_message: '(' in error_message,
+    lambda error_message: '(' in error_message,
+]
+general_rules = list(zip(generalize_error_message_rules[:len(general_rule_guards)], general_rule_guards))
+
+# The rest of the rules are anchored to the start of one exception class, so they are only run on the
+# error messages of that class
+exception_class_rules = {
+    'AssertionError': [generalize_error_message_rules[6]],
+    'ValueError': [generalize_error_message_rules[7]],
+}
+
+# The exception class of an error message, e.g. 'ValueError' for "ValueError: invalid literal ..."
+def get_exception_class(error_message):
+    return error_message.split(':', 1)[0]
+
+# Generalize the error message, only running the substitutions that could change it.
+# This always returns the same result as generalize_error_message_sequential.
+def generalize_error_message(error_message):
+    for (pattern, replacement), could_match in general_rules:
+        if could_match(error_message):
+            error_message = pattern.sub(replacement, error_message)
+    for pattern, replacement in exception_class_rules.get(get_exception_class(error_message), []):
+        error_message = pattern.sub(replacement, error_message)
     return error_message
 
+# Return a list of (error message, expected, result) for every error message that generalize_error_message
+# does not generalize exactly like generalize_error_message_sequential
+def check_generalize_error_message(error_messages):
+    mismatches = []
+    for error_message in error_messages:
+        expected = generalize_error_message_sequential(error_message)
+        result = generalize_error_message(error_message)
+        if result != expected:
+            mismatches.append((error_message, expected, result))
+    return mismatches
+
+# Bump after changing how errors are normalized in a way get_normalization_rules_hash can't see (e.g. the
+# guards in general_rule_guards), so that normalized errors saved by an older version are thrown away
+normalization_version = 1
+
+# Return a hash of the rules that normalize an error: the pattern of get_clean_last_line, every substitution
+# in order, and the exception class each anchored substitution is run on. A saved normalization cache is
+# only used if it was saved with the same hash.
+def get_normalization_rules_hash():
+    rules = {
+        'version': normalization_version,
+        'weird_error_pattern': weird_error_pattern,
+        'general_rules': [[pattern.pattern, replacement] for (pattern, replacement), _ in general_rules],
+        'exception_class_rules': { exception_class: [[pattern.pattern, replacement] for pattern, replacement in class_rules]
+                                   for exception_class, class_rules in exception_class_rules.items() },
+    }
+    return hashlib.sha1(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()
+
+# A bounded cache of normalized errors, keyed on the raw error. There are far fewer distinct raw errors
+# than errors, so most errors are normalized without running any regular expressions.
+# When the cache is full, the least recently used error is dropped.
+class NormalizationCache:
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.normalized_errors = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def normalize(self, raw_error):
+        normalized_error = self.normalized_errors.get(raw_error)
+        if normalized_error is not None:
+            self.hits += 1
+            self.normalized_errors.move_to_end(raw_error)
+            return normalized_error
+
+        self.misses += 1
+        normalized_error = generalize_error_message(get_clean_last_line(raw_error))
+        self.add(raw_error, normalized_error)
+        return normalized_error
+
+    def add(self, raw_error, normalized_error):
+        self.normalized_errors[raw_error] = normalized_error
+        if len(self.normalized_errors) > self.maxsize:
+            self.normalized_errors.popitem(last=False)
+
+    def get_stats(self):
+        return { 'hits': self.hits, 'misses': self.misses, 'size': len(self.normalized_errors), 'maxsize': self.maxsize }
+
+    # Load normalized errors saved by a previous run. The file is written by save. If the rules changed since
+    # the file was saved (or it was saved before the rules were hashed), the saved errors are thrown away.
+    def load(self, cache_file):
+        if not os.path.exists(cache_file):
+            return
+        with open(cache_file, 'r') as f:
+            data = json.load(f)
+        if data.get('rules_hash') != get_normalization_rules_hash():
+            print(f'{cache_file} was saved with different normalization rules, not using it')
+            return
+        for raw_error, normalized_error in data['normalized_errors'].items():
+            self.add(raw_error, normalized_error)
+
+    def save(self, cache_file):
+        with open(cache_file, 'w') as f:
+            json.dump({ 'rules_hash': get_normalization_rules_hash(), 'normalized_errors': self.normalized_errors }, f)
+
+normalization_cache = NormalizationCache()
+
+# Where the normalized errors are saved between runs, if the scripts are asked to save them
+normalization_cache_file = '../data_files/normalized_error_cache.json'
+
+def load_normalization_cache(cache_file=normalization_cache_file):
+    normalization_cache.load(cache_file)
+
+def save_normalization_cache(cache_file=normalization_cache_file):
+    normalization_cache.save(cache_file)
+    print(f"Normalization cache: {normalization_cache.get_stats()}")
+
 def normalize_error_message(raw_error):
-    return generalize_error_message(get_clean_last_line(raw_error))
\ No newline at end of file
+    return normalization_cache.normalize(raw_error)
+
+# Return random error messages built from the pieces that the rules look for (numbers, quotes, parentheses,
+# function names and the anchored AssertionError and ValueError messages), including the awkward cases
+# where the pieces overlap
+def get_fuzz_error_messages(num_error_messages, seed=0):
+    import random
+    rng = random.Random(seed)
+    prefixes = ['', 'AssertionError: ', 'ValueError: ', 'ValueError: invalid literal for int() with base 10: ', "ValueError: invalid literal for fn() with base 0: '", 'NameError: ', 'TypeError: ']
+    pieces = ['x', 'total', '_a1', '42', '3.5', 'x2', ' ', "'", '"', '(', ')', ':', '.', ',', 'function ', 'function definition', 'len(', 'fn()',
+              ' should be one of the following types: ', ' in function ', ' Recieved ', ' instead', '\n', '\t', 'é']
+    error_messages = []
+    for _ in range(num_error_messages):
+        error_message = rng.choice(prefixes) + ''.join(rng.choice(pieces) for _ in range(rng.randrange(0, 12)))
+        error_messages.append(error_message)
+    return error_messages
+
+# Return the last line of every raw error in the student logs, and in num_synthetic_students generated students
+def get_logged_error_messages(num_synthetic_students=100):
+    from error_message_types import get_raw_errors
+    from generate_synthetic_logs import generate_student_log
+    from log_store import iter_student_logs, store_exists, logs_folder, error_columns
+
+    error_messages = []
+    if store_exists() or os.path.isdir(logs_folder):
+        for _, df in iter_student_logs(columns=error_columns):
+            for row in df.to_dict('records'):
+                error_messages.extend(get_clean_last_line(raw_error) for raw_error in get_raw_errors(row))
+    for index in range(num_synthetic_students):
+        for row in generate_student_log(index):
+            error_messages.extend(get_clean_last_line(raw_error) for raw_error in get_raw_errors(row))
+    return error_messages
+
+# Check that generalize_error_message gives exactly the same result as generalize_error_message_sequential on
+# every error in the student logs, on generated students, and on random error messages
+if __name__ == '__main__':
+    import sys
+    import time
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fuzz', type=int, default=100000, help='number of random error messages to check')
+    parser.add_argument('--synthetic-students', type=int, default=100, help='number of generated students to check')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    corpora = {
+        'logs': get_logged_error_messages(args.synthetic_students),
+        'fuzz': get_fuzz_error_messages(args.fuzz, args.seed),
+    }
+
+    num_mismatches = 0
+    for name, error_messages in corpora.items():
+        mismatches = check_generalize_error_message(error_messages)
+        num_mismatches += len(mismatches)
+        for error_message, expected, result in mismatches[:10]:
+            print(f'Mismatch: {error_message!r} should generalize to {expected!r}, not {result!r}')
+
+        times = {}
+        for function in [generalize_error_message_sequential, generalize_error_message]:
+            start = time.perf_counter()
+            for error_message in error_messages:
+                function(error_message)
+            times[function.__name__] = time.perf_counter() - start
+        speedup = times['generalize_error_message_sequential'] / times['generalize_error_message']
+        print(f'{name}: {len(error_messages)} error messages, {len(mismatches)} mismatches, {speedup:.2f}x faster than generalize_error_message_sequential')
+
+    if num_mismatches > 0:
+        sys.exit(1)
@@ -1,11 +1,15 @@
 import pandas as pd
 import os
 from error_message_types import official_error_types, get_raw_errors, valid_error_message_type
-from karel_info import not_karel
+from karel_info import assignment_registry
+from log_store import iter_student_logs, error_columns
 import ast
 
 logs_folder = '../data_files/student_logs/'
 
+# The log columns that the counts read
+count_columns = ['assnId', 'type', 'error_message_type', *error_columns]
+
 # Return an array of error message types used in this df
 def get_error_message_type(df):
     error_message_types = df['error_message_type'].unique()
@@ -18,13 +22,13 @@ def get_error_message_type(df):
 # Count the number of errors made
 def count_num_errors_made_of_type(df):
     count = 0
-    for i, row in df.iterrows():
-        if not_karel(row):
-            raw_errors = get_raw_errors(row)
-            count += len(raw_errors)
+    not_karel_df = df[assignment_registry.get_not_karel_mask(df)]
+    for i, row in not_karel_df.iterrows():
+        raw_errors = get_raw_errors(row)
+        count += len(raw_errors)
 
-            if len(raw_errors) > 0:
-                assert(valid_error_message_type(row))
+        if len(raw_errors) > 0:
+            assert(valid_error_message_type(row))
 
     return count
 
@@ -38,11 +42,7 @@ def get_counts_of_error_message_types():
     num_one_error_message_type = 0
     num_more_than_one_error_message_type = 0
 
-    for student_logs in os.listdir(logs_folder):
-        user_id = student_logs.split('.')[0]
-
-        df = pd.read_csv(logs_folder + student_logs, dtype=str, lineterminator='\n')
-        
+    for user_id, df in iter_student_logs(columns=count_columns):
         # Get the student's error message type. If they did not use exaclty one error message type, skip them.
         error_message_types = get_error_message_type(df)
         if len(error_message_types) == 0:
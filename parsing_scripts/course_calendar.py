@@ -0,0 +1,126 @@
+import os
+import json
+import bisect
+import numpy as np
+import pandas as pd
+
+# A course calendar splits time into periods (e.g. the weeks of the course), and assigns timestamps to them.
+# Periods are stored as sorted edges, so a whole column of timestamps is assigned at once with a binary search
+# (np.searchsorted) instead of comparing each timestamp against every boundary.
+
+calendar_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'course_calendar.json')
+
+# The smallest possible timestamp, used as the first edge when the first period has no start
+open_start = np.iinfo(np.int64).min
+
+# Convert a timestamp, or a column of timestamps, to nanoseconds since the epoch in UTC
+def to_utc_nanoseconds(timestamp, timezone):
+    ts = pd.Timestamp(timestamp)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize(timezone)
+    return ts.tz_convert('UTC').as_unit('ns').value
+
+class CourseCalendar:
+    # edges are the sorted start times of the periods in nanoseconds, followed by the end of the last period.
+    # labels has one label per period, and periods labelled None are gaps that belong to no period.
+    def __init__(self, edges, labels, timezone='UTC'):
+        assert(len(edges) == len(labels) + 1)
+        assert(all(edges[i] < edges[i + 1] for i in range(len(labels))))
+        self.edges = np.array(edges, dtype=np.int64)
+        self.edges_list = [int(edge) for edge in edges]
+        self.period_labels = list(labels)
+        self.timezone = timezone
+
+    # The labels of the periods in order, without gaps
+    @property
+    def labels(self):
+        return [label for label in self.period_labels if label is not None]
+
+    # Periods that end at each boundary. If start is None, the first period includes everything before
+    # the first boundary (this is how the weeks of Code in Place 3 were defined).
+    @classmethod
+    def from_boundaries(cls, boundaries, timezone='UTC', start=None, labels=None):
+        edges = [open_start if start is None else to_utc_nanoseconds(start, timezone)]
+        edges += [to_utc_nanoseconds(boundary, timezone) for boundary in boundaries]
+        if labels is None:
+            labels = list(range(1, len(boundaries) + 1))
+        return cls(edges, labels, timezone)
+
+    # Custom periods, given as a list of (label, start, end). Time between the windows belongs to no period.
+    @classmethod
+    def from_windows(cls, windows, timezone='UTC'):
+        windows = sorted([(to_utc_nanoseconds(start, timezone), to_utc_nanoseconds(end, timezone), label) for label, start, end in windows])
+
+        edges = [windows[0][0]]
+        labels = []
+        for start, end, label in windows:
+            assert(start >= edges[-1]) # Windows can not overlap
+            if start > edges[-1]:
+                # Add a gap between the previous window and this one
+                edges.append(start)
+                labels.append(None)
+            edges.append(end)
+            labels.append(label)
+        return cls(edges, labels, timezone)
+
+    # Periods of equal length from start to end, labelled 1, 2, 3, ... The last period ends at end.
+    @classmethod
+    def from_frequency(cls, start, end, frequency, timezone='UTC'):
+        start = pd.Timestamp(start).tz_localize(timezone)
+        end = pd.Timestamp(end).tz_localize(timezone)
+        boundaries = list(pd.date_range(start, end, freq=frequency))[1:]
+        if len(boundaries) == 0 or boundaries[-1] < end:
+            boundaries.append(end)
+        return cls.from_boundaries(boundaries, timezone, start=start)
+
+    @classmethod
+    def days(cls, start, end, timezone='UTC'):
+        return cls.from_frequency(start, end, '1D', timezone)
+
+    @classmethod
+    def weeks(cls, start, end, timezone='UTC'):
+        return cls.from_frequency(start, end, '7D', timezone)
+
+    # Load a calendar from course_calendar.json
+    @classmethod
+    def from_config(cls, name, config_file=calendar_file):
+        with open(config_file) as f:
+            config = json.load(f)[name]
+
+        timezone = config.get('timezone', 'UTC')
+        if 'boundaries' in config:
+            return cls.from_boundaries(config['boundaries'], timezone, config.get('start'), config.get('labels'))
+        if 'windows' in config:
+            return cls.from_windows(config['windows'], timezone)
+        if config['granularity'] == 'day':
+            return cls.days(config['start'], config['end'], timezone)
+        if config['granularity'] == 'week':
+            return cls.weeks(config['start'], config['end'], timezone)
+        raise ValueError(f"Unknown granularity {config['granularity']} for calendar {name}")
+
+    # Return the label of the period that the timestamp is in, or None if it is not in any period
+    def get_period(self, timestamp):
+        ts = pd.to_datetime(timestamp, format='mixed', utc=True)
+        if pd.isna(ts):
+            return None
+
+        index = bisect.bisect_right(self.edges_list, ts.as_unit('ns').value) - 1
+        if index < 0 or index >= len(self.period_labels):
+            return None
+        return self.period_labels[index]
+
+    # Return the index of the period of every timestamp in the column, or -1 if it is not in any period
+    def get_period_indices(self, timestamps):
+        ts = pd.to_datetime(pd.Series(timestamps), format='mixed', utc=True)
+        missing = ts.isna().to_numpy()
+        nanoseconds = ts.dt.as_unit('ns').array.asi8
+
+        indices = np.searchsorted(self.edges, nanoseconds, side='right') - 1
+        indices[missing | (indices >= len(self.period_labels))] = -1
+        return indices
+
+    # Return the label of the period of every timestamp in the column (None if it is not in any period)
+    def assign_periods(self, timestamps):
+        # The last entry is the label for index -1
+        labels = np.array(self.period_labels + [None], dtype=object)
+        return labels[self.get_period_indices(timestamps)]
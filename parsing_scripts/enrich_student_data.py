@@ -0,0 +1,121 @@
+import argparse
+import pandas as pd
+import numpy as np
+from error_message_types import get_error_message_type_for_df
+from error_runs import encode_student_runs, get_runs_until_resolved_from_runs
+from log_store import iter_student_logs, map_student_log_shards, error_columns
+from hdi_index import lookup_hdi
+
+# Adds the hdi, error_message_type, avg_error_run_length and experience columns to sl_and_student_data.csv
+# in one stage. This replaces running add_hdi, add_error_message_type, add_avg_error_run_length and
+# add_experience one after the other: each column is built with a join against a lookup table instead of
+# a search per user, the student logs are read once for both log columns, and the csv is written once.
+#
+# Keys that could not be matched (e.g. the students that are missing from demographics_with_error_data.csv)
+# are left empty, and listed in unmatched_keys_file with the column and the reason.
+
+sl_and_student_data_file = '../data_files/sl_and_student_data.csv'
+demographics_file = '../data_files/demographics_with_error_data.csv'
+unmatched_keys_file = '../data_files/unmatched_keys.csv'
+
+# The log columns that the error_message_type and avg_error_run_length columns read
+enrich_columns = ['projectId', 'assnId', 'type', 'error_message_type', *error_columns]
+
+# Return the hdi column for every user
+def get_hdi_column(sl_and_student_data, unmatched):
+    countries = sl_and_student_data['country']
+    hdi, unknown_countries = lookup_hdi(countries)
+
+    for i in np.flatnonzero(hdi.isna().to_numpy()):
+        if countries.iloc[i] in unknown_countries:
+            reason = 'country not in hdi.xlsx'
+        else:
+            reason = 'no hdi for country'
+        unmatched.append({ 'column': 'hdi', 'user_id': sl_and_student_data['user_id'].iloc[i], 'key': countries.iloc[i], 'reason': reason })
+
+    hdi = hdi.astype(object)
+    return hdi.where(hdi.notna(), None)
+
+# Return the experience column for every user. Only students have an experience.
+def get_experience_column(sl_and_student_data, unmatched):
+    demographics_data = pd.read_csv(demographics_file)
+
+    # Use the first row of each student, as add_experience does
+    experience = demographics_data.drop_duplicates(subset=['uid']).set_index('uid')['experience'].astype(object)
+
+    students_only = sl_and_student_data['role'] == 'student'
+    column = pd.Series(None, index=sl_and_student_data.index, dtype=object)
+    column[students_only] = sl_and_student_data.loc[students_only, 'user_id'].map(experience)
+
+    for user_id in sl_and_student_data.loc[students_only & column.isna(), 'user_id']:
+        if user_id in experience.index:
+            reason = 'missing experience value'
+        else:
+            reason = 'not in demographics_with_error_data.csv'
+        unmatched.append({ 'column': 'experience', 'user_id': user_id, 'key': user_id, 'reason': reason })
+
+    return column.where(column.notna(), None)
+
+# Return the error message type of one student, and the average length of their error runs (or None).
+# The error runs follow the order of the log file, as in add_avg_error_run_length.
+def get_log_columns_for_user(df):
+    error_message_types = get_error_message_type_for_df(df)
+    error_message_type = error_message_types[0] if len(error_message_types) == 1 else 'other'
+
+    run_counts = get_runs_until_resolved_from_runs(encode_student_runs(df))
+    avg_error_run_length = np.mean(run_counts) if len(run_counts) > 0 else None
+
+    return error_message_type, avg_error_run_length
+
+# Return [user_id, error_message_type, avg_error_run_length] for every student in the shard
+def parse_shard_on_log_columns(user_ids):
+    rows = []
+    for user_id, df in iter_student_logs(user_ids, enrich_columns):
+        rows.append([user_id, *get_log_columns_for_user(df)])
+    return rows
+
+# Return the error_message_type and avg_error_run_length columns. Only students have them.
+def get_log_columns(sl_and_student_data, unmatched, workers=1):
+    rows = [row for shard_rows in map_student_log_shards(parse_shard_on_log_columns, workers) for row in shard_rows]
+    log_columns = pd.DataFrame(rows, columns=['user_id', 'error_message_type', 'avg_error_run_length'], dtype=object).set_index('user_id')
+
+    students_only = sl_and_student_data['role'] == 'student'
+    student_ids = sl_and_student_data.loc[students_only, 'user_id']
+
+    error_message_type = pd.Series(None, index=sl_and_student_data.index, dtype=object)
+    avg_error_run_length = pd.Series(None, index=sl_and_student_data.index, dtype=object)
+    error_message_type[students_only] = student_ids.map(log_columns['error_message_type'])
+    avg_error_run_length[students_only] = student_ids.map(log_columns['avg_error_run_length'])
+
+    # A student without a log file used no error message type
+    for user_id in student_ids[~student_ids.isin(log_columns.index)]:
+        unmatched.append({ 'column': 'error_message_type', 'user_id': user_id, 'key': user_id, 'reason': 'no log file' })
+    error_message_type[students_only & error_message_type.isna()] = 'other'
+
+    return error_message_type, avg_error_run_length.where(avg_error_run_length.notna(), None)
+
+# Add every column to sl_and_student_data.csv, and return the list of unmatched keys
+def enrich_student_data(workers=1):
+    sl_and_student_data = pd.read_csv(sl_and_student_data_file)
+    unmatched = []
+
+    sl_and_student_data['hdi'] = get_hdi_column(sl_and_student_data, unmatched)
+    sl_and_student_data['error_message_type'], sl_and_student_data['avg_error_run_length'] = get_log_columns(sl_and_student_data, unmatched, workers)
+    sl_and_student_data['experience'] = get_experience_column(sl_and_student_data, unmatched)
+
+    sl_and_student_data.to_csv(sl_and_student_data_file, index=False)
+
+    unmatched_keys = pd.DataFrame(unmatched, columns=['column', 'user_id', 'key', 'reason'])
+    unmatched_keys.to_csv(unmatched_keys_file, index=False)
+    for (column, reason), group in unmatched_keys.groupby(['column', 'reason']):
+        print(f'{column}: {len(group)} users unmatched ({reason})')
+    print(f'Wrote {len(sl_and_student_data)} users to {sl_and_student_data_file}, see {unmatched_keys_file} for the unmatched keys')
+
+    return unmatched
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to read the student logs with')
+    args = parser.parse_args()
+
+    enrich_student_data(args.workers)
@@ -0,0 +1,186 @@
+import os
+import json
+import argparse
+import functools
+from collections import Counter
+import numpy as np
+from clean_error_message import normalize_error_message
+from error_message_types import get_raw_errors, official_error_types
+from karel_info import assignment_registry
+from course_calendar import CourseCalendar
+from log_store import iter_student_logs, map_student_log_shards, run_columns
+
+# A catalog of every normalized error in the student logs. Each normalized error gets an integer id that
+# never changes once the catalog is saved: rebuilding the catalog keeps the ids of the errors it already
+# has, and gives new errors the next free ids. For each error the catalog keeps a few of the raw errors
+# that normalized to it, and how many times it was made with each error message type in each week.
+# Like the parsing scripts, only errors from runs that are not karel are cataloged.
+#
+#   python error_catalog.py --build --workers 4    # scan the student logs, and save the catalog
+#   python error_catalog.py --top 10 --type gpt    # list the 10 most common errors, from the saved catalog
+
+catalog_file = '../data_files/error_catalog.json'
+
+default_max_examples = 5
+
+course_calendar = CourseCalendar.from_config('cip3')
+
+class ErrorCatalog:
+    def __init__(self, max_examples=default_max_examples):
+        self.max_examples = max_examples
+        self.errors = []    # the normalized error of each id
+        self.ids = {}       # the id of each normalized error
+        self.examples = []  # some of the raw errors of each id
+        self.counts = []    # a Counter of (error_message_type, week) for each id
+
+    def __len__(self):
+        return len(self.errors)
+
+    # Return the id of the normalized error, giving it the next free id if it is not in the catalog yet
+    def get_id(self, normalized_error):
+        error_id = self.ids.get(normalized_error)
+        if error_id is None:
+            error_id = len(self.errors)
+            self.ids[normalized_error] = error_id
+            self.errors.append(normalized_error)
+            self.examples.append([])
+            self.counts.append(Counter())
+        return error_id
+
+    def get_error(self, error_id):
+        return self.errors[error_id]
+
+    # Catalog one raw error, and return its id
+    def add(self, raw_error, error_message_type, week, count=1):
+        error_id = self.get_id(normalize_error_message(raw_error))
+        self.add_example(error_id, raw_error)
+        self.counts[error_id][(error_message_type, week)] += count
+        return error_id
+
+    def add_example(self, error_id, raw_error):
+        examples = self.examples[error_id]
+        if len(examples) < self.max_examples and raw_error not in examples:
+            examples.append(raw_error)
+
+    # Add the errors of another catalog to this one. Errors that are new to this catalog get their ids
+    # in the order of the other catalog.
+    def merge(self, other):
+        for other_id, normalized_error in enumerate(other.errors):
+            error_id = self.get_id(normalized_error)
+            for raw_error in other.examples[other_id]:
+                self.add_example(error_id, raw_error)
+            self.counts[error_id].update(other.counts[other_id])
+
+    # Forget the examples and counts, but keep the ids
+    def clear_counts(self):
+        self.examples = [[] for _ in self.errors]
+        self.counts = [Counter() for _ in self.errors]
+
+    # Return the number of times the error was made, optionally only with one error message type or in one week
+    def get_count(self, error_id, error_message_type=None, week=None):
+        return sum(count for (count_type, count_week), count in self.counts[error_id].items()
+                   if (error_message_type is None or count_type == error_message_type) and (week is None or count_week == week))
+
+    # Return the k most common errors as (id, normalized error, count), most common first
+    def get_top_errors(self, k, error_message_type=None, week=None):
+        counts = np.array([self.get_count(error_id, error_message_type, week) for error_id in range(len(self))], dtype=np.int64)
+        order = np.lexsort((np.arange(len(counts)), -counts))
+        return [(int(error_id), self.errors[error_id], int(counts[error_id])) for error_id in order[:k] if counts[error_id] > 0]
+
+    def to_json(self):
+        return {
+            'max_examples': self.max_examples,
+            'errors': [
+                {
+                    'id': error_id,
+                    'error': self.errors[error_id],
+                    'examples': self.examples[error_id],
+                    'counts': [[error_message_type, week, count] for (error_message_type, week), count in sorted(self.counts[error_id].items(), key=str)],
+                }
+                for error_id in range(len(self))
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        catalog = cls(data.get('max_examples', default_max_examples))
+        for entry in data['errors']:
+            error_id = catalog.get_id(entry['error'])
+            assert(error_id == entry['id'])
+            catalog.examples[error_id] = entry['examples']
+            catalog.counts[error_id] = Counter({ (error_message_type, week): count for error_message_type, week, count in entry['counts'] })
+        return catalog
+
+    def save(self, path=catalog_file):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_json(), f)
+        os.replace(tmp_path, path)
+
+    # Load the saved catalog, or return an empty one if it has not been built yet
+    @classmethod
+    def load(cls, path=catalog_file):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r') as f:
+            return cls.from_json(json.load(f))
+
+# Return the catalog that error_runs gives error ids from, which is loaded the first time it is needed (once
+# per process). Errors that are not in the saved catalog get the next free id in this process only, so ids
+# are only stable across processes for the errors in the saved catalog.
+@functools.lru_cache(maxsize=None)
+def get_error_catalog(path=catalog_file):
+    return ErrorCatalog.load(path)
+
+# Add every error of one student to the catalog
+def add_student_to_catalog(catalog, df):
+    weeks = course_calendar.assign_periods(df['ogTimestamp'])
+    not_karel_mask = assignment_registry.get_not_karel_mask(df)
+    for week, is_not_karel, row in zip(weeks, not_karel_mask, df.to_dict('records')):
+        if not is_not_karel:
+            continue
+        for raw_error in get_raw_errors(row):
+            catalog.add(raw_error, row['error_message_type'], None if week is None else int(week))
+
+# Return a catalog of the errors of the students in the shard
+def catalog_shard(user_ids):
+    catalog = ErrorCatalog()
+    for _, df in iter_student_logs(user_ids, run_columns):
+        add_student_to_catalog(catalog, df)
+    return catalog
+
+# Scan every student log, and return the catalog. The ids of the errors already in the saved catalog
+# are kept, and the examples and counts are rebuilt from scratch.
+def build_error_catalog(workers=1, path=catalog_file):
+    catalog = ErrorCatalog.load(path)
+    catalog.clear_counts()
+    for shard_catalog in map_student_log_shards(catalog_shard, workers):
+        catalog.merge(shard_catalog)
+    return catalog
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--build', action='store_true', help='scan the student logs, and save the catalog')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to scan the student logs with')
+    parser.add_argument('--top', type=int, default=10, help='number of errors to list per error message type')
+    parser.add_argument('--type', choices=official_error_types, help='only list the errors of this error message type')
+    parser.add_argument('--week', type=int, help='only count the errors made in this week')
+    parser.add_argument('--examples', action='store_true', help='list an example raw error of each error')
+    args = parser.parse_args()
+
+    if args.build:
+        catalog = build_error_catalog(args.workers)
+        catalog.save()
+        print(f'Saved {len(catalog)} errors to {catalog_file}')
+    else:
+        catalog = ErrorCatalog.load()
+        if len(catalog) == 0:
+            print(f'No catalog at {catalog_file}, run with --build to build one')
+
+    error_message_types = [args.type] if args.type is not None else official_error_types
+    for error_message_type in error_message_types:
+        print(f'\n{error_message_type}:')
+        for error_id, normalized_error, count in catalog.get_top_errors(args.top, error_message_type, args.week):
+            print(f'{count:>8} [{error_id}] {normalized_error}')
+            if args.examples and len(catalog.examples[error_id]) > 0:
+                print(f'{"":>8} e.g. {catalog.examples[error_id][0].strip().splitlines()[-1]}')
@@ -25,6 +25,10 @@ def valid_error_message_type(row):
     return row['error_message_type'] in official_error_types
 
 def get_raw_errors(row):
+    # Logs read from the log store already have their raw errors decoded (see decode_error_columns)
+    if 'raw_errors' in row:
+        return row['raw_errors']
+
     try:
         raw_errors = ast.literal_eval(row['error'])
         raw_error_messages = ast.literal_eval(row['error_message'])
@@ -32,4 +36,51 @@ def get_raw_errors(row):
         return raw_errors
     except:
         print('get_raw_errors') #, row['error'], row['error_message'])
-        return []
\ No newline at end of file
+        return []
+
+# Decode a stringified list, or return None if it is not one
+def decode_list(value):
+    try:
+        decoded = ast.literal_eval(value)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+    if not isinstance(decoded, list):
+        return None
+    return decoded
+
+# Decode the stringified error and error_message lists of every row once. Returns the raw errors of
+# each row (the same lists that get_raw_errors returns), the error messages of each row, and the rows
+# that could not be decoded, as (row number, reason) pairs. Rows that could not be decoded have no errors.
+def decode_error_columns(df):
+    raw_errors_column = []
+    error_messages_column = []
+    malformed_rows = []
+
+    # Most rows have the same few values (e.g. '[]'), so only decode each distinct value once
+    decoded_values = {}
+    def decode(value):
+        if not isinstance(value, str):
+            return None
+        if value not in decoded_values:
+            decoded_values[value] = decode_list(value)
+        return decoded_values[value]
+
+    for i, (error, error_message) in enumerate(zip(df['error'], df['error_message'])):
+        raw_errors = decode(error)
+        error_messages = decode(error_message)
+
+        if raw_errors is None:
+            malformed_rows.append((i, 'error is not a list'))
+            raw_errors = []
+        elif error_messages is None:
+            malformed_rows.append((i, 'error_message is not a list'))
+            raw_errors = []
+        elif len(raw_errors) > 0 and len(error_messages) == 0:
+            # The user did not actually see an error message
+            malformed_rows.append((i, 'error without an error message'))
+            raw_errors = []
+
+        raw_errors_column.append(raw_errors)
+        error_messages_column.append(error_messages if error_messages is not None else [])
+
+    return raw_errors_column, error_messages_column, malformed_rows
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+from error_message_types import official_error_types, get_raw_errors
+from clean_error_message import normalize_error_message
+from error_catalog import get_error_catalog
+from karel_info import assignment_registry
+
+# Integer-coded, columnar form of a student's runs, used to compute error runs with bulk NumPy operations
+# instead of walking the dataframe one row at a time.
+#
+# A student's runs are stored as:
+#   project_codes - one integer per row. Rows with a missing projectId get a code of their own,
+#                   because a missing projectId is never equal to the previous one (NaN != NaN).
+#   valid         - True for the rows that are not from a karel assignment (see not_karel)
+#   error_offsets - CSR offsets: the normalized errors of row i are error_ids[error_offsets[i]:error_offsets[i + 1]]
+#   error_ids     - the normalized errors of every row, as their ids in the error catalog.
+#                   Karel rows have no errors.
+#   vocabulary_size - one more than the largest error id, so that (row, error) pairs can be packed into one integer
+
+class StudentRuns:
+    def __init__(self, project_codes, valid, error_offsets, error_ids, vocabulary_size):
+        self.project_codes = project_codes
+        self.valid = valid
+        self.error_offsets = error_offsets
+        self.error_ids = error_ids
+        self.vocabulary_size = vocabulary_size
+
+    @property
+    def num_rows(self):
+        return len(self.project_codes)
+
+    # links[i] is True if row i + 1 continues row i: both are not karel, and they are in the same project.
+    # Error runs only continue, or are resolved, across a link. Otherwise they are dropped unresolved.
+    def get_links(self):
+        return self.valid[:-1] & self.valid[1:] & (self.project_codes[:-1] == self.project_codes[1:])
+
+    # The row and the position within the row of every error
+    def get_error_rows(self):
+        counts = np.diff(self.error_offsets)
+        rows = np.repeat(np.arange(self.num_rows), counts)
+        positions = np.arange(len(self.error_ids)) - self.error_offsets[rows]
+        return rows, positions
+
+    # Return the runs in the given order (e.g. sorted by project and timestamp)
+    def take(self, order):
+        order = np.asarray(order, dtype=np.int64)
+        counts = np.diff(self.error_offsets)[order]
+        error_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(counts, out=error_offsets[1:])
+
+        # For each error in the new order, the index of the same error in the old order
+        old_starts = np.repeat(self.error_offsets[:-1][order], counts)
+        new_starts = np.repeat(error_offsets[:-1], counts)
+        error_ids = self.error_ids[old_starts + np.arange(error_offsets[-1]) - new_starts]
+
+        return StudentRuns(self.project_codes[order], self.valid[order], error_offsets, error_ids, self.vocabulary_size)
+
+# Return a boolean mask of the rows that are not from a karel assignment, the same as not_karel for every row
+def get_not_karel_mask(df):
+    return assignment_registry.get_not_karel_mask(df)
+
+# Encode a student's log dataframe, in the order of its rows, with the error ids of catalog (get_error_catalog by default)
+def encode_student_runs(df, catalog=None):
+    if catalog is None:
+        catalog = get_error_catalog()
+
+    num_rows = len(df)
+    valid = get_not_karel_mask(df) if num_rows > 0 else np.zeros(0, dtype=bool)
+
+    # Give each project an integer code, and each row with a missing projectId a code of its own
+    project_codes, projects = pd.factorize(df['projectId'])
+    project_codes = project_codes.astype(np.int64)
+    missing = project_codes == -1
+    project_codes[missing] = len(projects) + np.arange(missing.sum())
+
+    # Normalize the errors of the rows that are not karel
+    error_counts = np.zeros(num_rows, dtype=np.int64)
+    error_ids = []
+
+    error_message_types = df['error_message_type'].to_numpy()
+    if 'raw_errors' in df.columns:
+        raw_errors_column = df['raw_errors'].to_numpy()
+    else:
+        raw_errors_column = None
+        errors = df['error'].to_numpy()
+        error_messages = df['error_message'].to_numpy()
+
+    for i in np.flatnonzero(valid):
+        if raw_errors_column is not None:
+            raw_errors = raw_errors_column[i]
+        else:
+            raw_errors = get_raw_errors({ 'error': errors[i], 'error_message': error_messages[i] })
+
+        if len(raw_errors) > 0:
+            assert(error_message_types[i] in official_error_types)
+
+        for raw_error in raw_errors:
+            error_ids.append(catalog.get_id(normalize_error_message(raw_error)))
+        error_counts[i] = len(raw_errors)
+
+    error_offsets = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(error_counts, out=error_offsets[1:])
+
+    return StudentRuns(project_codes, valid, error_offsets, np.array(error_ids, dtype=np.int64), len(catalog))
+
+# Return the number of errors that were also in the previous run of the same project,
+# and the total number of errors. This matches get_count_same_subsequent_error.
+def count_same_subsequent_error(runs):
+    total_error_count = len(runs.error_ids)
+    if total_error_count == 0:
+        return 0, 0
+
+    rows, _ = runs.get_error_rows()
+    vocabulary_size = runs.vocabulary_size
+
+    # Every distinct (row, error) pair, as one integer key
+    keys = np.unique(rows * vocabulary_size + runs.error_ids)
+
+    # An error counts if the previous row is linked to this row, and had the same error
+    has_previous = rows > 0
+    previous_keys = (rows[has_previous] - 1) * vocabulary_size + runs.error_ids[has_previous]
+    linked = runs.get_links()[rows[has_previous] - 1]
+    same_error_count = int(np.count_nonzero(linked & np.isin(previous_keys, keys)))
+
+    return same_error_count, total_error_count
+
+# Return the length and the first row of every error run that was resolved, in the order that
+# get_runs_until_resolved finds them: by the row the run ended on, and then by the position
+# of the error in that row. Runs that were not resolved are dropped.
+def get_resolved_error_runs(runs):
+    if len(runs.error_ids) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    rows, positions = runs.get_error_rows()
+    vocabulary_size = runs.vocabulary_size
+
+    # Keep the first occurrence of each error in each row
+    _, first = np.unique(rows * vocabulary_size + runs.error_ids, return_index=True)
+    rows, positions, error_ids = rows[first], positions[first], runs.error_ids[first]
+
+    # Sort by error, and then by row, so that each error run is a contiguous segment
+    order = np.lexsort((rows, error_ids))
+    rows, positions, error_ids = rows[order], positions[order], error_ids[order]
+
+    # The (row, error) pair continues the run of the pair before it if it is the same error
+    # in the next row, and the two rows are linked
+    links = np.append(runs.get_links(), False)
+    continues = np.zeros(len(rows), dtype=bool)
+    continues[1:] = (error_ids[1:] == error_ids[:-1]) & (rows[1:] == rows[:-1] + 1) & links[rows[:-1]]
+
+    run_starts = np.flatnonzero(~continues)
+    run_ends = np.append(run_starts[1:], len(rows)) - 1
+    lengths = run_ends - run_starts + 1
+
+    # A run is resolved if the row after its last row is linked to it (and so does not have the error)
+    resolved = links[rows[run_ends]]
+    run_starts, run_ends, lengths = run_starts[resolved], run_ends[resolved], lengths[resolved]
+
+    order = np.lexsort((positions[run_ends], rows[run_ends]))
+    return lengths[order], rows[run_starts][order]
+
+# Return a list of counts of the number of runs it took to resolve each error. This matches get_runs_until_resolved.
+def get_runs_until_resolved_from_runs(runs):
+    lengths, _ = get_resolved_error_runs(runs)
+    return lengths.tolist()
@@ -0,0 +1,260 @@
+import os
+import csv
+import math
+import bisect
+import random
+import argparse
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from karel_info import karel_assgnids, assignment_registry
+from course_calendar import CourseCalendar
+
+# Generates student logs in the same format as download_logs_per_student.py, so that the pipeline can be
+# tested and benchmarked at scale without the real (private) logs. Every student is generated from their
+# own seed, so the output only depends on --seed, no matter how many workers generate it.
+#
+# The generated data_files folder has the same layout as the real one (student_logs/ and
+# sl_and_student_data.csv), so the parsing scripts can be run on it from a sibling folder, e.g.
+#
+#   python generate_synthetic_logs.py --students 1000 --output /tmp/synthetic/data_files/ --tagged
+#   cd /tmp/synthetic && mkdir parsing_scripts && cd parsing_scripts && PYTHONPATH=<repo>/parsing_scripts python <repo>/parsing_scripts/parse_short_term_results.py
+
+# The columns written by download_logs_per_student.process_user_doc
+fieldnames = ['code', 'error_message', 'error', 'output', 'assnId', 'type', 'title', 'ogTimestamp', 'serverTimestamp', 'projectId', 'unitTestResults']
+
+error_message_types = ['default', 'explain', 'messageboard', 'tigerpython', 'superhero', 'gpt']
+
+python_assgnids = ['helloworld', 'nimm', 'khansole', 'mars', 'liftoff', 'planets', 'diceroller', 'sandcastles', 'piglatin',
+                   'wordguess', 'infinitestory', 'es-hello', 'es-nimm', 'es-khansole', 'es-liftoff', 'es-piglatin']
+
+# Standard errors, as they appear in the error column. {n} is replaced by a random number, and {name} by a random name.
+# The last one is the weird_error_pattern shape that clean_error_message handles.
+error_templates = [
+    "Traceback (most recent call last):\n  File \"main.py\", line {n}, in <module>\nNameError: name '{name}' is not defined",
+    "Traceback (most recent call last):\n  File \"main.py\", line {n}, in <module>\nTypeError: unsupported operand type(s) for +: 'int' and 'str'",
+    "Traceback (most recent call last):\n  File \"main.py\", line {n}, in <module>\nTypeError: can only concatenate str (not \"int\") to str",
+    "Traceback (most recent call last):\n  File \"main.py\", line {n}, in <module>\nValueError: invalid literal for int() with base 10: '{name}'",
+    "Traceback (most recent call last):\n  File \"main.py\", line {n}, in {name}\nIndexError: list index out of range",
+    "Traceback (most recent call last):\n  File \"main.py\", line {n}, in {name}\nKeyError: '{name}'",
+    "  File \"main.py\", line {n}\n    if x = 5:\n         ^\nSyntaxError: invalid syntax",
+    "  File \"main.py\", line {n}\n    print(x\n         ^\nSyntaxError: unexpected EOF while parsing",
+    "  File \"main.py\", line {n}\n    return x\n    ^\nIndentationError: unexpected indent",
+    "Traceback (most recent call last):\n  File \"main.py\", line {n}, in {name}\nAttributeError: 'list' object has no attribute '{name}'",
+    "Traceback (most recent call last):\n  File \"main.py\", line {n}, in {name}\nAssertionError: {name} should be one of the following types: int in function {name}. Recieved str instead.",
+    "Traceback (most recent call last):\n  File \"main.py\", line {n}, in {name}\nZeroDivisionError: division by zero",
+    "(Line {n}) NameError: name '{name}' is not defined\x1b",
+]
+
+names = ['x', 'y', 'total', 'num', 'i', 'result', 'main', 'get_input', 'count', 'word', 'planet', 'answer']
+
+countries = ['United States', 'India', 'Nigeria', 'Brazil', 'Vietnam', 'Turkey', 'Russia', 'Mexico', 'Germany', 'Taiwan', 'Kenya', 'Pakistan', None]
+
+default_num_students = 1000
+default_output_folder = '../data_files/synthetic/'
+
+# The shape of a typical student. Each can be overridden for a single student (see generate_student_log).
+default_median_runs = 150
+default_error_rate = 0.25
+default_streak_rate = 0.55
+
+# The chance that a run starts a new session
+session_rate = 0.05
+
+course_calendar = CourseCalendar.from_config('cip3')
+course_start = pd.Timestamp(CourseCalendar.from_config('cip3_days').edges[0], tz='UTC').to_pydatetime()
+course_seconds = (course_calendar.edges[-1] - CourseCalendar.from_config('cip3_days').edges[0]) / 10**9
+
+# The same as course_calendar.get_period, without parsing the timestamp
+def get_week(timestamp):
+    index = bisect.bisect_right(course_calendar.edges_list, int(timestamp.timestamp()) * 10**9) - 1
+    if index < 0 or index >= len(course_calendar.period_labels):
+        return None
+    return course_calendar.period_labels[index]
+
+def get_user_id(index):
+    return f'synthetic{index:07d}'
+
+def get_student_rng(seed, index):
+    return random.Random(seed * 1000003 + index)
+
+# Return the chance that a run in the given week is from a karel assignment. The course starts with karel.
+def get_karel_rate(week):
+    if week is None or week > 2:
+        return 0.05
+    return 0.7
+
+def make_raw_error(rng):
+    return rng.choice(error_templates).format(n=rng.randrange(1, 80), name=rng.choice(names))
+
+# Return the enhanced error message shown for a raw error. The error message type is the text before the first colon.
+def make_error_message(error_message_type, raw_error):
+    last_line = raw_error.strip().split('\n')[-1].rstrip('\x1b')
+    return f'{error_message_type}: {last_line}'
+
+def make_project_id(rng):
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789') for _ in range(20))
+
+# Return the error message types that a student sees over the course. Most students see one, a few see
+# none (they are not tagged), and a few see two (e.g. they switched accounts).
+def get_student_error_message_types(rng):
+    draw = rng.random()
+    if draw < 0.03:
+        return []
+    if draw < 0.06:
+        return rng.sample(error_message_types, 2)
+    return [rng.choice(error_message_types)]
+
+# Return the rows of one student's log file, as dicts with the values of fieldnames as strings (or None).
+# num_runs, error_rate and karel_rate override the student's randomly drawn shape.
+def generate_student_log(index, seed=0, num_runs=None, error_rate=None, karel_rate=None, tagged=False):
+    rng = get_student_rng(seed, index)
+
+    if num_runs is None:
+        # Most students run their code a few hundred times, and a few run it thousands of times
+        num_runs = 0 if rng.random() < 0.03 else min(int(rng.lognormvariate(math.log(default_median_runs), 1.0)), 20000)
+    student_error_rate = default_error_rate * rng.uniform(0.5, 1.5) if error_rate is None else error_rate
+    student_error_message_types = get_student_error_message_types(rng)
+
+    # Students start in the first week, and run their code in sessions of quick runs. Some students stay
+    # for the whole course, and some drop out, so later weeks have fewer runs.
+    timestamp = course_start + timedelta(seconds=rng.randrange(7 * 24 * 3600))
+    active_seconds = rng.uniform(0.2, 1.0) * course_seconds
+    session_gap_seconds = active_seconds / max(num_runs * session_rate, 1)
+    projects = {}
+    assn_id = None
+    previous_errors = []
+    rows = []
+
+    for run in range(num_runs):
+        if rng.random() < session_rate:
+            timestamp += timedelta(seconds=rng.expovariate(1 / session_gap_seconds))
+        else:
+            timestamp += timedelta(seconds=rng.expovariate(1 / 90) + 5)
+        week = get_week(timestamp)
+
+        # Students work on the same assignment for a while before moving on
+        if assn_id is None or rng.random() < 0.04:
+            run_karel_rate = get_karel_rate(week) if karel_rate is None else karel_rate
+            if rng.random() < run_karel_rate:
+                assn_id = str(rng.choice(karel_assgnids))
+            else:
+                assn_id = rng.choice(python_assgnids)
+            previous_errors = []
+        karel = assn_id in assignment_registry.karel_ids
+        if assn_id not in projects:
+            projects[assn_id] = make_project_id(rng)
+        project_id = projects[assn_id]
+
+        # Errors often stay for several runs in a row before they are fixed
+        if len(previous_errors) > 0 and rng.random() < default_streak_rate:
+            errors = previous_errors
+        elif len(student_error_message_types) > 0 and rng.random() < student_error_rate:
+            errors = [make_raw_error(rng) for _ in range(2 if rng.random() < 0.1 else 1)]
+        else:
+            errors = []
+        previous_errors = errors
+
+        # Students that saw two error message types switch half way through the course
+        if len(student_error_message_types) == 0:
+            error_message_type = None
+        else:
+            error_message_type = student_error_message_types[min(run * len(student_error_message_types) // num_runs, len(student_error_message_types) - 1)]
+        error_messages = [make_error_message(error_message_type, raw_error) for raw_error in errors]
+
+        unit_test_results = [rng.choice(['passed', 'failed']) for _ in range(rng.randrange(4))] if not karel else []
+
+        row = {
+            'code': f'def main():\n    x = {rng.randrange(100)}\n    print(x)\n',
+            'error_message': str(error_messages),
+            'error': str(errors),
+            'output': '' if len(errors) > 0 else f'{rng.randrange(100)}\n',
+            'assnId': assn_id,
+            'type': 'karel' if karel and rng.random() < 0.9 else 'console',
+            'title': assn_id,
+            'ogTimestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%S.') + f'{timestamp.microsecond // 1000:03d}Z',
+            'serverTimestamp': str(timestamp + timedelta(milliseconds=rng.randrange(50, 2000))),
+            'projectId': None if rng.random() < 0.01 else project_id,
+            'unitTestResults': str(unit_test_results),
+        }
+        if tagged:
+            row['error_message_type'] = error_messages[0].split(':')[0].strip() if len(error_messages) > 0 else None
+        rows.append(row)
+
+    return rows
+
+def generate_student_log_df(index, seed=0, num_runs=None, error_rate=None, karel_rate=None, tagged=True):
+    rows = generate_student_log(index, seed, num_runs, error_rate, karel_rate, tagged)
+    columns = fieldnames + (['error_message_type'] if tagged else [])
+    return pd.DataFrame(rows, columns=columns)
+
+def write_student_log(rows, file_name, log_format, columns):
+    if log_format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([(column, pa.string()) for column in columns])
+        table = pa.table({ column: [row[column] for row in rows] for column in columns }, schema=schema)
+        pq.write_table(table, file_name, compression='zstd')
+    else:
+        # Downloaded files end their lines with \r\n (csv.DictWriter's default), and tagged files with \n,
+        # because add_error_message_type.py rewrites them with pandas
+        lineterminator = '\n' if 'error_message_type' in columns else '\r\n'
+        with open(file_name, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns, lineterminator=lineterminator)
+            writer.writeheader()
+            writer.writerows(rows)
+
+# Write the log files of the students with the given indices, and return the number of rows written
+def write_student_logs(indices, output_folder, seed, log_format, tagged):
+    columns = fieldnames + (['error_message_type'] if tagged else [])
+    num_rows = 0
+    for index in indices:
+        rows = generate_student_log(index, seed, tagged=tagged)
+        write_student_log(rows, f'{output_folder}student_logs/{get_user_id(index)}.{log_format}', log_format, columns)
+        num_rows += len(rows)
+    return num_rows
+
+# Write sl_and_student_data.csv, with one section leader for every ten students
+def write_sl_and_student_data(num_students, output_folder, seed):
+    rng = random.Random(seed)
+    users = []
+    for index in range(num_students):
+        users.append({ 'user_id': get_user_id(index), 'role': 'student', 'section_id': f'section{index // 10}' })
+    for section in range((num_students + 9) // 10):
+        users.append({ 'user_id': f'synthetic_sl{section:06d}', 'role': 'sl', 'section_id': f'section{section}' })
+
+    for user in users:
+        user['gender'] = rng.choice(['male', 'female', 'nonbinary', None])
+        user['age'] = rng.randrange(14, 70)
+        user['country'] = rng.choice(countries)
+        user['occupation'] = rng.choice(['student', 'engineer', 'teacher', None])
+        user['city'] = None
+
+    columns = ['user_id', 'role', 'gender', 'age', 'country', 'occupation', 'section_id', 'city']
+    pd.DataFrame(users, columns=columns).to_csv(f'{output_folder}sl_and_student_data.csv', index=False)
+
+def generate_synthetic_logs(num_students=default_num_students, output_folder=default_output_folder, seed=0, log_format='csv', tagged=False, workers=1, shard_size=1000):
+    os.makedirs(f'{output_folder}student_logs/', exist_ok=True)
+
+    shards = [range(start, min(start + shard_size, num_students)) for start in range(0, num_students, shard_size)]
+    if workers <= 1:
+        shard_rows = [write_student_logs(shard, output_folder, seed, log_format, tagged) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(write_student_logs, shard, output_folder, seed, log_format, tagged) for shard in shards]
+            shard_rows = [future.result() for future in futures]
+
+    write_sl_and_student_data(num_students, output_folder, seed)
+    print(f"Wrote {sum(shard_rows)} runs for {num_students} students to {output_folder}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=default_num_students, help='number of students to generate')
+    parser.add_argument('--output', default=default_output_folder, help='data_files folder to write student_logs/ and sl_and_student_data.csv to')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help='file format of the log files')
+    parser.add_argument('--tagged', action='store_true', help='add the error_message_type column that add_error_message_type.py adds')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to generate the students with')
+    args = parser.parse_args()
+
+    generate_synthetic_logs(args.students, args.output, args.seed, args.format, args.tagged, args.workers)
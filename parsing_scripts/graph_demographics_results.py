@@ -12,7 +12,9 @@ colors = ['r', 'darkorange', 'g', 'b', 'indigo', 'violet']
 
 data_file = '../data_files/sl_and_student_data.csv'
 
-def graph_hdi_vs_error_message_type(ax):
+# Return the average error run length of each error message type in each HDI group, with its standard
+# error, as a dataframe of the points to plot
+def get_hdi_vs_error_message_type_data():
     # Only include students who only used one error message type
     df = pd.read_csv(data_file)
     df = df[df['error_message_type'].isin(error_message_types)]
@@ -21,6 +23,7 @@ def graph_hdi_vs_error_message_type(ax):
     # Drop people who we do not have their HDI
     df = df.dropna(subset=['hdi'])
 
+    data = []
     for i, error_message_type in enumerate(error_message_types):
         subset = df[df['error_message_type'] == error_message_type]
 
@@ -49,14 +52,13 @@ def graph_hdi_vs_error_message_type(ax):
 
         # print(f'For HDI results, # Users {error_message_type}:', count)
 
-        ax.errorbar(x, y, yerr=stderr, color=colors[i], fmt='--', alpha=0.3)
-        ax.errorbar(x, y, yerr=stderr, color=colors[i], fmt='o', label=official_error_types[error_message_type])
+        data.append(pd.DataFrame({ 'error_message_type': error_message_type, 'x': x, 'y': y, 'stderr': stderr }))
 
-    ax.set_xlabel('Human Development Index (HDI)', labelpad=20)
-    ax.set_ylabel('Time to Resolve Errors (# of Runs)', labelpad=20)
-    ax.set_ylim(bottom=1, top=3)
+    return pd.concat(data, ignore_index=True)
 
-def graph_gender_vs_error_message_type(ax):
+# Return the average error run length of each error message type for each gender, with its standard
+# error, as a dataframe of the points to plot
+def get_gender_vs_error_message_type_data():
     # Only include students who only used one error message type
     df = pd.read_csv(data_file)
     df = df[df['error_message_type'].isin(error_message_types)]
@@ -65,6 +67,7 @@ def graph_gender_vs_error_message_type(ax):
     genders = ['Male', 'Female', 'Other']
 
     # For each unique error_message_type 
+    data = []
     for i, error_message_type in enumerate(error_message_types):
         # Subset the DataFrame
         df_for_type = df[df['error_message_type'] == error_message_type]
@@ -87,15 +90,13 @@ def graph_gender_vs_error_message_type(ax):
 
         # print(f'For gender results, # Users in {error_message_type}', len(male_results) + len(female_results) + len(other_results))
 
-        ax.errorbar(genders, averages, color=colors[i], fmt='--', alpha=0.3)
-        ax.errorbar(genders, averages, yerr=errors, color=colors[i], fmt='o')
+        data.append(pd.DataFrame({ 'error_message_type': error_message_type, 'x': genders, 'y': averages, 'stderr': errors }))
 
-    # Set the labels for x and y axis
-    ax.set_xlabel('Gender', labelpad=20)
-    # ax.set_ylabel('Number of Runs', fontsize=16)
-    ax.set_ylim(bottom=1, top=3)
+    return pd.concat(data, ignore_index=True)
 
-def graph_experience_vs_error_message_type(ax):
+# Return the average error run length of each error message type in each of 5 experience buckets, with
+# its standard error, as a dataframe of the points to plot
+def get_experience_vs_error_message_type_data():
     # Only include students who only used one error message type
     df = pd.read_csv(data_file)
     df = df[df['error_message_type'].isin(error_message_types)]
@@ -119,29 +120,71 @@ def graph_experience_vs_error_message_type(ax):
     bin_means = grouped_df['avg_error_run_length'].mean()
     bin_errors = grouped_df['avg_error_run_length'].sem()
 
+    data = []
     for i, error_message_type in enumerate(error_message_types):
-        ax.errorbar(experience_labels, 
-                    bin_means[error_message_type], 
-                    yerr=bin_errors[error_message_type], 
+        data.append(pd.DataFrame({ 'error_message_type': error_message_type, 'x': experience_labels,
+                                   'y': bin_means[error_message_type].to_numpy(), 'stderr': bin_errors[error_message_type].to_numpy() }))
+
+    return pd.concat(data, ignore_index=True)
+
+# Return the points plotted in the demographics figure, with the panel that each point is in
+def get_demo_results_data():
+    return pd.concat([
+        get_hdi_vs_error_message_type_data().assign(panel='hdi'),
+        get_gender_vs_error_message_type_data().assign(panel='gender'),
+        get_experience_vs_error_message_type_data().assign(panel='experience'),
+    ], ignore_index=True)
+
+def graph_hdi_vs_error_message_type(ax, data):
+    for i, error_message_type in enumerate(error_message_types):
+        data_for_type = data[data['error_message_type'] == error_message_type]
+
+        ax.errorbar(data_for_type['x'], data_for_type['y'], yerr=data_for_type['stderr'], color=colors[i], fmt='--', alpha=0.3)
+        ax.errorbar(data_for_type['x'], data_for_type['y'], yerr=data_for_type['stderr'], color=colors[i], fmt='o', label=official_error_types[error_message_type])
+
+    ax.set_xlabel('Human Development Index (HDI)', labelpad=20)
+    ax.set_ylabel('Time to Resolve Errors (# of Runs)', labelpad=20)
+    ax.set_ylim(bottom=1, top=3)
+
+def graph_gender_vs_error_message_type(ax, data):
+    for i, error_message_type in enumerate(error_message_types):
+        data_for_type = data[data['error_message_type'] == error_message_type]
+
+        ax.errorbar(data_for_type['x'], data_for_type['y'], color=colors[i], fmt='--', alpha=0.3)
+        ax.errorbar(data_for_type['x'], data_for_type['y'], yerr=data_for_type['stderr'], color=colors[i], fmt='o')
+
+    # Set the labels for x and y axis
+    ax.set_xlabel('Gender', labelpad=20)
+    # ax.set_ylabel('Number of Runs', fontsize=16)
+    ax.set_ylim(bottom=1, top=3)
+
+def graph_experience_vs_error_message_type(ax, data):
+    for i, error_message_type in enumerate(error_message_types):
+        data_for_type = data[data['error_message_type'] == error_message_type]
+
+        ax.errorbar(data_for_type['x'], 
+                    data_for_type['y'], 
+                    yerr=data_for_type['stderr'], 
                     color=colors[i], 
                     fmt='--', 
                     alpha=0.3)
-        ax.errorbar(experience_labels, 
-                    bin_means[error_message_type], 
-                    yerr=bin_errors[error_message_type], 
+        ax.errorbar(data_for_type['x'], 
+                    data_for_type['y'], 
+                    yerr=data_for_type['stderr'], 
                     color=colors[i], 
                     fmt='o')
 
     ax.set_xlabel('Programming Experience', labelpad=20)
     ax.set_ylim(bottom=1, top=3)
 
-def graph_demo_results_side_by_side():
+# Return the demographics figure, from the points returned by get_demo_results_data
+def plot_demo_results_side_by_side(data):
     fig, axes = plt.subplots(nrows=1, ncols=3, figsize=(20, 5))
 
     # Graph the percent errors over time
-    graph_hdi_vs_error_message_type(axes[0])
-    graph_gender_vs_error_message_type(axes[1])
-    graph_experience_vs_error_message_type(axes[2])
+    graph_hdi_vs_error_message_type(axes[0], data[data['panel'] == 'hdi'])
+    graph_gender_vs_error_message_type(axes[1], data[data['panel'] == 'gender'])
+    graph_experience_vs_error_message_type(axes[2], data[data['panel'] == 'experience'])
 
     # Create a single legend with all lines from all subplots
     lines_labels = [ax.get_legend_handles_labels() for ax in fig.axes]
@@ -155,10 +198,14 @@ def graph_demo_results_side_by_side():
     axes[1].tick_params(axis='both', which='major', pad=10)
     axes[2].tick_params(axis='both', which='major', pad=10)
 
-    # Display the plot
     plt.subplots_adjust(wspace = 0.3)
+    return fig
+
+def graph_demo_results_side_by_side():
+    plot_demo_results_side_by_side(get_demo_results_data())
+
+    # Display the plot
     plt.show()
 
 if __name__ == "__main__":
     graph_demo_results_side_by_side()
- 
\ No newline at end of file
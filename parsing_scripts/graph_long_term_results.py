@@ -1,14 +1,13 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import json
+import pandas as pd
 from error_message_types import official_error_types
+from results_store import get_results
 
 from matplotlib import rcParams
 rcParams['font.family'] = 'Times New Roman'
 rcParams['font.size'] = '24'
 
-data_folder = '../data_files/long_term_data/'
-
 colors = ['r', 'darkorange', 'g', 'b', 'indigo', 'violet']
 
 # Return a dictionary of the average rate of error per week, independent of error message type
@@ -20,79 +19,105 @@ def get_percent_error_averages_per_week(percent_errors_over_time):
         # For each week
         for week in range(1, 8):
             # Add the percent errors for this week to the list of percent errors for this week
-            total[week].extend(percent_errors_over_time[error_message_type][f'{week}'])
+            total[week].extend(percent_errors_over_time[error_message_type][week])
     
     # Calculate the average percent errors per week
     avgs_per_week = { week: np.mean(total[week]) for week in range(1, 8)}
 
     return avgs_per_week
 
-def graph_percent_errors_over_time(ax, x_labels):
+# Return the deviation of each error message type's average rate of error from the average rate of error
+# of all types in weeks 2 to 6, with its standard error, as a dataframe of the points to plot
+def get_percent_errors_over_time_data():
     # Load the data
-    f = open(f'{data_folder}percent_errors_over_time.json')
-    percent_errors_over_time = json.load(f)
+    percent_errors_over_time = get_results('percent_errors_over_time')
 
     # Get the average percent errors per week
     avgs_per_week = get_percent_error_averages_per_week(percent_errors_over_time)
 
+    data = []
     for i, error_message_type in enumerate(percent_errors_over_time):
-        # if not error_message_type in ['default','tigerpython','gpt']:
-        #     continue
-
         # Map of each week to the rate of errors that week, for this error message type
         results_for_type = percent_errors_over_time[error_message_type]
 
         # Calculate the average percent errors for this error message type
-        avg_percent_errors_for_type = [np.mean(results_for_type[str(week)]) - avgs_per_week[week]
+        avg_percent_errors_for_type = [np.mean(results_for_type[week]) - avgs_per_week[week]
                                        for week in range(2, 7)]
         
         # Calculate the standard error of the percent errors for this error message type
-        stderr_percent_errors_for_type = [np.std(results_for_type[str(week)]) / np.sqrt(len(results_for_type[str(week)])) 
+        stderr_percent_errors_for_type = [np.std(results_for_type[week]) / np.sqrt(len(results_for_type[week])) 
+                                          for week in range(2, 7)]
+
+        data.append(pd.DataFrame({ 'error_message_type': error_message_type, 'week': range(2, 7), 'y': avg_percent_errors_for_type, 'stderr': stderr_percent_errors_for_type }))
+
+    return pd.concat(data, ignore_index=True)
+
+# Return the average length of each error message type's error runs in weeks 2 to 6, with its standard
+# error, as a dataframe of the points to plot
+def get_length_error_runs_over_time_data():
+    # Load the data
+    length_error_runs_over_time = get_results('length_error_runs_over_time')
+
+    data = []
+    for i, error_message_type in enumerate(length_error_runs_over_time):
+        # Calculate the average length error runs for this error message type
+        avg_length_error_runs_for_type = [np.mean(length_error_runs_over_time[error_message_type][week])
                                           for week in range(2, 7)]
         
+        # Calculate the standard error of the length error runs for this error message type
+        stderr_length_error_runs_for_type = [np.std(length_error_runs_over_time[error_message_type][week]) / 
+                                             np.sqrt(len(length_error_runs_over_time[error_message_type][week])) 
+                                             for week in range(2, 7)]
+
+        data.append(pd.DataFrame({ 'error_message_type': error_message_type, 'week': range(2, 7), 'y': avg_length_error_runs_for_type, 'stderr': stderr_length_error_runs_for_type }))
+
+    return pd.concat(data, ignore_index=True)
+
+# Return the points plotted in the long term results figure, with the panel that each point is in
+def get_long_term_results_data():
+    return pd.concat([
+        get_percent_errors_over_time_data().assign(panel='percent_errors_over_time'),
+        get_length_error_runs_over_time_data().assign(panel='length_error_runs_over_time'),
+    ], ignore_index=True)
+
+def graph_percent_errors_over_time(ax, x_labels, data):
+    for i, error_message_type in enumerate(data['error_message_type'].unique()):
+        # if not error_message_type in ['default','tigerpython','gpt']:
+        #     continue
+        data_for_type = data[data['error_message_type'] == error_message_type]
+
         # Plot the average percent errors for this error message type
-        ax.errorbar(x_labels, avg_percent_errors_for_type, yerr=stderr_percent_errors_for_type, color=colors[i], fmt='o', label=official_error_types[error_message_type])
+        ax.errorbar(x_labels, data_for_type['y'], yerr=data_for_type['stderr'], color=colors[i], fmt='o', label=official_error_types[error_message_type])
 
         # Draw a faint line for each run
-        ax.errorbar(x_labels, avg_percent_errors_for_type, color=colors[i], fmt='--', alpha=0.3)      
+        ax.errorbar(x_labels, data_for_type['y'], color=colors[i], fmt='--', alpha=0.3)      
 
     ax.set_ylabel('Deviation from Average Error Rate')  
     ax.set_ylim(bottom=-0.04, top=0.04)
     ax.set_xlabel('Week')  
 
-def graph_length_error_runs_over_time(ax, x_labels):
-    # Load the data
-    f = open(f'{data_folder}length_error_runs_over_time.json')
-    length_error_runs_over_time = json.load(f)
-
-    for i, error_message_type in enumerate(length_error_runs_over_time):
+def graph_length_error_runs_over_time(ax, x_labels, data):
+    for i, error_message_type in enumerate(data['error_message_type'].unique()):
         # if not error_message_type in ['default','tigerpython','gpt']:
         #     continue
+        data_for_type = data[data['error_message_type'] == error_message_type]
 
-        # Calculate the average length error runs for this error message type
-        avg_length_error_runs_for_type = [np.mean(length_error_runs_over_time[error_message_type][str(week)])
-                                          for week in range(2, 7)]
-        
-        # Calculate the standard error of the length error runs for this error message type
-        stderr_length_error_runs_for_type = [np.std(length_error_runs_over_time[error_message_type][str(week)]) / 
-                                             np.sqrt(len(length_error_runs_over_time[error_message_type][str(week)])) 
-                                             for week in range(2, 7)]
-        
-        ax.errorbar(x_labels, avg_length_error_runs_for_type, yerr=stderr_length_error_runs_for_type, color=colors[i], fmt='o')        
-        ax.errorbar(x_labels, avg_length_error_runs_for_type, color=colors[i], fmt='--', alpha=0.3)   
+        ax.errorbar(x_labels, data_for_type['y'], yerr=data_for_type['stderr'], color=colors[i], fmt='o')        
+        ax.errorbar(x_labels, data_for_type['y'], color=colors[i], fmt='--', alpha=0.3)   
 
     ax.set_ylabel('Time to Resolve Errors (# of Runs)')   
     ax.set_xlabel('Week')  
     ax.set_ylim(bottom=1)
 
-def graph_long_term_results_side_by_side():
+# Return the long term results figure, from the points returned by get_long_term_results_data
+def plot_long_term_results_side_by_side(data):
     fig, axes = plt.subplots(nrows=1, ncols=2)
 
     x_labels = ['2', '3', '4', '5', '6']
 
     # Graph the percent errors over time
-    graph_percent_errors_over_time(axes[0], x_labels)
-    graph_length_error_runs_over_time(axes[1], x_labels)
+    graph_percent_errors_over_time(axes[0], x_labels, data[data['panel'] == 'percent_errors_over_time'])
+    graph_length_error_runs_over_time(axes[1], x_labels, data[data['panel'] == 'length_error_runs_over_time'])
 
     # Create a single legend with all lines from all subplots
     lines_labels = [ax.get_legend_handles_labels() for ax in fig.axes]
@@ -105,9 +130,14 @@ def graph_long_term_results_side_by_side():
     axes[0].tick_params(axis='both', which='major', pad=10)
     axes[1].tick_params(axis='both', which='major', pad=10)
 
-    # Display the plot
     plt.subplots_adjust(wspace = 0.3)
+    return fig
+
+def graph_long_term_results_side_by_side():
+    plot_long_term_results_side_by_side(get_long_term_results_data())
+
+    # Display the plot
     plt.show()
 
 if __name__ == '__main__':
-    graph_long_term_results_side_by_side()
\ No newline at end of file
+    graph_long_term_results_side_by_side()
@@ -1,7 +1,8 @@
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
-import json
 from scipy import stats
+from results_store import get_results
 
 from matplotlib import rcParams
 rcParams['font.family'] = 'Times New Roman'
@@ -12,8 +13,6 @@ rcParams['font.size'] = '24'
 
 test_folder = "../data_files/student_logs/"
 
-data_folder = "../data_files/short_term_data/"
-
 error_message_types = ['default', 'explain', 'messageboard', 'tigerpython', 'superhero', 'gpt']
 error_message_types2 = ['default', 'explain', 'messageboard', 'tigerpython', 'gpt', 'superhero']
 
@@ -32,9 +31,10 @@ brightgreen = '#0f6e07'
 lightgreen = '#54a14d'
 colors = [hotpink, pink, brightgreen, lightgreen]
 
-def graph_percent_same_error_per_user(ax, color):
-    f = open(f'{data_folder}percent_same_subsequent_error.json', 'r')
-    percent_same_subsequent_error = json.load(f)
+# Return the average rate of repeated errors of each error message type, with its standard error, as a
+# dataframe of the points to plot (x is the official name of the error message type)
+def get_percent_same_error_per_user_data():
+    percent_same_subsequent_error = get_results('percent_same_subsequent_error')
 
     x = []
     y = []
@@ -46,11 +46,12 @@ def graph_percent_same_error_per_user(ax, color):
         y.append(np.mean(percentages)) # The average of all users
         stderr.append(np.std(percentages)/np.sqrt(len(percentages)))
 
-    ax.errorbar(x, y, yerr=stderr, color=color, fmt='o', label="Avg. Rate of Repeated Errors")
+    return pd.DataFrame({ 'x': x, 'y': y, 'stderr': stderr })
 
-def graph_avg_runs_until_resolved_per_user(ax, color):
-    f = open(f'{data_folder}average_runs_until_resolved.json', 'r')
-    runs_until_resolved_per_user_results = json.load(f)
+# Return the average number of runs until an error is resolved of each error message type, with its
+# standard error, as a dataframe of the points to plot
+def get_avg_runs_until_resolved_per_user_data():
+    runs_until_resolved_per_user_results = get_results('average_runs_until_resolved')
 
     x = []
     y = []
@@ -60,23 +61,37 @@ def graph_avg_runs_until_resolved_per_user(ax, color):
         y.append(np.mean(runs_until_resolved_per_user_results[error_message_type]))
         stderr.append(np.std(runs_until_resolved_per_user_results[error_message_type])/np.sqrt(len(runs_until_resolved_per_user_results[error_message_type])))
 
-    ax.errorbar(x, y, yerr=stderr, color=color, fmt='o', label="Avg. Runs until Resolved")
+    return pd.DataFrame({ 'x': x, 'y': y, 'stderr': stderr })
 
-def graph_short_term_results():
+# Return the points plotted in the short term results figure, with the panel that each point is in
+def get_short_term_results_data():
+    return pd.concat([
+        get_percent_same_error_per_user_data().assign(panel='percent_same_error'),
+        get_avg_runs_until_resolved_per_user_data().assign(panel='avg_runs_until_resolved'),
+    ], ignore_index=True)
+
+def graph_percent_same_error_per_user(ax, color, data):
+    ax.errorbar(data['x'], data['y'], yerr=data['stderr'], color=color, fmt='o', label="Avg. Rate of Repeated Errors")
+
+def graph_avg_runs_until_resolved_per_user(ax, color, data):
+    ax.errorbar(data['x'], data['y'], yerr=data['stderr'], color=color, fmt='o', label="Avg. Runs until Resolved")
+
+# Return the short term results figure, from the points returned by get_short_term_results_data
+def plot_short_term_results(data):
     # Initialize the figure
     fig, ax1 = plt.subplots()
 
     # x axis is the error message types
     official_types = [official_error_types[type] for type in error_message_types2]
 
-    graph_percent_same_error_per_user(ax1, hotpink)
+    graph_percent_same_error_per_user(ax1, hotpink, data[data['panel'] == 'percent_same_error'])
 
     ax1.set_xticklabels(official_types, rotation=0, horizontalalignment='center')
     ax1.set_xlabel("Error Message Type", labelpad=20)
     ax1.set_ylabel("Rate of Repeated Errors (% of Errors)", labelpad=20)
     ax2 = ax1.twinx()
 
-    graph_avg_runs_until_resolved_per_user(ax2, brightgreen)
+    graph_avg_runs_until_resolved_per_user(ax2, brightgreen, data[data['panel'] == 'avg_runs_until_resolved'])
 
     ax2.set_ylabel("Time to Resolve Errors (# of Runs)", labelpad=20)
     fig.legend(loc="upper right", bbox_to_anchor=(1,1), bbox_transform=ax1.transAxes)
@@ -84,7 +99,11 @@ def graph_short_term_results():
     
     ax2.tick_params(axis='both', which='major')
 
+    return fig
+
+def graph_short_term_results():
+    plot_short_term_results(get_short_term_results_data())
     plt.show()
 
 if __name__ == '__main__':
-    graph_short_term_results()
\ No newline at end of file
+    graph_short_term_results()
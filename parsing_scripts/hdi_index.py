@@ -0,0 +1,112 @@
+import os
+import hashlib
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Maps every country name that users can have to the HDI of that country. The index is built once from
+# hdi.xlsx, which is slow to parse, and cached as a parquet file next to it. The cache is rebuilt whenever
+# hdi.xlsx or country_aliases change.
+
+hdi_file = '../data_files/hdi.xlsx'
+hdi_index_file = '../data_files/hdi_index.parquet'
+
+# Country names that users can have, mapped to the name of the same country in hdi.xlsx,
+# or to None if hdi.xlsx has no HDI for the country
+country_aliases = {
+    'Hong Kong': 'Hong Kong, China (SAR)',
+    'Turkey': 'Türkiye',
+    'Czech Republic': 'Czechia',
+    'Vietnam': 'Viet Nam',
+    'Russia': 'Russian Federation',
+    'Bolivia': 'Bolivia (Plurinational State of)',
+    'Venezuela': 'Venezuela (Bolivarian Republic of)',
+    'Iran': 'Iran (Islamic Republic of)',
+    'South Korea': 'Korea (Republic of)',
+    'Tanzania': 'Tanzania (United Republic of)',
+    'Ivory Coast': "Côte d'Ivoire",
+    'Moldova': 'Moldova (Republic of)',
+    'Myanmar [Burma]': 'Myanmar',
+    'Palestine': 'Palestine, State of',
+    'Macao': None,
+    'Taiwan': None,
+    'Puerto Rico': None,
+    'Kosovo': None,
+    'New Caledonia': None,
+    'Guam': None,
+    'Guernsey': None,
+    'Antarctica': None,
+    'Laos': None,
+    'British Indian Ocean Territory': None,
+    'Somalia': None,
+    'Monaco': None,
+    'Nauru': None,
+    'Jersey': None
+}
+
+# Identifies the version of hdi.xlsx and country_aliases that an index was built from
+def get_source_hash():
+    sha1 = hashlib.sha1()
+    with open(hdi_file, 'rb') as f:
+        sha1.update(f.read())
+    sha1.update(json.dumps(country_aliases, sort_keys=True).encode('utf-8'))
+    return sha1.hexdigest()
+
+# Return a dataframe with the country and hdi of every country name in hdi.xlsx and country_aliases.
+# Countries without an HDI have a missing hdi.
+def build_hdi_index():
+    # Skip the first four rows, set header as 0
+    data = pd.read_excel(hdi_file, skiprows=5, header=0)
+
+    # Remove or Drop Column with NaN value
+    data = data.dropna(how='all', axis=1)
+
+    # Use the first row of each country
+    data = data.dropna(subset=['Country']).drop_duplicates(subset=['Country'])
+    hdi_values = data.set_index('Country')['Value']
+
+    aliases = pd.Series(country_aliases, dtype=object)
+    alias_values = aliases.map(hdi_values, na_action='ignore')
+
+    index = pd.concat([hdi_values[~hdi_values.index.isin(aliases.index)], alias_values])
+    return pd.DataFrame({ 'country': index.index.astype(str), 'hdi': pd.to_numeric(index.to_numpy(), errors='coerce') })
+
+def save_hdi_index(index, source_hash):
+    table = pa.Table.from_pandas(index, preserve_index=False)
+    table = table.replace_schema_metadata({ **(table.schema.metadata or {}), b'source_hash': source_hash.encode('utf-8') })
+    pq.write_table(table, hdi_index_file + '.tmp')
+    os.replace(hdi_index_file + '.tmp', hdi_index_file)
+
+# Return the cached index, or None if there is no cache for this version of hdi.xlsx and country_aliases
+def read_cached_hdi_index(source_hash):
+    if not os.path.exists(hdi_index_file):
+        return None
+    table = pq.read_table(hdi_index_file)
+    if (table.schema.metadata or {}).get(b'source_hash') != source_hash.encode('utf-8'):
+        return None
+    return table.to_pandas()
+
+# Return a series of the hdi of every country name, keyed by the country name
+def load_hdi_index():
+    source_hash = get_source_hash()
+    index = read_cached_hdi_index(source_hash)
+    if index is None:
+        index = build_hdi_index()
+        save_hdi_index(index, source_hash)
+    return index.set_index('country')['hdi']
+
+# Return the hdi of each country in the series (missing if it has none), and a list of the
+# country names that are not in the index at all
+def lookup_hdi(countries, hdi_index=None):
+    if hdi_index is None:
+        hdi_index = load_hdi_index()
+
+    hdi = countries.map(hdi_index)
+    unknown = countries[countries.notna() & ~countries.isin(hdi_index.index)]
+    return hdi, sorted(unknown.unique())
+
+if __name__ == '__main__':
+    index = build_hdi_index()
+    save_hdi_index(index, get_source_hash())
+    print(f'Wrote the hdi of {index["hdi"].notna().sum()} of {len(index)} countries to {hdi_index_file}')
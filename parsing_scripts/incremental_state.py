@@ -0,0 +1,183 @@
+import os
+import json
+import hashlib
+import inspect
+import functools
+import pandas as pd
+import log_store
+from log_store import iter_student_logs, get_student_log_shards, map_student_log_shards, get_student_log_stats, get_log_file_path, parse_timestamps
+from course_calendar import calendar_file
+from clean_error_message import get_normalization_rules_hash
+
+# Keeps the per-student results of a parser between runs, so that a rerun only re-parses the students
+# whose log files changed. For every log file the state records its modification time, size and sha1 hash,
+# the last ogTimestamp that was parsed, and the student's results. The changed students are read the same way as in a full run (from the log
+# store if there is one, only reading the parser's columns, in --workers processes), and the results are
+# returned in the same order as a full run visits the students, so the output is identical.
+#
+# The state is only valid for the version of the parsing that wrote it (see get_state_version), and is
+# thrown away when that changes.
+
+state_folder = '../data_files/incremental_state/'
+
+# Bump after changing how students are parsed in a way get_state_version can't see (e.g. in error_runs.py),
+# so that the results saved by an older version are thrown away
+state_version = 1
+
+def get_state_file(name):
+    return f'{state_folder}{name}.json'
+
+# Return the version of the parsing that the results of a state depend on: a hash of the parser's name and
+# the source of its module, the course calendars and the normalization rules
+def get_state_version(name, parse_student):
+    sha1 = hashlib.sha1()
+    sha1.update(json.dumps([state_version, name, get_normalization_rules_hash()]).encode('utf-8'))
+    for path in [calendar_file, inspect.getsourcefile(parse_student)]:
+        with open(path, 'rb') as f:
+            sha1.update(f.read())
+    return sha1.hexdigest()
+
+# Return the saved students of the state, or an empty state if it was saved by another version of the parsing
+def load_state(name, version):
+    if not os.path.exists(get_state_file(name)):
+        return {}
+    with open(get_state_file(name), 'r') as f:
+        state = json.load(f)
+    if state.get('version') != version:
+        print(f'{get_state_file(name)} was saved by another version of the parsing, parsing every student again')
+        return {}
+    return state['students']
+
+# Write the state to a temporary file first, so that an interrupted run never leaves a half written state
+def save_state(name, version, students):
+    os.makedirs(state_folder, exist_ok=True)
+    temp_file = get_state_file(name) + '.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump({ 'version': version, 'students': students }, f)
+    os.replace(temp_file, get_state_file(name))
+
+def get_file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+# Return the last ogTimestamp in the student's log, or None if there is none
+def get_last_timestamp(df):
+    last_timestamp = parse_timestamps(df['ogTimestamp']).max()
+    return None if pd.isna(last_timestamp) else last_timestamp.isoformat()
+
+# Parse the given students, and return a list of (user_id, last ogTimestamp, parse_student(df)).
+# ogTimestamp is read for the last timestamp even if it is not one of the columns, but parse_student
+# only gets the columns.
+def parse_shard_incrementally(parse_student, columns, user_ids):
+    read_columns = columns if columns is None or 'ogTimestamp' in columns else [*columns, 'ogTimestamp']
+    results = []
+    for user_id, df in iter_student_logs(user_ids, read_columns):
+        last_timestamp = get_last_timestamp(df)
+        if read_columns is not columns:
+            df = df.drop(columns=['ogTimestamp'])
+        results.append((user_id, last_timestamp, parse_student(df)))
+    return results
+
+# Return (user_id, parse_student(df)) for every student, in the same order that iter_student_logs visits
+# them. parse_student is only called for the students whose log file is new or changed since the last run
+# with the same name and version (see get_state_version), and its results must be json serializable.
+# The changed students are read with only the given columns, in workers processes.
+def parse_students_incrementally(name, parse_student, columns=None, workers=1):
+    version = get_state_version(name, parse_student)
+    state = load_state(name, version)
+    new_state = {}
+    changed_user_ids = set()
+
+    for user_id, (mtime_ns, size) in get_student_log_stats().items():
+        entry = state.get(user_id)
+        if entry is not None and entry['mtime_ns'] == mtime_ns and entry['size'] == size:
+            # The file has not been touched since the last run
+            new_state[user_id] = entry
+            continue
+
+        file_hash = get_file_hash(get_log_file_path(user_id)) if os.path.isdir(log_store.logs_folder) else None
+        if entry is not None and file_hash is not None and entry['sha1'] == file_hash:
+            # The file was rewritten with the same contents
+            entry['mtime_ns'] = mtime_ns
+            entry['size'] = size
+            new_state[user_id] = entry
+        else:
+            new_state[user_id] = { 'mtime_ns': mtime_ns, 'size': size, 'sha1': file_hash, 'last_ogTimestamp': None, 'results': None }
+            changed_user_ids.add(user_id)
+
+    # Parse the changed students shard by shard, as a full run does
+    shards = get_student_log_shards()
+    changed_shards = [[user_id for user_id in shard if user_id in changed_user_ids] for shard in shards]
+    parse_shard = functools.partial(parse_shard_incrementally, parse_student, columns)
+    for shard_results in map_student_log_shards(parse_shard, workers, [shard for shard in changed_shards if len(shard) > 0]):
+        for user_id, last_timestamp, student_results in shard_results:
+            new_state[user_id]['last_ogTimestamp'] = last_timestamp
+            new_state[user_id]['results'] = student_results
+
+    # Students whose log files were deleted are dropped from the state
+    save_state(name, version, new_state)
+
+    last_timestamps = [entry['last_ogTimestamp'] for entry in new_state.values() if entry['last_ogTimestamp'] is not None]
+    print(f"Parsed {len(changed_user_ids)} new or changed students, reused the results of {len(new_state) - len(changed_user_ids)} students")
+    if len(last_timestamps) > 0:
+        print(f"The logs are parsed up to {max(last_timestamps)}")
+    return [(user_id, new_state[user_id]['results']) for shard in shards for user_id in shard]
+
+# Check that incremental runs of the short and long term parsers give exactly the same results as a full run:
+# when every student is parsed, when some students are parsed and the rest are reused, when every student
+# is reused, and when the state was saved by another version of the parsing. Uses its own state folder, and returns the names of the runs that were different.
+def check_incremental_parsing(workers=1):
+    import tempfile
+    from parse_short_term_results import parse_data_on_short_term
+    from parse_long_term_results import parse_data_on_long_term
+
+    global state_folder
+    saved_state_folder = state_folder
+    mismatches = []
+    try:
+        with tempfile.TemporaryDirectory() as temp_folder:
+            state_folder = f'{temp_folder}/'
+            for name, parse_data in [('short_term', parse_data_on_short_term), ('long_term', parse_data_on_long_term)]:
+                full_results = json.dumps(parse_data(workers))
+
+                runs = {}
+                runs['all parsed'] = json.dumps(parse_data(workers, incremental=True))
+
+                # Forget every third student, so that they are parsed again
+                with open(get_state_file(name), 'r') as f:
+                    state = json.load(f)
+                students = { user_id: entry for i, (user_id, entry) in enumerate(state['students'].items()) if i % 3 != 0 }
+                save_state(name, state['version'], students)
+                runs['some parsed'] = json.dumps(parse_data(workers, incremental=True))
+
+                runs['all reused'] = json.dumps(parse_data(workers, incremental=True))
+
+                # A state saved by another version of the parsing is thrown away
+                save_state(name, 'another version', students)
+                runs['other version'] = json.dumps(parse_data(workers, incremental=True))
+
+                for run, results in runs.items():
+                    if results != full_results:
+                        mismatches.append(f'{name}, {run}')
+    finally:
+        state_folder = saved_state_folder
+
+    return mismatches
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to parse the students with')
+    args = parser.parse_args()
+
+    # The parsers use the imported module, not this script, so run the check from there
+    from incremental_state import check_incremental_parsing
+    mismatches = check_incremental_parsing(args.workers)
+    for mismatch in mismatches:
+        print(f'The incremental results are different from the full run: {mismatch}')
+    print('The incremental results are the same as the full run' if len(mismatches) == 0 else f'{len(mismatches)} mismatches')
+    if len(mismatches) > 0:
+        raise SystemExit(1)
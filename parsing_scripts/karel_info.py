@@ -1,7 +1,77 @@
-karel_assgnids = [2023, "2023", "checkerboard", "diagnostic3", "diagnostic3soln", "fillkarel", "hospital", "housekarel", "jigsaw", "midpoint", "mountain", "warmup", "steeplechase", "stepup", "stonemason", "spreadbeepers", "rhoomba", "randompainter", "outline", "piles", 
-                  "es-karel-midpoint", "es-karel-cone-pile", "es-karel-stripe", "es-karel-collect-newspaper", "es-karel-hospital", "es-karel-stone-mason", "es-karel-mountain", "es-karel-beeper-line", "es-karel-jump-up", "es-karel-hurdle", "es-karel-checkerboard", 
+import numpy as np
+import pandas as pd
+
+karel_assgnids = [2023, "2023", "checkerboard", "diagnostic3", "diagnostic3soln", "fillkarel", "hospital", "housekarel", "jigsaw", "midpoint", "mountain", "warmup", "steeplechase", "stepup", "stonemason", "spreadbeepers", "rhoomba", "randompainter", "outline", "piles",
+                  "es-karel-midpoint", "es-karel-cone-pile", "es-karel-stripe", "es-karel-collect-newspaper", "es-karel-hospital", "es-karel-stone-mason", "es-karel-mountain", "es-karel-beeper-line", "es-karel-jump-up", "es-karel-hurdle", "es-karel-checkerboard",
                   "es-karel-step-up", "es-karel-dog-years", "es-karel-place-2023", "es-karel-mystery", "es-karel-invert-beeper-1d", "es-karel-un", "es-karel-random-painting", "es-karel-outline", "es-karel-fill", "es-karel-to-the-wall", "es-project-karel", "es-karel-place-100",
                   "es-karel-big-beeper", "karelflag", 'movebeeper', 'diamond', 'place10beepers', 'zigzag']
 
+# The kinds of assignment an assignment id can be. Rows without an assignment id are unknown.
+assignment_kinds = ['karel', 'python', 'unknown']
+
+# Assignment ids that start with this prefix are the Spanish versions of an assignment
+spanish_prefix = 'es-'
+
+# Return the assignment id as a string, so that e.g. 2023, 2023.0 and "2023" are the same assignment.
+# Returns None for a missing assignment id.
+def get_assignment_key(assn_id):
+    if assn_id is None or (isinstance(assn_id, float) and np.isnan(assn_id)):
+        return None
+    if isinstance(assn_id, (float, np.floating)) and float(assn_id).is_integer():
+        return str(int(assn_id))
+    return str(assn_id)
+
+# Classifies assignment ids as karel, python or unknown, and holds the metadata of each assignment
+# (whether it is a Spanish version, and optionally the week it was assigned). Every method that takes
+# a column classifies each distinct id once, so filtering a whole column is a single vector operation.
+class AssignmentRegistry:
+    def __init__(self, karel_ids, assignment_weeks=None):
+        self.karel_ids = frozenset(get_assignment_key(assn_id) for assn_id in karel_ids)
+        self.assignment_weeks = { get_assignment_key(assn_id): week for assn_id, week in (assignment_weeks or {}).items() }
+
+    def is_karel(self, assn_id):
+        return get_assignment_key(assn_id) in self.karel_ids
+
+    def classify(self, assn_id):
+        key = get_assignment_key(assn_id)
+        if key is None:
+            return 'unknown'
+        return 'karel' if key in self.karel_ids else 'python'
+
+    def is_spanish(self, assn_id):
+        key = get_assignment_key(assn_id)
+        return key is not None and key.startswith(spanish_prefix)
+
+    # Return the week the assignment was assigned, or None if it is not known
+    def get_week_assigned(self, assn_id):
+        return self.assignment_weeks.get(get_assignment_key(assn_id))
+
+    # Apply get_value to each distinct value of the column, and return the results for every row
+    def map_distinct(self, assn_ids, get_value, dtype):
+        codes, uniques = pd.factorize(pd.Series(assn_ids), use_na_sentinel=False)
+        values = np.array([get_value(assn_id) for assn_id in uniques], dtype=dtype)
+        return values[codes] if len(values) > 0 else np.zeros(0, dtype=dtype)
+
+    # Return the kind of every assignment id, as a categorical with the categories in assignment_kinds
+    def classify_column(self, assn_ids):
+        kinds = self.map_distinct(assn_ids, self.classify, object)
+        return pd.Categorical(kinds, categories=assignment_kinds)
+
+    def get_karel_mask(self, assn_ids):
+        return self.map_distinct(assn_ids, self.is_karel, bool)
+
+    def get_spanish_mask(self, assn_ids):
+        return self.map_distinct(assn_ids, self.is_spanish, bool)
+
+    def get_weeks_assigned(self, assn_ids):
+        return self.map_distinct(assn_ids, self.get_week_assigned, object)
+
+    # Return a boolean mask of the rows of a log dataframe that are not from a karel assignment,
+    # the same as not_karel for every row
+    def get_not_karel_mask(self, df):
+        return ~self.get_karel_mask(df['assnId']) & (df['type'] != 'karel').to_numpy()
+
+assignment_registry = AssignmentRegistry(karel_assgnids)
+
 def not_karel(row):
-    return row['assnId'] not in karel_assgnids and row['type'] != 'karel'
\ No newline at end of file
+    return not assignment_registry.is_karel(row['assnId']) and row['type'] != 'karel'
@@ -0,0 +1,505 @@
+import os
+import hashlib
+import functools
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from error_message_types import decode_error_columns
+
+# The log store packs every student log in student_logs/ into one Parquet dataset, so that
+# the analysis scripts do not have to open and string-parse thousands of files on every run.
+# student_logs/ can hold a csv file or a zstd compressed parquet file per student (see download_logs_per_student.py).
+# Students are sorted by user id and split into a fixed number of partitions of consecutive students, and each
+# partition is one parquet file that holds the rows of all of its students (in the same order as their log files),
+# so reading the partitions in order visits the students in user id order, like reading the log files.
+# students.csv lists every student in the store, including students whose log file has no rows, with the
+# modification time and size of their log file. The store is only used while it matches the log files.
+# The stringified error and error_message lists are also decoded once into list columns (raw_errors and
+# error_messages), and rows that could not be decoded are listed in quarantine.csv.
+# Code snapshots are stored once per distinct program in each partition, in code_blobs/part-{partition}.parquet,
+# keyed by a 128 bit blake2b hash of the code, and each row keeps only the code_hash. Each blob file holds
+# every snapshot of its partition, so rebuilding a student's code only reads their partition's blob file.
+# Reading a student's logs without choosing columns puts the code column back.
+
+logs_folder = '../data_files/student_logs/'
+store_folder = '../data_files/student_logs_store/'
+
+num_partitions = 64
+
+# Number of log files per shard, when the logs are read from student_logs/
+csv_shard_size = 100
+
+# Columns that only take a handful of distinct values, so they are dictionary encoded
+categorical_columns = ['user_id', 'assnId', 'type', 'projectId', 'error_message_type']
+
+# Columns that hold timestamps
+timestamp_columns = ['ogTimestamp', 'serverTimestamp']
+
+# The columns that the metrics read. The metrics pass these to iter_student_logs, so that the code,
+# output and unitTestResults text (most of the bytes of a log file) is never read.
+error_columns = ['error', 'error_message']
+run_columns = ['projectId', 'assnId', 'type', 'ogTimestamp', 'error_message_type', *error_columns]
+
+# A code snapshot can be stored as a delta against the previous snapshot of the same project, if the delta
+# is less than this fraction of the code. Deltas of deltas are allowed up to max_delta_depth, so that
+# rebuilding a snapshot never takes more than max_delta_depth steps.
+max_delta_fraction = 0.5
+max_delta_depth = 16
+
+# The decoded list column that the log store keeps for each error column
+decoded_error_columns = { 'error': 'raw_errors', 'error_message': 'error_messages' }
+
+def get_partition_folder(partition):
+    return f'{store_folder}partition={partition}/'
+
+def get_students_file():
+    return f'{store_folder}students.csv'
+
+def get_quarantine_file():
+    return f'{store_folder}quarantine.csv'
+
+def get_code_blobs_folder():
+    return f'{store_folder}code_blobs/'
+
+def get_code_blobs_file(partition):
+    return f'{get_code_blobs_folder()}part-{partition}.parquet'
+
+def store_exists():
+    return os.path.exists(get_students_file())
+
+# Return the students.csv of the log store, indexed by user id
+@functools.lru_cache(maxsize=1)
+def load_students_version(path, mtime_ns):
+    return pd.read_csv(path, dtype={ 'user_id': str }).set_index('user_id', drop=False)
+
+def load_students():
+    return load_students_version(get_students_file(), os.stat(get_students_file()).st_mtime_ns)
+
+# Return the partition that a student's logs are stored in
+def get_partition(user_id):
+    return int(load_students().loc[user_id, 'partition'])
+
+# Return a dict of user id to the modification time and size of their log file in logs_folder
+def get_log_file_stats():
+    if not os.path.isdir(logs_folder):
+        return {}
+    stats = {}
+    for entry in os.scandir(logs_folder):
+        if entry.name.endswith(('.csv', '.parquet')):
+            stat = entry.stat()
+            stats[entry.name.split('.')[0]] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+# Return a dict of user id to the modification time and size of their log file, for every student that the
+# scripts read. Taken from students.csv when the logs are read from a log store without student_logs/.
+def get_student_log_stats():
+    if use_store() and not os.path.isdir(logs_folder):
+        students = load_students()
+        return dict(zip(students['user_id'], zip(students['source_mtime_ns'].tolist(), students['source_size'].tolist())))
+    return get_log_file_stats()
+
+# Return the path of a student's log file in logs_folder
+def get_log_file_path(user_id):
+    if os.path.exists(f'{logs_folder}{user_id}.parquet'):
+        return f'{logs_folder}{user_id}.parquet'
+    return f'{logs_folder}{user_id}.csv'
+
+# Whether the log store was built from the log files as they are now. A store without student_logs/ next to
+# it is always up to date. Checked once per version of students.csv and of the student_logs/ folder.
+@functools.lru_cache(maxsize=None)
+def store_is_fresh_version(students_file, students_mtime_ns, logs_folder_path, logs_folder_mtime_ns):
+    log_file_stats = get_log_file_stats()
+    if len(log_file_stats) == 0:
+        return True
+
+    students = load_students()
+    if 'source_mtime_ns' not in students.columns:
+        store_stats = None # a store written before the log file times were recorded
+    else:
+        store_stats = dict(zip(students['user_id'], zip(students['source_mtime_ns'], students['source_size'])))
+    if store_stats == log_file_stats:
+        return True
+
+    print(f'{store_folder} is out of date with {logs_folder}, so the logs are read from {logs_folder} (rerun log_store.py to update it)')
+    return False
+
+# Whether to read the logs from the log store, which is when it exists and is up to date with the log files
+def use_store():
+    if not store_exists():
+        return False
+    logs_folder_mtime_ns = os.stat(logs_folder).st_mtime_ns if os.path.isdir(logs_folder) else None
+    return store_is_fresh_version(get_students_file(), os.stat(get_students_file()).st_mtime_ns, logs_folder, logs_folder_mtime_ns)
+
+# Read a student's log file the way all of the scripts originally read them.
+# If columns is given, only those columns are parsed.
+def read_student_log_csv(user_id, columns=None):
+    usecols = None if columns is None else lambda column: column in columns
+    return pd.read_csv(f'{logs_folder}{user_id}.csv', dtype=str, lineterminator='\n', usecols=usecols)
+
+# Return the user ids of every log file in logs_folder, sorted, which is the order that the log store has them in
+def get_log_file_user_ids():
+    return sorted(filename.split('.')[0] for filename in os.listdir(logs_folder) if filename.endswith(('.csv', '.parquet')))
+
+# Read a zstd compressed parquet log file written by download_logs_per_student.py. Every column holds strings,
+# like read_student_log_csv, and empty strings are missing values, as they are in a csv file.
+# If columns is given, only those of them that the file has are decompressed.
+def read_student_log_parquet(user_id, columns=None):
+    file_name = f'{logs_folder}{user_id}.parquet'
+    if columns is not None:
+        columns = [name for name in pq.read_schema(file_name).names if name in columns]
+    df = pq.read_table(file_name, columns=columns).to_pandas()
+    return df.mask(df == '')
+
+# Read a student's log file from logs_folder, whether it is a parquet file or a csv file.
+# csv files straight from download_logs_per_student.py end their lines with \r\n, so set downloaded
+# to read them with pandas' default line terminator (as add_error_message_type always has).
+# If columns is given, only those columns are read. Log files have no code_hash column, so if it is one of
+# the columns it is computed from the code, as in the log store.
+def read_student_log_file(user_id, downloaded=False, columns=None):
+    if columns is not None and 'code_hash' in columns:
+        df = read_student_log_file(user_id, downloaded, [column for column in columns if column != 'code_hash'] + ['code'])
+        df['code_hash'] = [get_code_hash(code) if isinstance(code, str) else None for code in df['code']]
+        return df if 'code' in columns else df.drop(columns=['code'])
+
+    if os.path.exists(f'{logs_folder}{user_id}.parquet'):
+        return read_student_log_parquet(user_id, columns)
+    if downloaded:
+        return pd.read_csv(f'{logs_folder}{user_id}.csv', dtype=str)
+    return read_student_log_csv(user_id, columns)
+
+# Write a student's log file back to logs_folder, in the same format that it was read from.
+# The file is written to a temporary file first, so that it is never left half written.
+def write_student_log_file(user_id, df):
+    if os.path.exists(f'{logs_folder}{user_id}.parquet'):
+        file_name = f'{logs_folder}{user_id}.parquet'
+        table = pa.Table.from_pandas(df.astype(str).where(df.notna(), None), preserve_index=False)
+        pq.write_table(table, file_name + '.tmp', compression='zstd')
+    else:
+        file_name = f'{logs_folder}{user_id}.csv'
+        df.to_csv(file_name + '.tmp', index=False)
+    os.replace(file_name + '.tmp', file_name)
+
+def parse_timestamps(timestamps):
+    return pd.to_datetime(timestamps, format='mixed', utc=True, errors='coerce')
+
+# Return the rows of a log dataframe whose timestamp could not be parsed, as (row, reason) pairs
+def get_malformed_timestamp_rows(df):
+    malformed_rows = []
+    for column in timestamp_columns:
+        if column in df.columns:
+            malformed = df[column].notna() & parse_timestamps(df[column]).isna()
+            malformed_rows.extend((row, f'malformed {column}') for row in malformed.to_numpy().nonzero()[0].tolist())
+    return sorted(malformed_rows)
+
+# Give the columns of a log dataframe their stored types. Timestamps that cannot be parsed become missing
+# values, so convert_logs_to_store lists them in quarantine.csv first (see get_malformed_timestamp_rows).
+def type_log_columns(df):
+    for column in timestamp_columns:
+        if column in df.columns:
+            df[column] = parse_timestamps(df[column])
+
+    for column in categorical_columns:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    return df
+
+# Parquet returns categories in the order they were first seen. Sort them, so that sorting a
+# dataframe by a categorical column (e.g. projectId) gives the same order as sorting the strings.
+def sort_categories(df):
+    for column in categorical_columns:
+        if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].cat.set_categories(sorted(df[column].cat.categories))
+    return df
+
+def get_code_hash(code):
+    return hashlib.blake2b(code.encode('utf-8'), digest_size=16).hexdigest()
+
+# Return the length of the prefix and the suffix that code shares with base, and the text between them
+def get_code_delta(base, code):
+    prefix_length = len(os.path.commonprefix([base, code]))
+    max_suffix_length = min(len(base), len(code)) - prefix_length
+    suffix_length = len(os.path.commonprefix([base[::-1][:max_suffix_length], code[::-1][:max_suffix_length]]))
+    return prefix_length, suffix_length, code[prefix_length:len(code) - suffix_length]
+
+def apply_code_delta(base, prefix_length, suffix_length, text):
+    return base[:prefix_length] + text + base[len(base) - suffix_length:]
+
+# The code_blobs table of the log store. Each distinct code snapshot of a partition is added once, either as
+# its full text (base_hash is None), or, if deltas is set, as a delta against the previous snapshot of the same
+# project. Blobs are written out once per partition, to code_blobs/part-{partition}.parquet, and a snapshot
+# that is in several partitions is stored in each of them.
+class CodeBlobWriter:
+    def __init__(self, deltas=False):
+        self.deltas = deltas
+        self.depths = {} # the number of deltas it takes to rebuild each snapshot stored in this partition
+        self.num_blobs = 0
+        self.blobs = { 'hash': [], 'base_hash': [], 'prefix_length': [], 'suffix_length': [], 'text': [] }
+
+    # Add the code snapshots of one student, and return the code_hash column
+    def add_student(self, df):
+        code_hashes = []
+        previous_code = {}
+        for code, project_id in zip(df['code'], df['projectId']):
+            if not isinstance(code, str):
+                code_hashes.append(None)
+                continue
+
+            code_hash = get_code_hash(code)
+            if code_hash not in self.depths:
+                self.add_blob(code_hash, code, previous_code.get(project_id))
+            code_hashes.append(code_hash)
+            previous_code[project_id] = (code_hash, code)
+        return code_hashes
+
+    def add_blob(self, code_hash, code, previous):
+        base_hash, prefix_length, suffix_length, text, depth = None, 0, 0, code, 0
+        if self.deltas and previous is not None and self.depths[previous[0]] < max_delta_depth:
+            delta = get_code_delta(previous[1], code)
+            if len(delta[2]) < len(code) * max_delta_fraction:
+                base_hash, depth = previous[0], self.depths[previous[0]] + 1
+                prefix_length, suffix_length, text = delta
+
+        self.depths[code_hash] = depth
+        self.num_blobs += 1
+        for column, value in zip(self.blobs, [code_hash, base_hash, prefix_length, suffix_length, text]):
+            self.blobs[column].append(value)
+
+    def write(self, partition):
+        os.makedirs(get_code_blobs_folder(), exist_ok=True)
+        schema = pa.schema([('hash', pa.string()), ('base_hash', pa.string()), ('prefix_length', pa.int32()), ('suffix_length', pa.int32()), ('text', pa.string())])
+        pq.write_table(pa.Table.from_pydict(self.blobs, schema=schema), get_code_blobs_file(partition), compression='zstd')
+        self.blobs = { column: [] for column in self.blobs }
+        self.depths = {}
+
+# Return a dict of code hash to code for the given hashes of one partition, rebuilding the snapshots that were
+# stored as deltas. Only the partition's blob file is read. If blob_files_read is given, every blob file that
+# is read is appended to it (see check_code_blob_reads).
+def read_code_snapshots(code_hashes, partition, blob_files_read=None):
+    blobs = {}
+    missing = { code_hash for code_hash in code_hashes if isinstance(code_hash, str) }
+    # Each round reads the bases of the deltas read in the round before
+    while len(missing) > 0:
+        blob_file = get_code_blobs_file(partition)
+        if blob_files_read is not None:
+            blob_files_read.append(blob_file)
+        table = pq.read_table(blob_file, filters=[('hash', 'in', list(missing))])
+        for blob in table.to_pylist():
+            blobs[blob['hash']] = blob
+        missing = { blob['base_hash'] for blob in blobs.values() if blob['base_hash'] is not None and blob['base_hash'] not in blobs }
+
+    snapshots = {}
+    def get_snapshot(code_hash):
+        if code_hash not in snapshots:
+            blob = blobs[code_hash]
+            if blob['base_hash'] is None:
+                snapshots[code_hash] = blob['text']
+            else:
+                snapshots[code_hash] = apply_code_delta(get_snapshot(blob['base_hash']), blob['prefix_length'], blob['suffix_length'], blob['text'])
+        return snapshots[code_hash]
+
+    return { code_hash: get_snapshot(code_hash) for code_hash in code_hashes if isinstance(code_hash, str) }
+
+# Return a boolean mask of the rows whose code is different from the previous row of the same project
+# (the first row of each project counts as changed). Read the logs with the projectId and code_hash columns.
+def get_code_changed_mask(df):
+    previous_code_hash = df.groupby('projectId', sort=False, observed=True, dropna=False)['code_hash'].shift()
+    return (df['code_hash'] != previous_code_hash).to_numpy()
+
+# Convert every log file in logs_folder into the log store. With code_deltas, code snapshots are stored
+# as deltas against the previous snapshot of the same project where that is smaller.
+def convert_logs_to_store(code_deltas=False):
+    # Split the students, in user id order, into partitions of consecutive students
+    user_ids = get_log_file_user_ids()
+    log_file_stats = get_log_file_stats()
+    partitions = {}
+    for index, user_id in enumerate(user_ids):
+        partitions.setdefault(index * num_partitions // len(user_ids), []).append(user_id)
+
+    students = { 'user_id': [], 'partition': [], 'num_rows': [], 'source_mtime_ns': [], 'source_size': [] }
+    quarantine = { 'user_id': [], 'row': [], 'ogTimestamp': [], 'assnId': [], 'reason': [] }
+    code_blobs = CodeBlobWriter(code_deltas)
+
+    # Write one partition at a time, so that only a fraction of the logs are in memory at once
+    for partition in sorted(partitions):
+        dfs = []
+        for user_id in partitions[partition]:
+            df = read_student_log_file(user_id)
+            df.insert(0, 'user_id', user_id)
+
+            # Decode the error lists, and record the rows that could not be decoded or whose timestamps could not be parsed
+            df['raw_errors'], df['error_messages'], malformed_rows = decode_error_columns(df)
+            for row, reason in malformed_rows + get_malformed_timestamp_rows(df):
+                quarantine['user_id'].append(user_id)
+                quarantine['row'].append(row)
+                quarantine['ogTimestamp'].append(df['ogTimestamp'].iloc[row])
+                quarantine['assnId'].append(df['assnId'].iloc[row])
+                quarantine['reason'].append(reason)
+
+            # Keep only the hash of each code snapshot
+            df['code'] = code_blobs.add_student(df)
+            df = df.rename(columns={ 'code': 'code_hash' })
+
+            dfs.append(df)
+
+            students['user_id'].append(user_id)
+            students['partition'].append(partition)
+            students['num_rows'].append(len(df))
+            students['source_mtime_ns'].append(log_file_stats[user_id][0])
+            students['source_size'].append(log_file_stats[user_id][1])
+
+        partition_df = type_log_columns(pd.concat(dfs, ignore_index=True))
+        table = pa.Table.from_pandas(partition_df, preserve_index=False)
+
+        os.makedirs(get_partition_folder(partition), exist_ok=True)
+        pq.write_table(table, f'{get_partition_folder(partition)}part-0.parquet', compression='zstd')
+        code_blobs.write(partition)
+
+    pd.DataFrame(quarantine).to_csv(get_quarantine_file(), index=False)
+
+    # Write the list of students last, so that a half written store is never used
+    pd.DataFrame(students).to_csv(get_students_file(), index=False)
+
+    print(f"Wrote {sum(students['num_rows'])} rows for {len(students['user_id'])} students to {store_folder}")
+    print(f"{len(quarantine['row'])} rows could not be decoded or have malformed timestamps, see {get_quarantine_file()}")
+    print(f"Stored {code_blobs.num_blobs} code snapshots (distinct within each partition) in {get_code_blobs_folder()}")
+
+# Return the columns to read from the log store for the given log columns. Error columns are read as their
+# decoded list column instead, since that is what get_raw_errors uses, and code is read as code_hash (see
+# add_code_column). Returns None (every column) if columns is None.
+def get_store_columns(columns):
+    if columns is None:
+        return None
+    store_columns = ['user_id']
+    for column in columns:
+        column = decoded_error_columns.get(column, 'code_hash' if column == 'code' else column)
+        if column not in store_columns:
+            store_columns.append(column)
+    return store_columns
+
+# Read one partition of the log store, or only some of its columns. The code column is read as code_hash.
+def read_partition(partition, columns=None):
+    table = pq.read_table(f'{get_partition_folder(partition)}part-0.parquet', columns=get_store_columns(columns))
+    return sort_categories(table.to_pandas())
+
+# Whether the code column should be rebuilt from the code blobs, when reading the given columns
+def reads_code(columns):
+    return columns is None or 'code' in columns
+
+# Replace the code_hash column of a dataframe read from one partition of the log store with the code column,
+# unless code_hash was asked for as well
+def add_code_column(df, partition, columns=None, blob_files_read=None):
+    if 'code_hash' not in df.columns:
+        return df
+    snapshots = read_code_snapshots(df['code_hash'].unique(), partition, blob_files_read)
+    code = df['code_hash'].map(snapshots)
+    if columns is not None and 'code_hash' in columns:
+        df['code'] = code
+        return df
+    df['code_hash'] = code
+    return df.rename(columns={ 'code_hash': 'code' })
+
+# Read one student's logs. Uses the log store if it exists, and the student's log file otherwise.
+# If columns is given, only those columns are read. If blob_files_read is given, the code blob files that are
+# read from the log store are appended to it.
+def read_student_log(user_id, columns=None, blob_files_read=None):
+    if not use_store():
+        return read_student_log_file(user_id, columns=columns)
+
+    partition = get_partition(user_id)
+    table = pq.read_table(f'{get_partition_folder(partition)}part-0.parquet', columns=get_store_columns(columns), filters=[('user_id', '==', user_id)])
+    df = sort_categories(table.drop(['user_id']).to_pandas())
+    return add_code_column(df, partition, columns, blob_files_read) if reads_code(columns) else df
+
+# Yield (user_id, df) for every student's logs, or only for the given students.
+# Uses the log store if it exists and is up to date, and the log files otherwise. Either way the students
+# are visited in user id order, unless user_ids is given.
+# If columns is given, only those columns are read (e.g. run_columns).
+def iter_student_logs(user_ids=None, columns=None):
+    if not use_store():
+        if user_ids is None:
+            user_ids = get_log_file_user_ids()
+        for user_id in user_ids:
+            yield user_id, read_student_log_file(user_id, columns=columns)
+        return
+
+    students = load_students()
+    if user_ids is not None:
+        students = students.loc[list(user_ids)]
+
+    for partition, partition_students in students.groupby('partition', sort=False):
+        partition_df = read_partition(partition, columns)
+        if reads_code(columns):
+            partition_df = add_code_column(partition_df, partition, columns)
+        student_dfs = dict(iter(partition_df.groupby('user_id', sort=False, observed=True)))
+        empty_df = partition_df.iloc[0:0]
+
+        for user_id in partition_students['user_id']:
+            df = student_dfs.get(user_id, empty_df)
+            yield user_id, df.drop(columns=['user_id']).reset_index(drop=True)
+
+# Split the students into shards of user ids that can be read independently. Reading the shards
+# in order visits the students in the same order as iter_student_logs. With the log store there is
+# one shard per partition, so that each worker reads each partition file once.
+def get_student_log_shards():
+    if not use_store():
+        user_ids = get_log_file_user_ids()
+        return [user_ids[i:i + csv_shard_size] for i in range(0, len(user_ids), csv_shard_size)]
+
+    students = load_students()
+    return [list(partition_students['user_id']) for _, partition_students in students.groupby('partition', sort=True)]
+
+# Call parse_shard(user_ids) on every shard of students (or on the given shards), using a pool of worker
+# processes if workers > 1. The results are returned in shard order no matter how many workers there are,
+# so that merging them in order gives the same result as a sequential run.
+def map_student_log_shards(parse_shard, workers=1, shards=None):
+    if shards is None:
+        shards = get_student_log_shards()
+    if workers <= 1:
+        return [parse_shard(shard) for shard in shards]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(parse_shard, shards))
+
+# Return the code column of a dataframe as a list, with missing code as None
+def get_code_list(df):
+    return [code if isinstance(code, str) else None for code in df['code']]
+
+# Check that reading a student's code from the log store only reads the blob file of their partition, and gives
+# the same code as their log file (if student_logs/ is still there). Returns a list of (user_id, problem).
+def check_code_blob_reads(user_ids=None):
+    if not use_store():
+        return [(None, f'there is no up to date log store in {store_folder}')]
+    if user_ids is None:
+        user_ids = list(load_students()['user_id'])
+
+    problems = []
+    for user_id in user_ids:
+        blob_files_read = []
+        code = get_code_list(read_student_log(user_id, ['code'], blob_files_read))
+
+        expected_blob_files = [get_code_blobs_file(get_partition(user_id))] if any(code) else []
+        if sorted(set(blob_files_read)) != expected_blob_files:
+            problems.append((user_id, f'read the blob files {sorted(set(blob_files_read))}, not {expected_blob_files}'))
+        if os.path.isdir(logs_folder) and code != get_code_list(read_student_log_file(user_id, columns=['code'])):
+            problems.append((user_id, 'the code is different from the code in their log file'))
+
+    return problems
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--code-deltas', action='store_true', help='store code snapshots as deltas against the previous snapshot of the same project, where that is smaller')
+    parser.add_argument('--check', action='store_true', help='instead of converting the logs, check that reading each student\'s code from the store reads only one blob file, and matches their log file')
+    args = parser.parse_args()
+
+    if args.check:
+        problems = check_code_blob_reads()
+        for user_id, problem in problems[:10]:
+            print(f'{user_id}: {problem}')
+        print(f'{len(problems)} problems')
+        if len(problems) > 0:
+            raise SystemExit(1)
+    else:
+        convert_logs_to_store(args.code_deltas)
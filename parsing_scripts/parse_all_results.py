@@ -0,0 +1,157 @@
+import argparse
+import pandas as pd
+import numpy as np
+from error_message_types import get_error_message_type_for_df
+from clean_error_message import load_normalization_cache, save_normalization_cache
+from error_runs import encode_student_runs, count_same_subsequent_error, get_resolved_error_runs, get_runs_until_resolved_from_runs
+from log_store import iter_student_logs, run_columns
+from parse_long_term_results import get_weeks, write_data_on_long_term
+from parse_short_term_results import write_data_on_short_term
+from count_users_and_errors import make_latex_table
+
+# Computes every metric in one pass over the student logs. parse_short_term_results, parse_long_term_results,
+# count_users_and_errors and add_avg_error_run_length each scan all of the logs on their own, while this
+# reads each student's log once, normalizes each error once, and writes all of their outputs.
+
+sl_and_student_data_file = '../data_files/sl_and_student_data.csv'
+
+# Return every per-student metric, reading and normalizing each of the student's runs once.
+# This combines get_count_same_subsequent_error, get_runs_until_resolved, percent_errors_over_time_for_user,
+# length_error_runs_over_time_for_user and count_num_errors_made_of_type.
+def get_metrics_for_user(df):
+    df = df.reset_index(drop=True)
+    runs = encode_student_runs(df)
+    weeks = get_weeks(df['ogTimestamp'])
+
+    # Count the runs and errors per week, as in percent_errors_over_time_for_user
+    errors_per_week = { 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 7: 0, None: 0 }
+    runs_per_week = { 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 7: 0, None: 0 }
+    has_errors = np.diff(runs.error_offsets) > 0
+    for week, valid, has_error in zip(weeks, runs.valid, has_errors):
+        if valid:
+            runs_per_week[week] += 1
+            if has_error:
+                errors_per_week[week] += 1
+
+    percent_errors_per_week = {}
+    for week in range(1, 8):
+        if runs_per_week[week] > 0:
+            percent_errors_per_week[week] = errors_per_week[week] / runs_per_week[week]
+
+    # The short and long term results follow the runs sorted by project id and then by timestamp
+    sorted_order = df.sort_values(by=['projectId', 'ogTimestamp']).index.to_numpy()
+    sorted_runs = runs.take(sorted_order)
+    same_error_count, total_error_count = count_same_subsequent_error(sorted_runs)
+    lengths, start_rows = get_resolved_error_runs(sorted_runs)
+
+    run_counts_per_week = { 1: [], 2: [], 3: [], 4: [], 5: [], 6: [], 7: [], None: [] }
+    for length, start_row in zip(lengths.tolist(), sorted_order[start_rows]):
+        run_counts_per_week[weeks[start_row]].append(length)
+
+    # add_avg_error_run_length follows the runs in the order they appear in the log file
+    unsorted_run_counts = get_runs_until_resolved_from_runs(runs)
+
+    return {
+        'same_error_count': same_error_count,
+        'total_error_count': total_error_count,
+        'run_counts': lengths.tolist(),
+        'percent_errors_per_week': percent_errors_per_week,
+        'run_counts_per_week': run_counts_per_week,
+        'unsorted_run_counts': unsorted_run_counts,
+    }
+
+def parse_data_on_all_metrics():
+    # Short term results, as in parse_short_term_results
+    percent_same_subsequent_error = { 'default': [], 'explain': [], 'messageboard': [], 'tigerpython': [], 'superhero': [], 'gpt': [] }
+    average_runs_until_resolved = { 'default': [], 'explain': [], 'messageboard': [], 'tigerpython': [], 'superhero': [], 'gpt': [] }
+    count_same_subequent_error = { 'default': 0, 'explain': 0, 'messageboard': 0, 'tigerpython': 0, 'superhero': 0, 'gpt': 0 }
+    count_total_errors = { 'default': 0, 'explain': 0, 'messageboard': 0, 'tigerpython': 0, 'superhero': 0, 'gpt': 0 }
+    runs_until_resolved_counts = { 'default': [], 'explain': [], 'messageboard': [], 'tigerpython': [], 'superhero': [], 'gpt': [] }
+
+    # Long term results, as in parse_long_term_results
+    percent_errors_over_time = { error_message_type: { week: [] for week in range(1, 8) } for error_message_type in count_total_errors }
+    length_error_runs_over_time = { error_message_type: { week: [] for week in range(0, 8) } for error_message_type in count_total_errors }
+
+    # Counts of users, as in count_users_and_errors. The counts of errors are count_total_errors.
+    user_counts = { 'default': 0, 'explain': 0, 'messageboard': 0, 'tigerpython': 0, 'superhero': 0, 'gpt': 0 }
+    num_no_error_message_type = 0
+    num_more_than_one_error_message_type = 0
+
+    # The average error run length of every student, as in add_avg_error_run_length
+    avg_error_run_lengths = {}
+
+    for user_id, df in iter_student_logs(columns=run_columns):
+        error_message_types = get_error_message_type_for_df(df)
+        if len(error_message_types) == 0:
+            num_no_error_message_type += 1
+        if len(error_message_types) > 1:
+            num_more_than_one_error_message_type += 1
+
+        metrics = get_metrics_for_user(df)
+
+        unsorted_run_counts = metrics['unsorted_run_counts']
+        avg_error_run_lengths[user_id] = np.mean(unsorted_run_counts) if len(unsorted_run_counts) > 0 else None
+
+        # The remaining results only count students that used exactly one error message type
+        if len(error_message_types) != 1:
+            continue
+        error_message_type = error_message_types[0]
+
+        user_counts[error_message_type] += 1
+
+        run_counts = metrics['run_counts']
+        same_error_count = metrics['same_error_count']
+        total_error_count = metrics['total_error_count']
+        if total_error_count > 0:
+            percent_same_subsequent_error[error_message_type].append(same_error_count/total_error_count)
+        if len(run_counts) > 0:
+            average_runs_until_resolved[error_message_type].append(np.mean(run_counts))
+        count_same_subequent_error[error_message_type] += same_error_count
+        count_total_errors[error_message_type] += total_error_count
+        runs_until_resolved_counts[error_message_type].extend(run_counts)
+
+        for week, percent_errors in metrics['percent_errors_per_week'].items():
+            percent_errors_over_time[error_message_type][week].append(percent_errors)
+        for week in range(1, 8):
+            if len(metrics['run_counts_per_week'][week]) > 0:
+                length_error_runs_over_time[error_message_type][week].append(np.mean(metrics['run_counts_per_week'][week]))
+
+    print(f"Number of students with no error message type: {num_no_error_message_type}")
+    print(f"Number of students with more than one error message type: {num_more_than_one_error_message_type}")
+
+    short_term_results = (percent_same_subsequent_error, average_runs_until_resolved, count_same_subequent_error, count_total_errors, runs_until_resolved_counts)
+    long_term_results = (percent_errors_over_time, length_error_runs_over_time)
+    return short_term_results, long_term_results, user_counts, avg_error_run_lengths
+
+# Write the avg_error_run_length column of sl_and_student_data.csv
+def write_avg_error_run_lengths(avg_error_run_lengths):
+    sl_and_student_data = pd.read_csv(sl_and_student_data_file)
+
+    students_only = sl_and_student_data['role'] == 'student'
+    sl_and_student_data['avg_error_run_length'] = None
+    sl_and_student_data.loc[students_only, 'avg_error_run_length'] = sl_and_student_data.loc[students_only, 'user_id'].map(avg_error_run_lengths)
+
+    sl_and_student_data.to_csv(sl_and_student_data_file, index=False)
+
+def parse_and_write_all_results():
+    short_term_results, long_term_results, user_counts, avg_error_run_lengths = parse_data_on_all_metrics()
+
+    write_data_on_short_term(*short_term_results)
+    write_data_on_long_term(*long_term_results)
+    write_avg_error_run_lengths(avg_error_run_lengths)
+
+    # The error counts of table 1 are the same as the total error counts of the short term results
+    make_latex_table(user_counts, short_term_results[3])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--normalization-cache', action='store_true', help='reuse the normalized errors saved by previous runs, and save the new ones')
+    args = parser.parse_args()
+
+    if args.normalization_cache:
+        load_normalization_cache()
+
+    parse_and_write_all_results()
+
+    if args.normalization_cache:
+        save_normalization_cache()
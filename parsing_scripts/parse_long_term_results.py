@@ -1,42 +1,31 @@
 import json
-import pandas as pd
-import os
-import ast
+import argparse
 import numpy as np
-from clean_error_message import normalize_error_message
+from clean_error_message import load_normalization_cache, save_normalization_cache
 from error_message_types import get_error_message_type_for_df, get_raw_errors, valid_error_message_type
-from karel_info import not_karel
+from karel_info import assignment_registry
+from log_store import iter_student_logs, map_student_log_shards, run_columns
+from course_calendar import CourseCalendar
+from incremental_state import parse_students_incrementally
+from results_store import write_results
+from error_runs import encode_student_runs, get_resolved_error_runs
 
-logs_folder = '../data_files/student_logs/'
 output_folder = '../data_files/long_term_data/'
 
+# The log columns that the long term results read
+long_term_columns = run_columns
+
+# The weeks of the course. Week 1 is everything before April 30th, 2023 12:00 AM, and week 7 ends on
+# June 8th, 2023 12:00 AM (see course_calendar.json). Timestamps after the course are in week None.
+course_calendar = CourseCalendar.from_config('cip3')
+
 # Get the week of the given timestamp
 def get_week(timestamp):
-    ts = pd.to_datetime(timestamp, format='mixed')
-    # Compare timestamps as pd.
-    # week1 if timestamp is before April 30th, 2023 12:00 AM
-    if ts < pd.Timestamp('2023-04-30 00:00:00', tz='America/Los_Angeles'):
-        return 1
-    # week2 if timestamp is before May 7th, 2023 12:00 AM
-    elif ts < pd.Timestamp('2023-05-07 00:00:00', tz='America/Los_Angeles'):
-        return 2
-    # week3 if timestamp is before May 14th, 2023 12:00 AM
-    elif ts < pd.Timestamp('2023-05-14 00:00:00', tz='America/Los_Angeles'):
-        return 3
-    # week4 if timestamp is before May 21st, 2023 12:00 AM
-    elif ts < pd.Timestamp('2023-05-21 00:00:00', tz='America/Los_Angeles'):
-        return 4
-    # week5 if timestamp is before May 28th, 2023 12:00 AM
-    elif ts < pd.Timestamp('2023-05-28 00:00:00', tz='America/Los_Angeles'):
-        return 5
-    # week6 if timestamp is before June 4th, 2023 12:00 AM
-    elif ts < pd.Timestamp('2023-06-04 00:00:00', tz='America/Los_Angeles'):
-        return 6
-    # week7 if timestamp is before June 8th, 2023 12:00 AM
-    elif ts < pd.Timestamp('2023-06-08 00:00:00', tz='America/Los_Angeles'):
-        return 7
-    else:
-        return None
+    return course_calendar.get_period(timestamp)
+
+# Get the week of every timestamp in the column at once
+def get_weeks(timestamps):
+    return course_calendar.assign_periods(timestamps)
 
 # Return a dictionary of the percent of runs that are errors each week for this user
 def percent_errors_over_time_for_user(df):
@@ -44,10 +33,10 @@ def percent_errors_over_time_for_user(df):
     runs_per_week = { 1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 7: 0, None: 0 }
 
     # Count the runs and errors per week
-    for index, row in df.iterrows():
-        if not_karel(row):
-            week = get_week(row['ogTimestamp'])
-
+    weeks = get_weeks(df['ogTimestamp'])
+    not_karel_mask = assignment_registry.get_not_karel_mask(df)
+    for week, is_not_karel, row in zip(weeks, not_karel_mask, df.to_dict('records')):
+        if is_not_karel:
             runs_per_week[week] += 1
 
             error_messages = get_raw_errors(row)
@@ -70,57 +59,18 @@ def length_error_runs_over_time_for_user(df):
     # For each week, store the lengths of all error runs
     run_counts = { 1: [], 2: [], 3: [], 4: [], 5: [], 6: [], 7: [], None: [] }
 
-    # Keep track of the current error run lengths that we are tracking
-    prev_error_counts = {}
-
-    # Keep track of the week that each error run started
-    prev_error_counts_track_week = {}
-
-    # Keep track of the current project id
-    prev_project_id = None
-
-    # Loop through the runs in chronological order
-    for i, row in df.iterrows():
-        if not_karel(row):
-            # If this is a new project, reset prev_error_counts.
-            # We do not save the prev run counts because they were not resolved.
-            if row['projectId'] != prev_project_id:
-                prev_error_counts = {}
-                prev_error_counts_track_week = {}
-
-            # Construct the current error counts
-            curr_error_counts = {}
-            curr_error_counts_track_week = {}
-            raw_errors = get_raw_errors(row)
-            for raw_error in raw_errors:
-                assert(row['error_message_type'] in ['default', 'gpt', 'superhero', 'messageboard', 'explain', 'tigerpython'])
-                normalized_error = normalize_error_message(raw_error)
-                curr_error_counts[normalized_error] = prev_error_counts.get(normalized_error, 0) + 1
-                curr_error_counts_track_week[normalized_error] = prev_error_counts_track_week.get(
-                    normalized_error, get_week(row['ogTimestamp']))
-
-            # Update run_counts with any errors that were not in this row
-            for error in prev_error_counts:
-                # If the error was not in this row, that run has ended, so add the length to the run counts
-                if error not in curr_error_counts:
-                    week_of_run = prev_error_counts_track_week[error]
-                    length_of_run = prev_error_counts[error]
-                    run_counts[week_of_run].append(length_of_run)
-
-            # Update the loop variables
-            prev_project_id = row['projectId']
-            prev_error_counts = curr_error_counts
-            prev_error_counts_track_week = curr_error_counts_track_week
-        
-        else:
-            # Update the loop variables
-            prev_project_id = row['projectId']
-            prev_error_counts = {}
-            prev_error_counts_track_week = {}
+    # Find every resolved error run, and the row that it started on
+    lengths, start_rows = get_resolved_error_runs(encode_student_runs(df))
+
+    # Each run counts towards the week that it started
+    weeks = get_weeks(df['ogTimestamp'])
+    for length, start_row in zip(lengths.tolist(), start_rows):
+        run_counts[weeks[start_row]].append(length)
 
     return run_counts
 
-def parse_data_on_long_term():
+# Return empty long term results, that students are added to with add_student_to_long_term_results
+def new_long_term_results():
     # Get the percent of runs that are errors each week for each student for each error message type
     percent_errors_over_time = { 
         'default': { 1: [], 2: [], 3: [], 4: [], 5: [], 6: [], 7: [] }, 
@@ -139,40 +89,85 @@ def parse_data_on_long_term():
         'superhero': { 0: [], 1: [], 2: [], 3: [], 4: [], 5: [], 6: [], 7: [] },
         'gpt': { 0: [], 1: [], 2: [], 3: [], 4: [], 5: [], 6: [], 7: [] } }
 
-    for filename in os.listdir(logs_folder):
+    return percent_errors_over_time, length_error_runs_over_time
 
-        # Init and clean the dataframe
-        df = pd.read_csv(logs_folder + filename, dtype=str, lineterminator='\n')
+# Return the long term results of one student, or None if they did not use exactly one error message type.
+# Weeks are stored as [week, value] pairs, so that the results can be saved as json.
+def parse_student_on_long_term(df):
+    # Get the error message type for this dataframe
+    error_message_types = get_error_message_type_for_df(df)
+    if len(error_message_types) != 1:
+        return None
 
-        # Get the error message type for this dataframe
-        error_message_types = get_error_message_type_for_df(df)
-        if len(error_message_types) != 1:
+    # Get the percent of runs that are errors each week for this user
+    errors_over_time_for_user = percent_errors_over_time_for_user(df)
+
+    # Get the length error runs over time for this user
+    runs_over_time_for_user = length_error_runs_over_time_for_user(df)
+
+    return {
+        'error_message_type': error_message_types[0],
+        'percent_errors_per_week': [[week, errors_over_time_for_user[week]] for week in errors_over_time_for_user],
+        'length_error_runs_per_week': [[week, runs_over_time_for_user[week]] for week in range(1, 8)],
+    }
+
+# Add the long term results of one student to the results
+def add_student_to_long_term_results(results, student_results):
+    if student_results is None:
+        return
+
+    percent_errors_over_time, length_error_runs_over_time = results
+    error_message_type = student_results['error_message_type']
+
+    # Update the percent errors over time for this error message type
+    for week, percent_errors in student_results['percent_errors_per_week']:
+        percent_errors_over_time[error_message_type][week].append(percent_errors)
+
+    # Update the length error runs over time for this error message type
+    for week, run_lengths in student_results['length_error_runs_per_week']:
+        if len(run_lengths) > 0:
+            # If the student had any error runs this week, add the average length of the runs to the list
+            length_error_runs_over_time[error_message_type][week].append(np.mean(run_lengths))
+
+# Return the long term results of the given students. These are partial results, that
+# merge_long_term_results combines with the results of the other students.
+def parse_shard_on_long_term(user_ids):
+    results = new_long_term_results()
+    for user_id, df in iter_student_logs(user_ids, long_term_columns):
+        add_student_to_long_term_results(results, parse_student_on_long_term(df))
+    return results
+
+# Combine partial long term results, in order. The per-week lists are concatenated,
+# so merging the results of each shard in shard order gives exactly the sequential results.
+def merge_long_term_results(partial_results):
+    percent_errors_over_time = None
+    length_error_runs_over_time = None
+    for partial_percent_errors, partial_length_error_runs in partial_results:
+        if percent_errors_over_time is None:
+            percent_errors_over_time = partial_percent_errors
+            length_error_runs_over_time = partial_length_error_runs
             continue
-        error_message_type = error_message_types[0]
 
-        # Get the percent of runs that are errors each week for this user
-        errors_over_time_for_user = percent_errors_over_time_for_user(df)
-
-        # Update the percent errors over time for this error message type
-        for week in errors_over_time_for_user:
-            percent_errors_over_time[error_message_type][week].append(errors_over_time_for_user[week])
-
-        # Get the length error runs over time for this user
-        runs_over_time_for_user = length_error_runs_over_time_for_user(df)
-
-        # Update the length error runs over time for this error message type
-        for week in range(1, 8):
-            if len(runs_over_time_for_user[week]) > 0:
-                # If the student had any error runs this week, add the average length of the runs to the list
-                length_error_runs_over_time[error_message_type][week].append(np.mean(runs_over_time_for_user[week]))
+        for error_message_type in partial_percent_errors:
+            for week in partial_percent_errors[error_message_type]:
+                percent_errors_over_time[error_message_type][week].extend(partial_percent_errors[error_message_type][week])
+            for week in partial_length_error_runs[error_message_type]:
+                length_error_runs_over_time[error_message_type][week].extend(partial_length_error_runs[error_message_type][week])
 
     return percent_errors_over_time, length_error_runs_over_time
 
+def parse_data_on_long_term(workers=1, incremental=False):
+    if incremental:
+        # Only re-parse the students whose log files changed since the last incremental run
+        results = new_long_term_results()
+        for user_id, student_results in parse_students_incrementally('long_term', parse_student_on_long_term, long_term_columns, workers):
+            add_student_to_long_term_results(results, student_results)
+        return results
 
+    return merge_long_term_results(map_student_log_shards(parse_shard_on_long_term, workers))
 
-def parse_and_write_data_on_long_term():
-    percent_errors_over_time, length_error_runs_over_time = parse_data_on_long_term()
 
+def write_data_on_long_term(percent_errors_over_time, length_error_runs_over_time):
     # Write each of the results to a file
     with open(f'{output_folder}percent_errors_over_time.json', 'w') as f:
         json.dump(percent_errors_over_time, f)
@@ -180,5 +175,27 @@ def parse_and_write_data_on_long_term():
     with open(f'{output_folder}length_error_runs_over_time.json', 'w') as f:
         json.dump(length_error_runs_over_time, f)
 
+    # Also write them to the results store, that the analysis and graph scripts read
+    write_results({
+        'percent_errors_over_time': percent_errors_over_time,
+        'length_error_runs_over_time': length_error_runs_over_time,
+    })
+
+def parse_and_write_data_on_long_term(workers=1, incremental=False):
+    write_data_on_long_term(*parse_data_on_long_term(workers, incremental))
+
 if __name__ == '__main__':
-    parse_and_write_data_on_long_term()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to parse the students with')
+    parser.add_argument('--incremental', action='store_true', help='only re-parse the students whose log files changed since the last incremental run')
+    parser.add_argument('--normalization-cache', action='store_true', help='reuse the normalized errors saved by previous runs, and save the new ones')
+    args = parser.parse_args()
+
+    # Worker processes start with a copy of the loaded cache, but only the main process saves it
+    if args.normalization_cache:
+        load_normalization_cache()
+
+    parse_and_write_data_on_long_term(args.workers, args.incremental)
+
+    if args.normalization_cache:
+        save_normalization_cache()
\ No newline at end of file
@@ -1,97 +1,29 @@
-import os
-import pandas as pd
+import argparse
 import numpy as np
 import json
-from error_message_types import get_error_message_type_for_df, get_raw_errors
-from clean_error_message import normalize_error_message
-from karel_info import not_karel
+from error_message_types import get_error_message_type_for_df
+from clean_error_message import load_normalization_cache, save_normalization_cache
+from log_store import iter_student_logs, map_student_log_shards, run_columns
+from incremental_state import parse_students_incrementally
+from results_store import write_results
+from error_runs import encode_student_runs, count_same_subsequent_error, get_runs_until_resolved_from_runs
 
-logs_folder = '../data_files/student_logs/'
 output_folder = '../data_files/short_term_data/'
 
+# The log columns that the short term results read
+short_term_columns = run_columns
+
 # Return a count of the number of times the user got the same error 
 # message in subsequent runs, and the total number of times they got an error
 def get_count_same_subsequent_error(df): 
-    # The number of times the user got the same error in the subsequent run
-    same_error_count = 0
-
-    # The total number of errors that the user got
-    total_error_count = 0
-
-    # Variables to keep track of the previous error
-    prev_error = []
-    prev_project_id = None
-
-    for i, row in df.iterrows():
-        
-        if not_karel(row):
-            # So we can update the error counts
-            raw_errors = get_raw_errors(row)
-            curr_error = []
-            for raw_error in raw_errors:
-                assert(row['error_message_type'] in ['default', 'gpt', 'superhero', 'messageboard', 'explain', 'tigerpython', None])
-                normalized_error = normalize_error_message(raw_error)
-                curr_error.append(normalized_error)   
-                
-                total_error_count += 1
-
-                # Check if this error is the same as the previous error
-                if (row['projectId'] == prev_project_id and normalized_error in prev_error):
-                    same_error_count += 1
-                    
-            prev_project_id = row['projectId']
-            prev_error = curr_error
-        
-        else:
-            # This row is from a karel assignment, so we do not count any errors
-            prev_project_id = row['projectId']
-            prev_error = []
-
-    return same_error_count, total_error_count
+    return count_same_subsequent_error(encode_student_runs(df))
 
 # Return a list of counts of the number of runs it took to resolve each error
 def get_runs_until_resolved(df):
-    # Keep track of the number of runs it took to resolve each error
-    run_counts = []
-
-    # A dictionary of the current errors and number of runs they have occurred
-    prev_error_counts = {}
-    prev_project_id = None
-
-    for i, row in df.iterrows():
-        if not_karel(row):
-            # If this is a new project, reset prev_error_counts.
-            # We do not save the prev run counts because they were not resolved.
-            # This also has to happen so that we can correctly create curr_error_counts.
-            if row['projectId'] != prev_project_id:
-                prev_error_counts = {}
-
-            # Construct the current error counts
-            curr_error_counts = {}
-            raw_errors = get_raw_errors(row)
-            for raw_error in raw_errors:
-                assert(row['error_message_type'] in ['default', 'gpt', 'superhero', 'messageboard', 'explain', 'tigerpython'])
-
-                normalized_error = normalize_error_message(raw_error)
-                curr_error_counts[normalized_error] = prev_error_counts.get(normalized_error, 0) + 1
-
-            # Save the prev run counts that are not in the current run counts
-            for error in prev_error_counts:
-                if error not in curr_error_counts:
-                    # Add the error count to the run counts
-                    run_counts.append(prev_error_counts[error])
-
-            # Update loop variables
-            prev_project_id = row['projectId']
-            prev_error_counts = curr_error_counts
-        else:
-            # Update loop variables
-            prev_project_id = row['projectId']
-            prev_error_counts = {}
-
-    return run_counts
-
-def parse_data_on_short_term():
+    return get_runs_until_resolved_from_runs(encode_student_runs(df))
+
+# Return empty short term results, that students are added to with add_student_to_short_term_results
+def new_short_term_results():
     # Count the number of times the user got the same error in the subsequent run
     percent_same_subsequent_error= { 'default': [], 'explain': [], 'messageboard': [], 'tigerpython': [], 'superhero': [], 'gpt': [] }
     
@@ -106,60 +38,115 @@ def parse_data_on_short_term():
 
     runs_until_resolved_counts = { 'default': [], 'explain': [], 'messageboard': [], 'tigerpython': [], 'superhero': [], 'gpt': [] }
 
-    students_counted = 0
-    total_errors_counted = 0
-
-    for filename in os.listdir(logs_folder):
-        # Read in the student's log file
-        df = pd.read_csv(logs_folder + filename, dtype=str, lineterminator='\n')
-
-        # Get the error message type for this dataframe
-        error_message_types = get_error_message_type_for_df(df)
-        if len(error_message_types) != 1:
-            continue
-        error_message_type = error_message_types[0]
-
-        students_counted += 1
-
-        # Sort the dataframe by project id, and then by timestamp
-        df = df.sort_values(by=['projectId', 'ogTimestamp'])
-
-        # This counts the number of times the user got the same error in the subsequent run
-        # and the total number of times they got an error
-        same_subsequent_error_count, total_error_count = get_count_same_subsequent_error(df)
-
-        total_errors_counted += total_error_count
-
+    return {
+        'percent_same_subsequent_error': percent_same_subsequent_error,
+        'average_runs_until_resolved': average_runs_until_resolved,
+        'count_same_subequent_error': count_same_subequent_error,
+        'count_total_errors': count_total_errors,
+        'runs_until_resolved_counts': runs_until_resolved_counts,
+        'students_counted': 0,
+        'total_errors_counted': 0,
+    }
+
+# Return the short term results of one student, or None if they did not use exactly one error message type
+def parse_student_on_short_term(df):
+    # Get the error message type for this dataframe
+    error_message_types = get_error_message_type_for_df(df)
+    if len(error_message_types) != 1:
+        return None
+
+    # Sort the dataframe by project id, and then by timestamp
+    df = df.sort_values(by=['projectId', 'ogTimestamp'])
+    runs = encode_student_runs(df)
+
+    # This counts the number of times the user got the same error in the subsequent run
+    # and the total number of times they got an error
+    same_subsequent_error_count, total_error_count = count_same_subsequent_error(runs)
+
+    return {
+        'error_message_type': error_message_types[0],
+        'same_subsequent_error_count': same_subsequent_error_count,
+        'total_error_count': total_error_count,
         # Get the runs until resolved for this user
-        runs_until_resolved = get_runs_until_resolved(df)
+        'runs_until_resolved': get_runs_until_resolved_from_runs(runs),
+    }
 
-        # Append the percent of runs that the user got the same error message in subsequent runs
-        if total_error_count > 0:
-            percent_same_subsequent_error[error_message_type].append(same_subsequent_error_count/total_error_count)
-        
-        # Append the average runs until resolved to the list of runs until resolved for this error message type
-        if len(runs_until_resolved) > 0:
-            average_runs_until_resolved[error_message_type].append(np.mean(runs_until_resolved))
+# Add the short term results of one student to the results
+def add_student_to_short_term_results(results, student_results):
+    if student_results is None:
+        return
 
-        count_same_subequent_error[error_message_type] += same_subsequent_error_count
-        count_total_errors[error_message_type] += total_error_count
-        runs_until_resolved_counts[error_message_type].extend(runs_until_resolved)
+    error_message_type = student_results['error_message_type']
+    same_subsequent_error_count = student_results['same_subsequent_error_count']
+    total_error_count = student_results['total_error_count']
+    runs_until_resolved = student_results['runs_until_resolved']
 
-    print("Students counted: ", students_counted)
-    print("Total errors counted: ", total_errors_counted)
-    print(count_total_errors)
+    results['students_counted'] += 1
+    results['total_errors_counted'] += total_error_count
 
-
-    return percent_same_subsequent_error, average_runs_until_resolved, count_same_subequent_error, count_total_errors, runs_until_resolved_counts
-
-
-def parse_and_write_data_on_short_term():
-    (percent_same_subsequent_error, 
-     average_runs_until_resolved, 
-     count_same_subequent_error, 
-     count_total_errors, 
-     runs_until_resolved_counts) = parse_data_on_short_term()
+    # Append the percent of runs that the user got the same error message in subsequent runs
+    if total_error_count > 0:
+        results['percent_same_subsequent_error'][error_message_type].append(same_subsequent_error_count/total_error_count)
     
+    # Append the average runs until resolved to the list of runs until resolved for this error message type
+    if len(runs_until_resolved) > 0:
+        results['average_runs_until_resolved'][error_message_type].append(np.mean(runs_until_resolved))
+
+    results['count_same_subequent_error'][error_message_type] += same_subsequent_error_count
+    results['count_total_errors'][error_message_type] += total_error_count
+    results['runs_until_resolved_counts'][error_message_type].extend(runs_until_resolved)
+
+# Return the short term results of the given students. These are partial results, that
+# merge_short_term_results combines with the results of the other students.
+def parse_shard_on_short_term(user_ids):
+    results = new_short_term_results()
+    for user_id, df in iter_student_logs(user_ids, short_term_columns):
+        add_student_to_short_term_results(results, parse_student_on_short_term(df))
+    return results
+
+# Combine partial short term results, in order. The lists are concatenated and the counts are added,
+# so merging the results of each shard in shard order gives exactly the sequential results.
+def merge_short_term_results(partial_results):
+    results = None
+    for partial in partial_results:
+        if results is None:
+            results = partial
+            continue
+
+        for key in partial:
+            if isinstance(partial[key], dict):
+                for error_message_type in partial[key]:
+                    results[key][error_message_type] += partial[key][error_message_type]
+            else:
+                results[key] += partial[key]
+
+    return results
+
+def parse_data_on_short_term(workers=1, incremental=False):
+    if incremental:
+        # Only re-parse the students whose log files changed since the last incremental run
+        results = new_short_term_results()
+        for user_id, student_results in parse_students_incrementally('short_term', parse_student_on_short_term, short_term_columns, workers):
+            add_student_to_short_term_results(results, student_results)
+    else:
+        results = merge_short_term_results(map_student_log_shards(parse_shard_on_short_term, workers))
+
+    print("Students counted: ", results['students_counted'])
+    print("Total errors counted: ", results['total_errors_counted'])
+    print(results['count_total_errors'])
+
+    return (results['percent_same_subsequent_error'], 
+            results['average_runs_until_resolved'], 
+            results['count_same_subequent_error'], 
+            results['count_total_errors'], 
+            results['runs_until_resolved_counts'])
+
+
+def write_data_on_short_term(percent_same_subsequent_error, 
+                             average_runs_until_resolved, 
+                             count_same_subequent_error, 
+                             count_total_errors, 
+                             runs_until_resolved_counts):
     # Write each of the results to a file
     with open(f'{output_folder}percent_same_subsequent_error.json', 'w') as f:
         json.dump(percent_same_subsequent_error, f)
@@ -176,6 +163,30 @@ def parse_and_write_data_on_short_term():
     with open(f'{output_folder}runs_until_resolved_counts.json', 'w') as f:
         json.dump(runs_until_resolved_counts, f)
 
+    # Also write them to the results store, that the analysis and graph scripts read
+    write_results({
+        'percent_same_subsequent_error': percent_same_subsequent_error,
+        'average_runs_until_resolved': average_runs_until_resolved,
+        'count_same_subequent_error': count_same_subequent_error,
+        'count_total_errors': count_total_errors,
+        'runs_until_resolved_counts': runs_until_resolved_counts,
+    })
+
+def parse_and_write_data_on_short_term(workers=1, incremental=False):
+    write_data_on_short_term(*parse_data_on_short_term(workers, incremental))
 
 if __name__ == '__main__':
-    parse_and_write_data_on_short_term()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to parse the students with')
+    parser.add_argument('--incremental', action='store_true', help='only re-parse the students whose log files changed since the last incremental run')
+    parser.add_argument('--normalization-cache', action='store_true', help='reuse the normalized errors saved by previous runs, and save the new ones')
+    args = parser.parse_args()
+
+    # Worker processes start with a copy of the loaded cache, but only the main process saves it
+    if args.normalization_cache:
+        load_normalization_cache()
+
+    parse_and_write_data_on_short_term(args.workers, args.incremental)
+
+    if args.normalization_cache:
+        save_normalization_cache()
\ No newline at end of file
@@ -0,0 +1,202 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import stats
+from statsmodels.stats.multitest import multipletests
+from results_store import get_results
+
+# Compares every pair of error message types on the short and long term results with permutation tests and
+# bootstrap confidence intervals, instead of the t-tests in analyze_short_term_results.py and
+# analyze_long_term_results.py. The long term results are compared separately for each week.
+#
+# Each comparison draws its resamples in batches of whole rows of a NumPy array, and has its own random
+# generator spawned from one seed, so the results are the same for any number of workers. The p-values of
+# each metric are corrected for multiple comparisons, and everything is written to one csv with one row
+# per comparison.
+#
+#   python resampling.py --resamples 10000 --workers 4
+
+results_file = '../data_files/resampling_results.csv'
+
+error_message_types = ['default', 'explain', 'messageboard', 'tigerpython', 'superhero', 'gpt']
+weeks = [1, 2, 3, 4, 5, 6, 7]
+
+# The metrics to compare (the names of their per student values in the results store), and whether the
+# values are split by week
+metrics = {
+    'percent_same_subsequent_error': False,
+    'average_runs_until_resolved': False,
+    'percent_errors_over_time': True,
+    'length_error_runs_over_time': True,
+}
+
+default_resamples = 10000
+default_seed = 0
+default_alpha = 0.05
+default_correction = 'holm'
+
+# The most values to resample at once. Each batch has as many resamples as fit in this many values.
+max_batch_values = 10**7
+
+# Return a dict of (week, error message type) to the values of the metric. The week is None for the
+# metrics that are not split by week.
+def get_samples(metric):
+    results = get_results(metric)
+
+    samples = {}
+    for error_message_type in error_message_types:
+        if metrics[metric]:
+            for week in weeks:
+                samples[(week, error_message_type)] = results[error_message_type].get(week, np.zeros(0))
+        else:
+            samples[(None, error_message_type)] = results[error_message_type]
+    return samples
+
+# Return a list of (metric, week, error message type a, error message type b, values a, values b)
+# for every pair of error message types, in every week
+def get_comparisons(metric_names):
+    comparisons = []
+    for metric in metric_names:
+        samples = get_samples(metric)
+        metric_weeks = weeks if metrics[metric] else [None]
+        for week in metric_weeks:
+            for i in range(len(error_message_types)):
+                for j in range(i + 1, len(error_message_types)):
+                    type_a, type_b = error_message_types[i], error_message_types[j]
+                    comparisons.append((metric, week, type_a, type_b, samples[(week, type_a)], samples[(week, type_b)]))
+    return comparisons
+
+# Return the number of resamples in each batch, for resamples of num_values values each
+def get_batch_sizes(resamples, num_values):
+    batch_size = max(1, max_batch_values // max(num_values, 1))
+    return [min(batch_size, resamples - start) for start in range(0, resamples, batch_size)]
+
+# Values with few distinct values (e.g. the lengths of error runs) are resampled as counts of each distinct
+# value, which is exact and much faster than resampling every value: a permutation puts a multivariate
+# hypergeometric number of each value in a, and a bootstrap resample draws a multinomial number of each value.
+def has_few_distinct_values(distinct_values, values):
+    return len(distinct_values) * 8 <= len(values)
+
+# Return the two sided p-value of the difference in means of a and b, from permutations of the pooled values.
+# Each permutation only needs the sum of the values that land in a, since the pooled total is fixed.
+def permutation_test(a, b, rng, resamples):
+    pooled = np.concatenate([a, b])
+    total = pooled.sum()
+    observed = abs(a.mean() - b.mean())
+    distinct_values, counts = np.unique(pooled, return_counts=True)
+
+    few_distinct_values = has_few_distinct_values(distinct_values, pooled)
+
+    num_extreme = 0
+    for batch_size in get_batch_sizes(resamples, len(distinct_values) if few_distinct_values else len(pooled)):
+        if few_distinct_values:
+            sums_a = rng.multivariate_hypergeometric(counts, len(a), size=batch_size) @ distinct_values
+        else:
+            permuted = rng.permuted(np.broadcast_to(pooled, (batch_size, len(pooled))), axis=1)
+            sums_a = permuted[:, :len(a)].sum(axis=1)
+        differences = sums_a / len(a) - (total - sums_a) / len(b)
+        # Allow for rounding, so that permutations with the same difference as observed count as extreme
+        num_extreme += int(np.count_nonzero(np.abs(differences) >= observed - 1e-12))
+
+    return (num_extreme + 1) / (resamples + 1)
+
+# Return the means of resamples (with replacement) of the values
+def bootstrap_means(values, rng, resamples):
+    distinct_values, counts = np.unique(values, return_counts=True)
+    if has_few_distinct_values(distinct_values, values):
+        means = []
+        for batch_size in get_batch_sizes(resamples, len(distinct_values)):
+            means.append(rng.multinomial(len(values), counts / len(values), size=batch_size) @ distinct_values / len(values))
+        return np.concatenate(means)
+
+    means = []
+    for batch_size in get_batch_sizes(resamples, len(values)):
+        indices = rng.integers(0, len(values), size=(batch_size, len(values)))
+        means.append(values[indices].mean(axis=1))
+    return np.concatenate(means)
+
+# Return the percentile bootstrap confidence interval of the difference in means of a and b
+def bootstrap_difference_ci(a, b, rng, resamples, alpha=default_alpha):
+    differences = bootstrap_means(a, rng, resamples) - bootstrap_means(b, rng, resamples)
+    return np.quantile(differences, alpha / 2), np.quantile(differences, 1 - alpha / 2)
+
+# Run one comparison, and return its row of the results table. Comparisons with fewer than two values
+# on either side have no test.
+def run_comparison(comparison, seed_sequence, resamples=default_resamples, alpha=default_alpha):
+    metric, week, type_a, type_b, a, b = comparison
+    row = {
+        'metric': metric,
+        'week': week,
+        'error_message_type_a': type_a,
+        'error_message_type_b': type_b,
+        'n_a': len(a),
+        'n_b': len(b),
+        'mean_a': a.mean() if len(a) > 0 else np.nan,
+        'mean_b': b.mean() if len(b) > 0 else np.nan,
+        'difference': a.mean() - b.mean() if len(a) > 0 and len(b) > 0 else np.nan,
+        'ci_low': np.nan,
+        'ci_high': np.nan,
+        'p_value': np.nan,
+        't_test_p_value': np.nan,
+    }
+    if len(a) < 2 or len(b) < 2:
+        return row
+
+    rng = np.random.default_rng(seed_sequence)
+    row['p_value'] = permutation_test(a, b, rng, resamples)
+    row['ci_low'], row['ci_high'] = bootstrap_difference_ci(a, b, rng, resamples, alpha)
+    row['t_test_p_value'] = stats.ttest_ind(a, b).pvalue
+    return row
+
+def run_comparison_with_args(args):
+    return run_comparison(*args)
+
+# Run every comparison, and return the rows of the results table in the order of the comparisons
+def run_comparisons(comparisons, resamples=default_resamples, seed=default_seed, alpha=default_alpha, workers=1):
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(comparisons))
+    args = [(comparison, seed_sequence, resamples, alpha) for comparison, seed_sequence in zip(comparisons, seed_sequences)]
+    if workers <= 1:
+        return [run_comparison_with_args(arg) for arg in args]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_comparison_with_args, args, chunksize=max(1, len(args) // (workers * 4))))
+
+# Add the p-values corrected for multiple comparisons within each metric, and whether they are significant
+def correct_p_values(results, correction=default_correction, alpha=default_alpha):
+    results['p_value_corrected'] = np.nan
+    results['significant'] = False
+    for metric, group in results.groupby('metric', sort=False):
+        tested = group.index[group['p_value'].notna()]
+        if len(tested) == 0:
+            continue
+        significant, p_values_corrected, _, _ = multipletests(results.loc[tested, 'p_value'], alpha=alpha, method=correction)
+        results.loc[tested, 'p_value_corrected'] = p_values_corrected
+        results.loc[tested, 'significant'] = significant
+    return results
+
+def run_resampling(metric_names=list(metrics), resamples=default_resamples, seed=default_seed, alpha=default_alpha, correction=default_correction, workers=1, output_file=results_file):
+    comparisons = get_comparisons(metric_names)
+    results = pd.DataFrame(run_comparisons(comparisons, resamples, seed, alpha, workers))
+    results['week'] = results['week'].astype('Int64')
+    results['resamples'] = resamples
+    results = correct_p_values(results, correction, alpha)
+    results.to_csv(output_file, index=False)
+
+    for metric, group in results.groupby('metric', sort=False):
+        print(f"{metric}: {group['significant'].sum()} of {group['p_value'].notna().sum()} comparisons significant after {correction} correction")
+    print(f'Wrote {len(results)} comparisons to {output_file}')
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--metrics', nargs='+', choices=list(metrics), default=list(metrics), help='the metrics to compare')
+    parser.add_argument('--resamples', type=int, default=default_resamples, help='number of permutations and bootstrap resamples per comparison')
+    parser.add_argument('--seed', type=int, default=default_seed)
+    parser.add_argument('--alpha', type=float, default=default_alpha)
+    parser.add_argument('--correction', default=default_correction, help='multiple comparison correction, any method of statsmodels multipletests (e.g. holm, bonferroni, fdr_bh)')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes to run the comparisons in')
+    parser.add_argument('--output', default=results_file, help='where to write the results')
+    args = parser.parse_args()
+
+    run_resampling(args.metrics, args.resamples, args.seed, args.alpha, args.correction, args.workers, args.output)
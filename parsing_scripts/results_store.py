@@ -0,0 +1,159 @@
+import os
+import json
+import fcntl
+import functools
+import contextlib
+import numpy as np
+import pyarrow as pa
+
+# The results store keeps every output of parse_short_term_results.py and parse_long_term_results.py
+# (which also write them as json) in one Arrow IPC file, so that the analysis and graph scripts can
+# load them once per process instead of opening and parsing a json file in every function.
+#
+# The file has a single float64 value column. Every (artifact, error message type, week) is a
+# contiguous slice of it, and the slices are listed in the schema metadata. The file is memory
+# mapped, so each slice is returned as a NumPy array without copying, and weeks are integers.
+#
+# There are three kinds of artifact:
+#   count             - one number per error message type, e.g. count_total_errors
+#   per_type          - an array per error message type, e.g. percent_same_subsequent_error
+#   per_type_per_week - an array per error message type and week, e.g. percent_errors_over_time
+
+results_file = '../data_files/results.arrow'
+
+# The json files that the parsers write, which import_json_results can build the store from
+short_term_data_folder = '../data_files/short_term_data/'
+long_term_data_folder = '../data_files/long_term_data/'
+json_artifacts = {
+    'percent_same_subsequent_error': short_term_data_folder,
+    'average_runs_until_resolved': short_term_data_folder,
+    'count_same_subequent_error': short_term_data_folder,
+    'count_total_errors': short_term_data_folder,
+    'runs_until_resolved_counts': short_term_data_folder,
+    'percent_errors_over_time': long_term_data_folder,
+    'length_error_runs_over_time': long_term_data_folder,
+}
+
+# Return the kind of an artifact, from one of its values
+def get_artifact_kind(value):
+    if isinstance(value, dict):
+        return 'per_type_per_week'
+    if isinstance(value, (list, np.ndarray)):
+        return 'per_type'
+    return 'count'
+
+class ResultsStore:
+    def __init__(self, values, kinds, index):
+        self.values = values
+        self.kinds = kinds
+        self.index = index
+        self.artifacts = {}
+
+    @property
+    def names(self):
+        return list(self.kinds)
+
+    # Return the artifact as a dict of error message type to a count, an array, or a dict of week to an array
+    def get(self, name):
+        if name not in self.kinds:
+            raise KeyError(f'{name} is not in the results store, run the parser that writes it first')
+
+        if name not in self.artifacts:
+            artifact = {}
+            for error_message_type, week, start, length in self.index[name]:
+                values = self.values[start:start + length]
+                if self.kinds[name] == 'count':
+                    artifact[error_message_type] = int(values[0])
+                elif self.kinds[name] == 'per_type':
+                    artifact[error_message_type] = values
+                else:
+                    artifact.setdefault(error_message_type, {})[week] = values
+            self.artifacts[name] = artifact
+
+        return self.artifacts[name]
+
+# Load the results store once per version of the file. Arrays returned by an older version stay valid.
+@functools.lru_cache(maxsize=None)
+def load_results_version(path, mtime_ns, size):
+    # The arrays point into the memory map, so it stays open for as long as they are used
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+    metadata = table.schema.metadata
+    values = table.column('value').combine_chunks().to_numpy(zero_copy_only=True)
+    return ResultsStore(values, json.loads(metadata[b'kinds']), json.loads(metadata[b'index']))
+
+def load_results(path=results_file):
+    if not os.path.exists(path):
+        return ResultsStore(np.zeros(0), {}, {})
+    stat = os.stat(path)
+    return load_results_version(path, stat.st_mtime_ns, stat.st_size)
+
+# Return one artifact of the results store (see ResultsStore.get)
+def get_results(name, path=results_file):
+    return load_results(path).get(name)
+
+# Hold an exclusive lock on the results store while it is updated, so that parsers running at the same
+# time take turns to read, merge and rewrite it instead of dropping each other's artifacts
+@contextlib.contextmanager
+def lock_results(path=results_file):
+    with open(f'{path}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# Add artifacts to the results store, replacing any with the same name. Each artifact is a dict of error
+# message type to a count, a list, or a dict of week to a list (as the parsers return them).
+# The new file is written next to the store and then swapped in, so readers never see a half written file.
+def write_results(artifacts, path=results_file):
+    with lock_results(path):
+        write_results_locked(artifacts, path)
+
+def write_results_locked(artifacts, path):
+    existing = load_results(path)
+    all_artifacts = { name: existing.get(name) for name in existing.names if name not in artifacts }
+    all_artifacts.update(artifacts)
+
+    values = []
+    kinds = {}
+    index = {}
+    start = 0
+    for name, artifact in all_artifacts.items():
+        index[name] = []
+        for error_message_type, value in artifact.items():
+            kinds[name] = get_artifact_kind(value)
+            if kinds[name] == 'per_type_per_week':
+                slices = [(int(week), week_values) for week, week_values in value.items()]
+            elif kinds[name] == 'per_type':
+                slices = [(None, value)]
+            else:
+                slices = [(None, [value])]
+
+            for week, slice_values in slices:
+                slice_values = np.asarray(slice_values, dtype=np.float64)
+                index[name].append((error_message_type, week, start, len(slice_values)))
+                values.append(slice_values)
+                start += len(slice_values)
+
+    metadata = { 'kinds': json.dumps(kinds), 'index': json.dumps(index) }
+    table = pa.table({ 'value': np.concatenate(values) if len(values) > 0 else np.zeros(0) }).replace_schema_metadata(metadata)
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+# Build the results store from the json files written by the parsers
+def import_json_results(path=results_file):
+    artifacts = {}
+    for name, folder in json_artifacts.items():
+        if os.path.exists(f'{folder}{name}.json'):
+            with open(f'{folder}{name}.json', 'r') as f:
+                artifacts[name] = json.load(f)
+    write_results(artifacts, path)
+    print(f"Wrote {', '.join(artifacts)} to {path}")
+
+if __name__ == '__main__':
+    import_json_results()